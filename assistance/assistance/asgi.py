@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'assistance.settings')
+# Async requests do not reuse thread-bound persistent connections: connect
+# directly and close the connection at the end of each request (health checks
+# stay on). PgBouncer is opt-in with DJANGO_DB_POOLER=pgbouncer, see settings.py.
+os.environ.setdefault('DJANGO_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
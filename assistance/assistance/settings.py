@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -57,11 +59,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'bodyanalytics.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'bodyanalytics.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,17 +94,107 @@ WSGI_APPLICATION = 'assistance.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Persistent connections: each worker thread keeps its connection open for
+# CONN_MAX_AGE seconds instead of reconnecting on every request, and checks it
+# is still usable before reuse (WSGI / gunicorn sync workers).
+#
+# DJANGO_DB_POOLER=pgbouncer connects through PgBouncer in transaction pooling
+# mode instead (deployconfig/cognitiex-pgbouncer.ini.txt): Django opens cheap
+# client connections to PgBouncer, which multiplexes them over a fixed number
+# of Postgres connections shared by all workers. This is the pooling layer of
+# ASGI, where async requests do not reuse thread-bound persistent
+# connections (asgi.py sets CONN_MAX_AGE=0 but connects directly unless the
+# pooler is selected, e.g. by deployconfig/cognitiex-asgi.service.txt).
+# Server-side cursors do not survive transaction pooling, so they are
+# disabled with it.
+DB_POOLER = os.environ.get('DJANGO_DB_POOLER', 'none')
+if DB_POOLER not in ('none', 'pgbouncer'):
+    raise ImproperlyConfigured(f"DJANGO_DB_POOLER must be 'none' or 'pgbouncer', not {DB_POOLER!r}")
+USE_PGBOUNCER = DB_POOLER == 'pgbouncer'
+
+CONN_MAX_AGE = int(os.environ.get('DJANGO_CONN_MAX_AGE', '60'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'sss',
-        'USER': 'postgres',
-        'PASSWORD': 'mohamed0192837465MED',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DJANGO_DB_NAME', 'sss'),
+        'USER': os.environ.get('DJANGO_DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', 'mohamed0192837465MED'),
+        'HOST': os.environ.get('DJANGO_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DJANGO_DB_PORT', '5432'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DJANGO_DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+        'OPTIONS': {
+            'connect_timeout': 5,
+        },
     }
 }
 
+if USE_PGBOUNCER:
+    DATABASES['default'].update({
+        'HOST': os.environ.get('DJANGO_DB_POOLER_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('DJANGO_DB_POOLER_PORT', '6432'),
+        'DISABLE_SERVER_SIDE_CURSORS': True,
+    })
+
+# Read replica for the read-only API views (bodyanalytics.db_routers)
+# Set DJANGO_DB_REPLICA_HOST (and optionally PORT/NAME) to enable it. In tests
+# the replica mirrors the default database, so SQLite stand-ins work as-is.
+if os.environ.get('DJANGO_DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DJANGO_DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.environ['DJANGO_DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DJANGO_DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['bodyanalytics.db_routers.PrimaryReplicaRouter']
+
+REPLICA_DATABASE_ALIAS = 'replica'
+
+# URL names whose GET/HEAD requests may read from the replica
+REPLICA_READ_VIEWS = [
+    'movement-record-list-create',
+    'movement-record-detail',
+    'user-movement-records',
+    'django-users-list',
+    'django-user-detail',
+    'django-offers-list',
+    'django-offer-detail',
+    'django-user-offers-list',
+    'django-user-offers-by-user',
+    'django-course-lessons-list',
+    'django-course-lesson-detail',
+    'django-test-questions-list',
+    'django-test-questions-by-test',
+]
+
+# After a client writes, its reads stay on the primary for this many seconds
+# (read-your-writes while the replica catches up)
+REPLICA_PIN_SECONDS = int(os.environ.get('DJANGO_REPLICA_PIN_SECONDS', '15'))
+REPLICA_PIN_COOKIE_NAME = 'db_primary_pin'
+
+# URL names served by the async views in bodyanalytics/async_views.py (only
+# useful under ASGI). Comma-separated in DJANGO_ASYNC_VIEW_ROUTES, e.g.
+# "upload-movement-data,django-users-list". Available: movement-record-list-create,
+# user-movement-records, upload-movement-data, django-users-list,
+# django-offers-list, django-user-offers-list, django-user-offers-by-user,
+# django-course-lessons-list, django-test-questions-list,
+# django-test-questions-by-test
+ASYNC_VIEW_ROUTES = [
+    name.strip() for name in os.environ.get('DJANGO_ASYNC_VIEW_ROUTES', '').split(',') if name.strip()
+]
+
+# Per-request query budget (bodyanalytics.middleware.QueryBudgetMiddleware)
+# Requests over either limit are logged with their view name.
+QUERY_BUDGET = {
+    'MAX_QUERIES': int(os.environ.get('DJANGO_QUERY_BUDGET_MAX_QUERIES', '50')),
+    'MAX_DB_TIME_MS': float(os.environ.get('DJANGO_QUERY_BUDGET_MAX_DB_TIME_MS', '500')),
+    'RESPONSE_HEADERS': DEBUG,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -167,10 +261,39 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'bodyanalytics.authentication.BlacklistCheckedJWTAuthentication'
     ]
 }
 
+# Bloom filter in front of the shared token_blacklist table
+# (bodyanalytics.token_blacklist). Only filter hits are checked in the database.
+TOKEN_BLACKLIST_CACHE = {
+    'ENABLED': True,
+    'REFRESH_SECONDS': 5,
+    'REBUILD_SECONDS': 600,
+    # Bloom misses are re-checked against rows newer than the last refresh, so
+    # tokens blacklisted by the Spring Boot service are rejected immediately
+    'RECHECK_MISSES': True,
+    'EXPECTED_ITEMS': 100_000,
+    'FALSE_POSITIVE_RATE': 0.001,
+    # Blacklist rows older than this are deleted by manage.py purge_expired_tokens;
+    # at least the longest token lifetime of Django and the Spring Boot service
+    'RETENTION_DAYS': int(os.environ.get('DJANGO_TOKEN_BLACKLIST_RETENTION_DAYS', '30')),
+}
+
+# Sequential motion models served by ai/motion/predict/ (bodyanalytics.motion_inference).
+# Requests arriving within MAX_WAIT_MS of each other run as one batch.
+MOTION_INFERENCE = {
+    'CHECKPOINTS_DIR': os.environ.get(
+        'DJANGO_MOTION_CHECKPOINTS_DIR', os.path.join(BASE_DIR, 'bodyanalytics', 'checkpoints_sequential')
+    ),
+    'MAX_BATCH_SIZE': int(os.environ.get('DJANGO_MOTION_MAX_BATCH_SIZE', '32')),
+    'MAX_WAIT_MS': float(os.environ.get('DJANGO_MOTION_MAX_WAIT_MS', '5')),
+    # torch, onnx or onnx-int8 (manage.py export_motion_onnx [--quantize])
+    'BACKEND': os.environ.get('DJANGO_MOTION_BACKEND', 'torch'),
+    'THREADS': int(os.environ['DJANGO_MOTION_THREADS']) if os.environ.get('DJANGO_MOTION_THREADS') else None,
+}
+
 # JWT settings
 import json
 import os
@@ -0,0 +1,26 @@
+"""
+Settings for the test suite: SQLite stand-ins for the Postgres primary and
+its read replica, so PrimaryReplicaRouter is exercised without a database
+server.
+
+    python manage.py test bodyanalytics --settings=assistance.test_settings
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DB_POOLER = 'none'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_primary.sqlite3',
+    },
+    # Same data as default during the tests, like a caught-up replica
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -18,15 +18,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from bodyanalytics.views import BlacklistCheckedTokenRefreshView
 
 urlpatterns = [
     path('ai/admin/', admin.site.urls),
     path('ai/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('ai/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('ai/token/refresh/', BlacklistCheckedTokenRefreshView.as_view(), name='token_refresh'),
     path('ai/', include('bodyanalytics.urls')),
 ]
 
@@ -4,6 +4,7 @@ from .models import (
     Data, Documents, PasswordResetTokens, RefreshTokens, TokenBlacklist,
     UserCourseCompletions, UserLessonCompletions, UserTestResults
 )
+from .image_storage import resolve_image_reference
 
 
 @admin.register(Users)
@@ -168,8 +169,8 @@ class DataAdmin(admin.ModelAdmin):
                     
                     # Also check the image_data field for image path
                     if data_record.image_data:
-                        img_path = data_record.image_data if os.path.isabs(data_record.image_data) else os.path.join(settings.BASE_DIR, data_record.image_data)
-                        if os.path.exists(img_path):
+                        img_path = resolve_image_reference(data_record.image_data)
+                        if img_path and os.path.exists(img_path):
                             image_name = f"{movement_type}/{data_record.id}_{data_record.movement_detected}_from_image_data.jpg"
                             zip_file.write(img_path, image_name)
                     
@@ -259,8 +260,9 @@ class DataAdmin(admin.ModelAdmin):
                                 deleted_count += 1
             
             # Delete image file referenced in image_data field
-            if data_record.image_data and os.path.exists(data_record.image_data):
-                os.remove(data_record.image_data)
+            img_path = resolve_image_reference(data_record.image_data)
+            if img_path and os.path.exists(img_path):
+                os.remove(img_path)
                 deleted_count += 1
             
             # Delete the record itself
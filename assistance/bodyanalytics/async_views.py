@@ -0,0 +1,316 @@
+"""
+ASGI-native variants of the ingest and list endpoints.
+
+These are plain Django async views (DRF 3.14 APIViews are sync-only) using the
+async ORM, so under uvicorn a request waiting on a slow mobile upload or on
+the database does not hold a worker thread. They return the same payloads as
+their sync counterparts in views.py; urls.py picks one or the other per route
+from settings.ASYNC_VIEW_ROUTES.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from .models import Data as MovementRecord, Offers as Offer, UserOffers as UserOffer, CourseLessons as CourseLesson, TestQuestions as TestQuestion, Users as SpringBootUser
+from .serializers import MovementRecordSerializer
+from .views import (
+    MovementRecordListCreateView,
+    build_upload_json_data_dict,
+    resolve_upload_categories,
+    upload_image_filename,
+    merge_upload_image_entries,
+    spring_user_to_dict,
+    offer_to_dict,
+    user_offer_to_dict,
+    course_lesson_to_dict,
+    test_question_to_dict,
+)
+
+logger = logging.getLogger(__name__)
+
+# Same limit as UploadMovementDataView
+MAX_IMAGES_PER_UPLOAD = 5
+
+
+def json_response(data, status=200):
+    """Render with DRF's JSONRenderer so payloads match the sync APIViews byte for byte"""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def _authenticate(request):
+    for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authenticator_class().authenticate(request)
+        if result is not None:
+            return result
+    return None
+
+
+async def authenticate_request(request):
+    """
+    Run the DRF authentication classes (JWT + blacklist) like the sync views do.
+    Returns an error response if a token was sent and rejected, else None.
+    """
+    try:
+        await sync_to_async(_authenticate)(request)
+    except exceptions.AuthenticationFailed as e:
+        data = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+        return json_response(data, status=status.HTTP_401_UNAUTHORIZED)
+    return None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """
+    Async base view: authenticates the request before dispatching.
+    CSRF-exempt like DRF's APIView, since clients authenticate with JWT.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        error = await authenticate_request(request)
+        if error is not None:
+            return error
+        return await super().dispatch(request, *args, **kwargs)
+
+
+def request_data(request):
+    """
+    Body fields like DRF's request.data: a JSON object for application/json
+    (Django only fills request.POST for form encodings), else request.POST.
+    Raises ParseError for a body that is not a JSON object.
+    """
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except (ValueError, UnicodeDecodeError) as e:
+            raise exceptions.ParseError(f'JSON parse error - {e}')
+        if not isinstance(data, dict):
+            raise exceptions.ParseError('JSON parse error - expected an object')
+        return data
+    return request.POST
+
+
+def _save_upload(filename, image):
+    # Runs in a worker thread: reading a spooled upload and writing to storage both block
+    path = default_storage.save(filename, ContentFile(image.read()))
+    return default_storage.url(path)
+
+
+# ========== MOVEMENT RECORDS ==========
+
+class AsyncMovementRecordListCreateView(AsyncAPIView):
+    async def get(self, request):
+        records = MovementRecord.objects.all()
+        user_id = request.GET.get('user_id')
+        if user_id:
+            records = records.filter(user_id=user_id)
+        result = [MovementRecordSerializer(record).data async for record in records]
+        return json_response(result)
+
+    async def post(self, request):
+        # Creation goes through the DRF serializer pipeline of the sync view
+        return await sync_to_async(MovementRecordListCreateView.as_view())(request)
+
+
+class AsyncUserMovementRecordsView(AsyncAPIView):
+    async def get(self, request, user_id):
+        try:
+            records = MovementRecord.objects.filter(user_id=user_id).order_by('-timestamp')
+            result = [MovementRecordSerializer(record).data async for record in records]
+            return json_response(result)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncUploadMovementDataView(AsyncAPIView):
+    """
+    Async variant of UploadMovementDataView.
+    Accepts multipart, form and JSON bodies (JSON uploads carry no images).
+    Images are written concurrently in worker threads.
+    """
+
+    async def post(self, request):
+        try:
+            try:
+                data = request_data(request)
+            except exceptions.ParseError as e:
+                return json_response({'detail': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+            user_id = data.get('user')
+            if user_id is None:
+                user_id = request.META.get('HTTP_X_USER_ID')
+                if user_id is None:
+                    user_id = data.get('userId') or data.get('user_id')
+
+            label = data.get('label', 'Movement Capture')
+            movement_type = data.get('movementType', 'general')
+            timestamp_str = data.get('timestamp')
+            json_data_str = data.get('jsonData')
+
+            if user_id is None:
+                return json_response({'error': 'User ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                user = await SpringBootUser.objects.aget(id=user_id)
+            except SpringBootUser.DoesNotExist:
+                return json_response({'error': f'User with ID {user_id} not found'}, status=status.HTTP_404_NOT_FOUND)
+            except (ValueError, TypeError):
+                return json_response({'error': 'Invalid user ID'}, status=status.HTTP_400_BAD_REQUEST)
+
+            json_data = {}
+            if isinstance(json_data_str, dict):
+                # JSON bodies may nest jsonData as an object
+                json_data = json_data_str
+            elif json_data_str:
+                try:
+                    json_data = json.loads(json_data_str)
+                except json.JSONDecodeError:
+                    json_data = {}
+
+            json_data_dict = build_upload_json_data_dict(json_data, label, movement_type, timestamp_str)
+            detection_type, subcategory, movement_name = resolve_upload_categories(json_data)
+
+            images = request.FILES.getlist('images')[:MAX_IMAGES_PER_UPLOAD]
+            save_upload = sync_to_async(_save_upload, thread_sensitive=False)
+            results = await asyncio.gather(*[
+                save_upload(upload_image_filename(detection_type, subcategory, movement_name, i, image.name), image)
+                for i, image in enumerate(images)
+            ], return_exceptions=True)
+
+            image_urls = []
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error('Error saving image', exc_info=result)
+                    continue
+                image_urls.append(result)
+
+            json_data_dict['image_urls'] = image_urls
+            json_data_dict['image_order'] = len(image_urls) - 1 if image_urls else 0
+
+            existing_record = await MovementRecord.objects.filter(
+                user=user,
+                json_data__icontains=label
+            ).order_by('-created_at').afirst()
+
+            if existing_record:
+                existing_json_data = merge_upload_image_entries(
+                    existing_record.json_data, image_urls, json_data, json_data_dict, timestamp_str
+                )
+                try:
+                    existing_record.json_data = json.dumps(existing_json_data, ensure_ascii=False, separators=(',', ':'), default=str)
+                    await existing_record.asave()
+                except Exception:
+                    logger.exception('Error updating json_data in existing movement record %s', existing_record.id)
+                movement_record = existing_record
+            else:
+                try:
+                    movement_record = await MovementRecord.objects.acreate(
+                        user=user,
+                        timestamp=timezone.now(),
+                        movement_detected=True,
+                        created_at=timezone.now(),
+                        json_data=json.dumps(json_data_dict, ensure_ascii=False, separators=(',', ':'), default=str)
+                    )
+                except Exception:
+                    logger.exception('Error saving json_data to movement record')
+                    movement_record = await MovementRecord.objects.acreate(
+                        user=user,
+                        timestamp=timezone.now(),
+                        movement_detected=True,
+                        created_at=timezone.now(),
+                        json_data=None
+                    )
+
+            return json_response({
+                'message': 'Movement data uploaded successfully',
+                'movement_record_id': movement_record.id,
+                'image_count': len(image_urls),
+                'image_urls': image_urls,
+                'user_id': user_id,
+                'timestamp': movement_record.timestamp.isoformat()
+            }, status=status.HTTP_201_CREATED)
+
+        except Exception as e:
+            logger.exception('Error in movement data upload')
+            return json_response(
+                {'error': str(e), 'detail': 'Internal server error', 'traceback': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+# ========== DJANGO AUTONOMOUS VIEWS ==========
+
+class AsyncDjangoUserListView(AsyncAPIView):
+    async def get(self, request):
+        try:
+            result = [spring_user_to_dict(user) async for user in SpringBootUser.objects.all()]
+            return json_response(result)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncDjangoOfferListView(AsyncAPIView):
+    async def get(self, request):
+        try:
+            result = [offer_to_dict(offer) async for offer in Offer.objects.all()]
+            return json_response(result)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncDjangoUserOfferListView(AsyncAPIView):
+    async def get(self, request):
+        try:
+            result = [user_offer_to_dict(user_offer) async for user_offer in UserOffer.objects.all()]
+            return json_response(result)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncDjangoUserOfferByUserView(AsyncAPIView):
+    async def get(self, request, user_id):
+        try:
+            user_offers = UserOffer.objects.filter(user_id=user_id)
+            result = [user_offer_to_dict(user_offer) async for user_offer in user_offers]
+            return json_response(result)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncDjangoCourseLessonListView(AsyncAPIView):
+    async def get(self, request):
+        try:
+            result = [course_lesson_to_dict(lesson) async for lesson in CourseLesson.objects.all()]
+            return json_response(result)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncDjangoTestQuestionListView(AsyncAPIView):
+    async def get(self, request):
+        try:
+            result = [test_question_to_dict(question) async for question in TestQuestion.objects.all()]
+            return json_response(result)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncDjangoTestQuestionByTestView(AsyncAPIView):
+    async def get(self, request, test_id):
+        try:
+            questions = TestQuestion.objects.filter(test_id=test_id)
+            result = [test_question_to_dict(question) async for question in questions]
+            return json_response(result)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
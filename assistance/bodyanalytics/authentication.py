@@ -0,0 +1,26 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .token_blacklist import is_token_blacklisted
+
+
+class BlacklistCheckedJWTAuthentication(JWTAuthentication):
+    """
+    SimpleJWT authentication that also rejects tokens present in the shared
+    token_blacklist table (written by the Spring Boot service).
+    Lookups go through the in-process Bloom filter, so tokens that are not
+    blacklisted cost no query.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+
+        token_string = raw_token.decode('utf-8') if isinstance(raw_token, bytes) else raw_token
+        jti = validated_token.get('jti')
+        if is_token_blacklisted(token_string, jti):
+            raise InvalidToken({
+                'detail': 'Token is blacklisted',
+                'code': 'token_not_valid',
+            })
+
+        return validated_token
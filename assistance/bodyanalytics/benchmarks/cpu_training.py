@@ -0,0 +1,116 @@
+"""
+CPU training throughput benchmark for the sequential models of train.py.
+
+Times train.train_step on synthetic batches (random letters and poses,
+[batch, SEQUENCE_LENGTH, landmarks, FEATURE_DIM]) for every combination of
+precision, compilation mode and intra-op thread count, and reports the
+training samples/sec of each, relative to the first configuration.
+
+bf16 is skipped on CPUs without native bf16 unless --force-bf16 is given
+(it then runs emulated). The inter-op pool can only be sized once, so
+--interop-threads applies to all configurations.
+
+Usage (from assistance/):
+    python -m bodyanalytics.benchmarks.cpu_training
+    python -m bodyanalytics.benchmarks.cpu_training --threads 1 4 8 --compile none script
+    python -m bodyanalytics.benchmarks.cpu_training --landmarks 8 --batch-size 64 --steps 50
+"""
+import argparse
+import itertools
+import time
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from bodyanalytics.cpu_training import (
+    COMPILE_MODES, available_cpus, compile_model, configure_threads, cpu_has_native_bf16
+)
+from bodyanalytics.landmark_features import FEATURE_DIM
+from bodyanalytics.train import ALPHABET, SEQUENCE_LENGTH, SequentialTextToMovementModel, train_step
+
+
+def make_batches(count, batch_size, landmarks, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return [
+        (
+            torch.randint(0, len(ALPHABET), (batch_size, SEQUENCE_LENGTH), generator=generator),
+            torch.rand((batch_size, SEQUENCE_LENGTH, landmarks, FEATURE_DIM), generator=generator),
+        )
+        for _ in range(count)
+    ]
+
+
+def time_configuration(precision, compile_mode, threads, batches, warmup, steps):
+    configure_threads(threads)
+    torch.manual_seed(0)
+    model = SequentialTextToMovementModel(seq_len=SEQUENCE_LENGTH, input_size=FEATURE_DIM)
+    step_model = compile_model(model, compile_mode, batches[0], precision)
+    optimizer = optim.Adam(model.parameters(), lr=1e-3)
+    criterion = nn.MSELoss()
+
+    def run(count):
+        loss = 0.0
+        for i in range(count):
+            text_seq, pose_seq = batches[i % len(batches)]
+            loss = train_step(model, step_model, optimizer, criterion, text_seq, pose_seq, precision)
+        return loss
+
+    # Warm-up: compilation and allocator caches are not timed
+    run(warmup)
+    start = time.perf_counter()
+    loss = run(steps)
+    elapsed = time.perf_counter() - start
+    samples = steps * len(batches[0][0])
+    return {'samples_per_sec': samples / elapsed, 'ms_per_step': elapsed / steps * 1000, 'loss': loss}
+
+
+def run_all(precisions, compile_modes, thread_counts, batch_size, landmarks, warmup, steps):
+    batches = make_batches(8, batch_size, landmarks)
+    results = []
+    for precision, compile_mode, threads in itertools.product(precisions, compile_modes, thread_counts):
+        result = time_configuration(precision, compile_mode, threads, batches, warmup, steps)
+        results.append({'precision': precision, 'compile': compile_mode, 'threads': threads, **result})
+    return results
+
+
+def print_results(results):
+    baseline = results[0]['samples_per_sec'] if results else 0
+    for r in results:
+        print(
+            f"{r['precision']:>5s}  {r['compile']:>7s}  {r['threads']:3d} threads"
+            f"  {r['samples_per_sec']:9.1f} samples/s  {r['ms_per_step']:8.2f} ms/step"
+            f"  x{r['samples_per_sec'] / baseline:.2f}  (loss {r['loss']:.4f})"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='CPU training samples/sec of the sequential models')
+    parser.add_argument('--precision', nargs='+', choices=('fp32', 'bf16'), default=['fp32', 'bf16'],
+                        help='Precisions to time (default: fp32 bf16)')
+    parser.add_argument('--compile', nargs='+', choices=COMPILE_MODES, default=list(COMPILE_MODES),
+                        help=f"Compilation modes to time (default: {' '.join(COMPILE_MODES)})")
+    parser.add_argument('--threads', nargs='+', type=int, default=None,
+                        help='Intra-op thread counts to time (default: 1 and the available CPUs)')
+    parser.add_argument('--interop-threads', type=int, default=None, help='Inter-op threads (default: torch)')
+    parser.add_argument('--batch-size', type=int, default=16, help='Sequences per batch (default: 16)')
+    parser.add_argument('--landmarks', type=int, default=33, help='Landmarks per frame (default: 33, full body)')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed steps per configuration (default: 5)')
+    parser.add_argument('--steps', type=int, default=30, help='Timed steps per configuration (default: 30)')
+    parser.add_argument('--force-bf16', action='store_true', help='Time bf16 even without native CPU support')
+    args = parser.parse_args(argv)
+
+    configure_threads(None, args.interop_threads)
+    precisions = list(dict.fromkeys(args.precision))
+    if 'bf16' in precisions and not (cpu_has_native_bf16() or args.force_bf16):
+        print('bf16 skipped: no native bf16 on this CPU (--force-bf16 to time it emulated)')
+        precisions.remove('bf16')
+    thread_counts = args.threads or sorted({1, available_cpus()})
+
+    results = run_all(precisions, list(dict.fromkeys(args.compile)), thread_counts,
+                      max(args.batch_size, 1), max(args.landmarks, 1), max(args.warmup, 0), max(args.steps, 1))
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Import-time benchmark for the bodyanalytics ML scripts.
+
+Each module is imported in a fresh interpreter, from an empty working
+directory, and the script reports:
+- the wall time of the import (median over --repeat runs);
+- the peak RSS the import added;
+- the directories the import created, which should be none.
+
+With --with-init it also times the deferred MediaPipe Pose build
+(detectors.init_detectors), i.e. the cost now paid on first use.
+
+Usage (from assistance/):
+    python -m bodyanalytics.benchmarks.import_time --repeat 5
+    python -m bodyanalytics.benchmarks.import_time --save before.json
+    python -m bodyanalytics.benchmarks.import_time --compare before.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+MODULES = [
+    'bodyanalytics.datatraitement',
+    'bodyanalytics.pretrait',
+    'bodyanalytics.train',
+]
+
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+
+PROBE = '''
+import json, os, resource, sys, time
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import importlib
+importlib.import_module(sys.argv[1])
+import_s = time.perf_counter() - start
+result = {
+    'import_s': import_s,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+}
+if sys.argv[2] == '1':
+    from bodyanalytics.detectors import init_detectors
+    start = time.perf_counter()
+    init_detectors('pose')
+    result['init_s'] = time.perf_counter() - start
+result['created'] = sorted(os.listdir('.'))
+print(json.dumps(result))
+'''
+
+
+def probe(module, with_init=False):
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [str(PROJECT_DIR), os.environ.get('PYTHONPATH')]))}
+    with tempfile.TemporaryDirectory() as workdir:
+        completed = subprocess.run(
+            [sys.executable, '-c', PROBE, module, '1' if with_init else '0'],
+            cwd=workdir, env=env, capture_output=True, text=True,
+        )
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run(modules, repeat, with_init):
+    results = {}
+    for module in modules:
+        runs = [probe(module, with_init) for _ in range(repeat)]
+        errors = [r['error'] for r in runs if 'error' in r]
+        if errors:
+            results[module] = {'error': errors[0]}
+            continue
+        summary = {
+            'import_ms': statistics.median(r['import_s'] for r in runs) * 1000,
+            'rss_mb': statistics.median(r['rss_kb'] for r in runs) / 1024,
+            'created': runs[0]['created'],
+        }
+        if with_init:
+            summary['init_ms'] = statistics.median(r['init_s'] for r in runs) * 1000
+        results[module] = summary
+    return results
+
+
+def print_results(results, baseline=None):
+    baseline = baseline or {}
+    for module, summary in results.items():
+        if 'error' in summary:
+            print(f"{module:35s} ERROR: {summary['error']}")
+            continue
+        line = f"{module:35s} import {summary['import_ms']:8.1f} ms  RSS +{summary['rss_mb']:7.1f} MB"
+        previous = baseline.get(module, {})
+        if 'import_ms' in previous:
+            line += f"  (was {previous['import_ms']:.1f} ms, +{previous['rss_mb']:.1f} MB)"
+        if 'init_ms' in summary:
+            line += f"  pose init {summary['init_ms']:.1f} ms"
+        if summary['created']:
+            line += f"  created: {', '.join(summary['created'])}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import-time benchmark for the bodyanalytics ML scripts')
+    parser.add_argument('--repeat', type=int, default=3, help='Fresh interpreters per module (default: 3)')
+    parser.add_argument('--with-init', action='store_true', help='Also time the lazy MediaPipe Pose build')
+    parser.add_argument('--save', type=Path, help='Write the results to this JSON file')
+    parser.add_argument('--compare', type=Path, help='Show the results of a previous --save next to these')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args(argv)
+
+    results = run(args.modules, max(args.repeat, 1), args.with_init)
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_results(results, baseline)
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
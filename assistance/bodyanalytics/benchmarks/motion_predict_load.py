@@ -0,0 +1,137 @@
+"""
+Load test for the batched motion inference endpoint (ai/motion/predict/).
+
+Sends --requests POSTs with random poses from --concurrency client
+threads, for each concurrency level given. It reports:
+- the latency percentiles seen by the clients (p50, p95, p99, max);
+- the throughput in requests/sec;
+- the mean batch size reported by the server, i.e. how many requests
+  shared each forward pass;
+- the failed requests, by HTTP status.
+
+Only the standard library is needed on the client side.
+
+Usage (from assistance/, with the Django server running):
+    python -m bodyanalytics.benchmarks.motion_predict_load --concurrency 1 8 32
+    python -m bodyanalytics.benchmarks.motion_predict_load --zone full_body --requests 2000
+    python -m bodyanalytics.benchmarks.motion_predict_load --landmarks 8  # hands model on raw landmarks
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+URL = 'http://127.0.0.1:8000/ai/motion/predict/'
+LETTERS = 'abcdefghijklmnopqrstuvwxyz '
+
+
+def make_payloads(count, zone, seq_len, landmarks, seed=0):
+    rng = random.Random(seed)
+    return [
+        json.dumps({
+            'zone': zone,
+            'text': ''.join(rng.choice(LETTERS) for _ in range(seq_len)),
+            'poses': [[[rng.random() for _ in range(4)] for _ in range(landmarks)] for _ in range(seq_len)],
+        }).encode('utf-8')
+        for _ in range(count)
+    ]
+
+
+def post(url, body, headers, timeout):
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = json.loads(response.read())
+            return time.perf_counter() - start, response.status, data.get('batch_size')
+    except urllib.error.HTTPError as e:
+        return time.perf_counter() - start, e.code, None
+    except (urllib.error.URLError, OSError):
+        return time.perf_counter() - start, 'error', None
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def run_level(url, payloads, concurrency, headers, timeout):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda body: post(url, body, headers, timeout), payloads))
+    elapsed = time.perf_counter() - start
+
+    ok = [(latency, batch_size) for latency, code, batch_size in results if code == 200]
+    latencies = [latency * 1000 for latency, _ in ok]
+    summary = {
+        'concurrency': concurrency,
+        'requests': len(payloads),
+        'ok': len(ok),
+        'failed': dict(Counter(str(code) for _, code, _ in results if code != 200)),
+        'requests_per_sec': len(ok) / elapsed,
+    }
+    if latencies:
+        summary.update({
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': max(latencies),
+            'mean_batch_size': statistics.mean(batch_size or 1 for _, batch_size in ok),
+        })
+    return summary
+
+
+def print_summary(summary):
+    line = f"{summary['concurrency']:4d} clients  {summary['requests_per_sec']:8.1f} req/s"
+    if summary['ok']:
+        line += (
+            f"  p50 {summary['p50_ms']:7.1f} ms  p95 {summary['p95_ms']:7.1f} ms"
+            f"  p99 {summary['p99_ms']:7.1f} ms  max {summary['max_ms']:7.1f} ms"
+            f"  batch {summary['mean_batch_size']:5.1f}"
+        )
+    if summary['failed']:
+        line += f"  failed {summary['failed']}"
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Latency and throughput of ai/motion/predict/ under concurrent load')
+    parser.add_argument('--url', default=URL, help=f'Endpoint URL (default: {URL})')
+    parser.add_argument('--zone', default='hands', help='Zone model to call (default: hands)')
+    parser.add_argument('--seq-len', type=int, default=16, help='Frames per request (default: 16)')
+    parser.add_argument('--landmarks', type=int, default=33,
+                        help='Landmarks per frame (default: 33, the full pose; the zone landmarks for raw-landmark models)')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per concurrency level (default: 500)')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16, 64],
+                        help='Concurrent clients, one run per value (default: 1 4 16 64)')
+    parser.add_argument('--token', default=None, help='Bearer token, if the endpoint requires one')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds (default: 30)')
+    parser.add_argument('--save', default=None, help='Write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    headers = {'Content-Type': 'application/json'}
+    if args.token:
+        headers['Authorization'] = f'Bearer {args.token}'
+    payloads = make_payloads(max(args.requests, 1), args.zone, args.seq_len, args.landmarks)
+
+    # One untimed request loads the model
+    post(args.url, payloads[0], headers, args.timeout)
+
+    results = []
+    for concurrency in args.concurrency:
+        summary = run_level(args.url, payloads, max(concurrency, 1), headers, args.timeout)
+        print_summary(summary)
+        results.append(summary)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
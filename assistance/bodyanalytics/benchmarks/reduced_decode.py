@@ -0,0 +1,126 @@
+"""
+Reduced-resolution decode benchmark for datatraitement.
+
+Writes a synthetic set of large JPEGs into a temporary directory, then
+times the two decode strategies of AdvancedImageProcessor.load_image
+followed by the same resize to MAX_IMAGE_SIDE:
+- full: cv2.imread + cv2.resize;
+- reduced: image_decode.imread_max_side (libjpeg 1/2, 1/4 or 1/8 scaled
+  decode) + cv2.resize.
+
+It reports the median ms per image, the decoded megapixels per image and
+the speedup.
+
+Usage (from assistance/):
+    python -m bodyanalytics.benchmarks.reduced_decode --count 20 --size 4000x3000
+    python -m bodyanalytics.benchmarks.reduced_decode --size 1920x1080 --size 6000x4000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from bodyanalytics.datatraitement import MAX_IMAGE_SIDE
+from bodyanalytics.image_decode import imread_max_side
+
+SIZES = ['1920x1080', '4000x3000', '6000x4000']
+
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def make_images(directory, count, width, height, quality, seed=0):
+    """Smooth gradients plus noise, so the JPEGs are not trivially small"""
+    rng = np.random.default_rng(seed)
+    ys, xs = np.mgrid[0:height, 0:width]
+    paths = []
+    for i in range(count):
+        base = np.stack([
+            (xs * (i + 1)) % 256,
+            (ys * (i + 2)) % 256,
+            ((xs + ys) // (i + 1)) % 256,
+        ], axis=-1).astype(np.int16)
+        noise = rng.integers(-24, 25, size=base.shape, dtype=np.int16)
+        img = np.clip(base + noise, 0, 255).astype(np.uint8)
+        ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise RuntimeError('cv2.imencode failed')
+        path = Path(directory) / f"synthetic_{width}x{height}_{i:03d}.jpg"
+        path.write_bytes(encoded.tobytes())
+        paths.append(path)
+    return paths
+
+
+def resize_max_side(img):
+    h, w = img.shape[:2]
+    if max(h, w) > MAX_IMAGE_SIDE:
+        scale = MAX_IMAGE_SIDE / max(h, w)
+        img = cv2.resize(img, (int(w * scale), int(h * scale)))
+    return img
+
+
+def time_strategy(paths, load, repeat):
+    runs = []
+    decoded_px = 0
+    for _ in range(repeat):
+        decoded_px = 0
+        start = time.perf_counter()
+        for path in paths:
+            img = load(path)
+            decoded_px += img.shape[0] * img.shape[1]
+            resize_max_side(img)
+        runs.append((time.perf_counter() - start) / len(paths))
+    return {
+        'ms_per_image': statistics.median(runs) * 1000,
+        'decoded_mpx': decoded_px / len(paths) / 1e6,
+    }
+
+
+def run(sizes, count, repeat, quality):
+    strategies = {
+        'full': lambda path: cv2.imread(str(path)),
+        'reduced': lambda path: imread_max_side(path, MAX_IMAGE_SIDE),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for width, height in sizes:
+            paths = make_images(workdir, count, width, height, quality)
+            results[f"{width}x{height}"] = {
+                name: time_strategy(paths, load, repeat) for name, load in strategies.items()
+            }
+    return results
+
+
+def print_results(results):
+    for size, summary in results.items():
+        full, reduced = summary['full'], summary['reduced']
+        speedup = full['ms_per_image'] / reduced['ms_per_image'] if reduced['ms_per_image'] else float('inf')
+        print(
+            f"{size:>10s}  full {full['ms_per_image']:7.1f} ms ({full['decoded_mpx']:5.1f} MP)"
+            f"  reduced {reduced['ms_per_image']:7.1f} ms ({reduced['decoded_mpx']:5.2f} MP)"
+            f"  x{speedup:.1f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Full vs reduced-resolution JPEG decode benchmark')
+    parser.add_argument('--size', action='append', type=parse_size,
+                        help=f"WIDTHxHEIGHT of the synthetic images, repeatable (default: {', '.join(SIZES)})")
+    parser.add_argument('--count', type=int, default=10, help='Images per size (default: 10)')
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over the set per strategy (default: 3)')
+    parser.add_argument('--quality', type=int, default=90, help='JPEG quality of the synthetic images (default: 90)')
+    args = parser.parse_args(argv)
+
+    sizes = args.size or [parse_size(size) for size in SIZES]
+    results = run(sizes, max(args.count, 1), max(args.repeat, 1), args.quality)
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+CPU training settings for the sequential models of train.py.
+
+On a machine without GPU the LSTM stack trains in fp32 with whatever
+thread pools torch picked. This module gathers the knobs of the CPU mode:
+- threads: intra-op threads (used inside one op, e.g. the LSTM GEMMs) and
+  inter-op threads (independent ops run concurrently). The inter-op pool
+  can only be sized before its first use, so configure_threads() is called
+  once, at startup;
+- precision: bfloat16 autocast. bf16 only pays off on CPUs with native
+  instructions (AVX512-BF16, AMX); elsewhere it is emulated and slower
+  than fp32, so 'auto' keeps fp32 there;
+- compilation: torch.compile when this torch has it, TorchScript
+  otherwise. A model that TorchScript cannot compile stays eager.
+  torch.compile is lazy: backend failures (no C++ compiler, unsupported
+  platform, dynamo errors) only show on the first call, so compile_model()
+  runs one forward/backward on a sample batch before keeping a module.
+The compiled module shares its parameters with the eager one: optimizers
+and checkpoints keep using the eager model.
+"""
+import contextlib
+import logging
+import os
+from typing import Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ('auto', 'fp32', 'bf16')
+COMPILE_MODES = ('none', 'compile', 'script')
+
+# CPU flags (/proc/cpuinfo) of native bfloat16 arithmetic
+BF16_CPU_FLAGS = ('avx512_bf16', 'amx_bf16')
+
+
+def cpu_flags() -> set:
+    try:
+        with open('/proc/cpuinfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return set(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def cpu_has_native_bf16() -> bool:
+    return any(flag in cpu_flags() for flag in BF16_CPU_FLAGS)
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_precision(precision: str) -> str:
+    """'auto' -> 'bf16' on CPUs with native bf16, 'fp32' otherwise"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, not {precision!r}")
+    if precision == 'auto':
+        return 'bf16' if cpu_has_native_bf16() else 'fp32'
+    return precision
+
+
+def configure_threads(intra_op: Optional[int] = None, inter_op: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Size the torch thread pools; None keeps the current value.
+    Returns the (intra-op, inter-op) thread counts in effect.
+    """
+    if intra_op is not None:
+        torch.set_num_threads(max(int(intra_op), 1))
+    if inter_op is not None:
+        try:
+            torch.set_num_interop_threads(max(int(inter_op), 1))
+        except RuntimeError as e:
+            # Pool already started (or already sized): keep it
+            logger.warning(f"inter-op threads unchanged: {e}")
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+def autocast(precision: str):
+    """Context of the forward pass and loss for a resolved precision"""
+    if precision == 'bf16':
+        return torch.autocast(device_type='cpu', dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def probe(module: nn.Module, model: nn.Module, example_inputs: Optional[Sequence[torch.Tensor]],
+          precision: str = 'fp32'):
+    """
+    One forward and backward of module on example_inputs (nothing without
+    inputs), so that lazy compilation happens now; the gradients are cleared
+    """
+    if example_inputs is None:
+        return
+    try:
+        with autocast(precision):
+            outputs = module(*example_inputs)
+        if isinstance(outputs, torch.Tensor):
+            outputs = (outputs,)
+        total = sum(output.float().sum() for output in outputs if isinstance(output, torch.Tensor))
+        if isinstance(total, torch.Tensor) and total.requires_grad:
+            total.backward()
+    finally:
+        model.zero_grad(set_to_none=True)
+
+
+def compile_model(model: nn.Module, mode: str, example_inputs: Optional[Sequence[torch.Tensor]] = None,
+                  precision: str = 'fp32') -> nn.Module:
+    """
+    Module used for the training steps: compiled (torch.compile), scripted
+    (TorchScript) or the model itself. Falls back to TorchScript when
+    torch.compile is missing or fails, and to eager when scripting fails.
+    example_inputs (a sample batch of the model's inputs) are run through
+    the compiled module under the precision's autocast, which surfaces the
+    failures that torch.compile only raises on its first call.
+    """
+    if mode not in COMPILE_MODES:
+        raise ValueError(f"compile mode must be one of {COMPILE_MODES}, not {mode!r}")
+    if mode == 'none':
+        return model
+    if mode == 'compile' and hasattr(torch, 'compile'):
+        try:
+            compiled = torch.compile(model)
+            probe(compiled, model, example_inputs, precision)
+            return compiled
+        except Exception as e:
+            logger.warning(f"torch.compile unavailable ({e}), trying TorchScript")
+    try:
+        scripted = torch.jit.script(model)
+        probe(scripted, model, example_inputs, precision)
+        return scripted
+    except Exception as e:
+        logger.warning(f"TorchScript failed ({e}), training in eager mode")
+        return model
@@ -1,13 +1,31 @@
 
+import argparse
 import cv2
-import mediapipe as mp
 import logging
+import multiprocessing
 import numpy as np
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Tuple, Dict, Optional, List
+from typing import Tuple, Dict, Optional, List, Iterable, Iterator
 import json
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+
+try:
+    from .detectors import get_face_detector, get_hands, get_pose, init_detectors
+    from .file_fingerprint import file_fingerprint
+    from .image_decode import imread_max_side
+    from .shards import SHARD_SIZE, ShardReader, ShardWriter
+except ImportError:
+    # Exécuté comme script depuis bodyanalytics/
+    from detectors import get_face_detector, get_hands, get_pose, init_detectors
+    from file_fingerprint import file_fingerprint
+    from image_decode import imread_max_side
+    from shards import SHARD_SIZE, ShardReader, ShardWriter
 
 # ============= CONFIGURATION LOGGING =============
 logging.basicConfig(
@@ -30,65 +48,251 @@ OUTPUT_FULL_BODY = OUTPUT_BASE_DIR / "full_body_128"
 OUTPUT_EYES = OUTPUT_BASE_DIR / "eyes_64"
 OUTPUT_MOUTH = OUTPUT_BASE_DIR / "mouth_64"
 OUTPUT_HANDS = OUTPUT_BASE_DIR / "hands_64"
+OUTPUT_SHARDS = OUTPUT_BASE_DIR / "shards"
 
-STATS_DIR = Path("datatraitement_advanced_stats")
-STATS_DIR.mkdir(parents=True, exist_ok=True)
+OUTPUT_FORMATS = ('jpeg', 'shards', 'both')
+
+# Les images plus grandes sont réduites avant la détection
+MAX_IMAGE_SIDE = 800
+
+# full: décodage complet puis resize; reduced: décodage JPEG à 1/2, 1/4 ou 1/8
+DECODE_STRATEGIES = ('reduced', 'full')
+
+# static: chaque frame vidéo est une image indépendante
+# track: frames d'un clip suivies par MediaPipe (static_image_mode=False)
+VIDEO_MODES = ('static', 'track')
+
+# État de suivi d'une image dans un batch: image indépendante, frame suivie,
+# ou première frame d'un segment suivi (le suivi repart de zéro)
+STATIC, TRACK, TRACK_RESTART = 'static', 'track', 'restart'
+
+# Images décodées traitées ensemble (boîtes des zones calculées en une fois)
+BATCH_SIZE = 8
+
+# Taille des crops par zone dans les shards
+ZONE_CROP_SHAPES = {
+    'full_body': (128, 128, 3),
+    'eyes': (64, 64, 3),
+    'mouth': (64, 64, 3),
+    'hands': (64, 64, 3),
+}
 
-# Créer tous les répertoires
-for output_dir in [OUTPUT_BASE_DIR, OUTPUT_FULL_BODY, OUTPUT_EYES, OUTPUT_MOUTH, OUTPUT_HANDS, STATS_DIR]:
-    output_dir.mkdir(parents=True, exist_ok=True)
+# ============= ZONES (landmarks MediaPipe Pose) =============
 
-# MediaPipe initializers
-mp_pose = mp.solutions.pose
-mp_face_detection = mp.solutions.face_detection
-mp_hands = mp.solutions.hands
+NUM_POSE_LANDMARKS = 33
+
+# zone: (indices des landmarks, marge x/y en pixels, marge x/y en fraction de l'image,
+#        points minimum, seuil de visibilité ou None)
+# Indices de Pose: 1-6 coins et centres des yeux, 9-10 coins de la bouche
+ZONE_SPECS = {
+    'full_body': (range(NUM_POSE_LANDMARKS), (0, 0), (0.05, 0.05), 1, None),
+    'eyes': ([1, 2, 3, 4, 5, 6], (20, 15), (0, 0), 4, None),
+    'mouth': ([9, 10], (15, 10), (0, 0), 2, None),
+    'hand_left': ([15, 17, 19, 21], (20, 20), (0, 0), 2, 0.5),
+    'hand_right': ([16, 18, 20, 22], (20, 20), (0, 0), 2, 0.5),
+}
+ZONE_NAMES = tuple(ZONE_SPECS)
+HAND_ZONES = ('hand_left', 'hand_right')
+
+ZONE_MEMBERS = np.array([np.isin(np.arange(NUM_POSE_LANDMARKS), list(spec[0])) for spec in ZONE_SPECS.values()])
+ZONE_MARGIN_PX = np.array([spec[1] for spec in ZONE_SPECS.values()], dtype=np.float32)
+ZONE_MARGIN_REL = np.array([spec[2] for spec in ZONE_SPECS.values()], dtype=np.float64)
+ZONE_MIN_POINTS = np.array([spec[3] for spec in ZONE_SPECS.values()])
+ZONE_VISIBILITY = np.array([-np.inf if spec[4] is None else spec[4] for spec in ZONE_SPECS.values()], dtype=np.float32)
+
+
+def compute_zone_boxes(landmarks: np.ndarray, sizes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Boîtes de toutes les zones pour un batch d'images, en une passe NumPy
+    landmarks: (B, 33, 4) float32, x/y en pixels; sizes: (B, 2) = (h, w)
+    Retourne: boxes (B, Z, 4) int = (x_min, x_max, y_min, y_max), valid (B, Z) bool
+    (Z = len(ZONE_NAMES))
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    sizes = np.asarray(sizes)
+    wh = sizes[:, ::-1].astype(np.float64)  # (B, 2) = (w, h)
+    
+    # Points retenus par zone: (B, Z, 33)
+    visible = landmarks[:, None, :, 3] > ZONE_VISIBILITY[None, :, None]
+    members = ZONE_MEMBERS[None] & visible
+    valid = members.sum(axis=-1) >= ZONE_MIN_POINTS[None]
+    
+    xy = landmarks[:, None, :, :2]  # (B, 1, 33, 2)
+    mask = members[..., None]
+    lo = np.where(mask, xy, np.float32(np.inf)).min(axis=2)  # (B, Z, 2)
+    hi = np.where(mask, xy, np.float32(-np.inf)).max(axis=2)
+    
+    # Marges en float32 comme les coordonnées
+    margin = ZONE_MARGIN_PX[None] + (ZONE_MARGIN_REL[None] * wh[:, None]).astype(np.float32)
+    lo = np.maximum(lo - margin, np.float32(0))
+    hi = np.minimum(hi + margin, wh[:, None].astype(np.float32))
+    
+    boxes = np.stack([lo[..., 0], hi[..., 0], lo[..., 1], hi[..., 1]], axis=-1)
+    boxes = np.where(valid[..., None], boxes, 0).astype(np.int64)  # troncature comme int()
+    valid &= (boxes[..., 1] > boxes[..., 0]) & (boxes[..., 3] > boxes[..., 2])
+    return boxes, valid
 
-pose = mp_pose.Pose(static_image_mode=True, model_complexity=1, min_detection_confidence=0.5)
-face_detector = mp_face_detection.FaceDetection(min_detection_confidence=0.5)
-hands = mp_hands.Hands(static_image_mode=True, min_detection_confidence=0.5)
+
+def square_pad(crop: np.ndarray) -> np.ndarray:
+    """Padding noir pour rendre le crop carré (centré)"""
+    ch, cw = crop.shape[:2]
+    if ch > cw:
+        pad_left = (ch - cw) // 2
+        pad_right = ch - cw - pad_left
+        return cv2.copyMakeBorder(crop, 0, 0, pad_left, pad_right, cv2.BORDER_CONSTANT)
+    pad_top = (cw - ch) // 2
+    pad_bottom = cw - ch - pad_top
+    return cv2.copyMakeBorder(crop, pad_top, pad_bottom, 0, 0, cv2.BORDER_CONSTANT)
+
+
+STATS_DIR = Path("datatraitement_advanced_stats")
+MANIFEST_FILE = STATS_DIR / "processing_manifest.json"
+
+
+def ensure_output_dirs():
+    """Crée tous les répertoires de sortie (appelé au lancement, pas à l'import)"""
+    for output_dir in [OUTPUT_BASE_DIR, OUTPUT_FULL_BODY, OUTPUT_EYES, OUTPUT_MOUTH, OUTPUT_HANDS, STATS_DIR]:
+        output_dir.mkdir(parents=True, exist_ok=True)
 
 # Landmarks indices MediaPipe Pose
 POSE_LANDMARKS = {
-    'eyes': [33, 133, 362, 263],  # left eye, right eye
-    'mouth': [78, 308],  # lips corners
+    'eyes': [1, 2, 3, 4, 5, 6],  # left eye, right eye
+    'mouth': [9, 10],  # lips corners
     'hands': list(range(15, 21)) + list(range(16, 22)),  # hands
     'body': list(range(0, 33))
 }
 
+STATS_KEYS = ('total', 'full_body', 'eyes', 'mouth', 'hands', 'failed')
+
+
+def new_stats() -> Dict[str, int]:
+    return {key: 0 for key in STATS_KEYS}
+
+
+def merge_stats(total: Dict[str, int], stats: Dict[str, int]) -> Dict[str, int]:
+    for key in stats:
+        total[key] += stats[key]
+    return total
+
+
+# ============= FRAMES VIDÉO (--video-mode track) =============
+
+# "<clip>_<numéro>.jpg": les frames d'un clip partagent le préfixe
+FRAME_NAME = re.compile(r'^(?P<clip>.*?)[_-]?(?P<index>\d+)$')
+
+
+def is_video_frame(img_file: Path) -> bool:
+    return VIDEO_FRAMES_DIR in img_file.parents
+
+
+def frame_position(img_file: Path) -> Tuple[Tuple[str, str], int]:
+    """((répertoire, clip), numéro de frame) d'après le nom du fichier"""
+    match = FRAME_NAME.match(img_file.stem)
+    if match is None:
+        return (str(img_file.parent), img_file.stem), 0
+    return (str(img_file.parent), match.group('clip')), int(match.group('index'))
+
+
+def frame_sort_key(img_file: Path) -> Tuple[Tuple[str, str], int, str]:
+    """Ordre de lecture: par clip puis par numéro (frame_2 avant frame_10)"""
+    clip, index = frame_position(img_file)
+    return clip, index, img_file.name
+
 # ============= CLASSE 1: ZONE DETECTOR =============
 
 class ZoneDetector:
-    """Détecte et extrait régions d'intérêt (yeux, bouche, mains, corps)"""
+    """
+    Détecte et extrait régions d'intérêt (yeux, bouche, mains, corps)
+    Les modèles MediaPipe sont partagés par process et créés au premier usage.
+    """
+    
+    def __init__(self, tracking_confidence: float = 0.5):
+        self.tracking_confidence = tracking_confidence
+    
+    @property
+    def pose(self):
+        return get_pose(static_image_mode=True, model_complexity=1, min_detection_confidence=0.5)
+    
+    @property
+    def tracking_pose(self):
+        """
+        Pose en mode vidéo: la personne est suivie d'une frame à l'autre (landmarks lissés),
+        la détection complète ne repart que si la confiance du suivi passe sous
+        tracking_confidence
+        """
+        return get_pose(static_image_mode=False, model_complexity=1, min_detection_confidence=0.5,
+                        min_tracking_confidence=self.tracking_confidence)
+    
+    def reset_tracking(self):
+        """Oublie la personne suivie: la frame suivante repasse par la détection complète"""
+        self.tracking_pose.reset()
     
-    def __init__(self):
-        self.pose = mp_pose.Pose(static_image_mode=True, model_complexity=1, min_detection_confidence=0.5)
-        self.face_detector = mp_face_detection.FaceDetection(min_detection_confidence=0.5)
-        self.hands = mp_hands.Hands(static_image_mode=True, min_detection_confidence=0.5)
+    @property
+    def face_detector(self):
+        return get_face_detector(min_detection_confidence=0.5)
     
-    def detect_pose_landmarks(self, image: np.ndarray) -> Optional[Dict]:
-        """Détecte tous les landmarks pose"""
+    @property
+    def hands(self):
+        return get_hands(static_image_mode=True, min_detection_confidence=0.5)
+    
+    def _pose_points(self, image: np.ndarray, tracking: bool) -> Optional[List]:
+        """Landmarks MediaPipe bruts d'une image, None sans pose complète"""
         try:
-            h, w = image.shape[:2]
             rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            results = self.pose.process(rgb)
+            pose = self.tracking_pose if tracking else self.pose
+            results = pose.process(rgb)
             
             if not results.pose_landmarks:
                 return None
             
-            landmarks = []
-            for lm in results.pose_landmarks.landmark:
-                landmarks.append({
-                    'x': lm.x * w,
-                    'y': lm.y * h,
-                    'z': lm.z,
-                    'visibility': lm.visibility
-                })
-            
-            return {'landmarks': landmarks, 'valid': len(landmarks) == 33}
+            points = results.pose_landmarks.landmark
+            if len(points) != NUM_POSE_LANDMARKS:
+                return None
+            return points
         except Exception as e:
             logger.debug(f"⚠️ Erreur pose detection: {e}")
             return None
     
+    def detect_pose_batch(self, images: List[np.ndarray],
+                          tracking: Optional[List[str]] = None) -> Tuple[List[int], np.ndarray]:
+        """
+        Détecte les landmarks pose d'un batch d'images, dans l'ordre
+        tracking: état par image (STATIC, TRACK, TRACK_RESTART), STATIC par défaut
+        Retourne: (indices des images avec une pose, (n, 33, 4) float32 = x, y (pixels), z, visibility)
+        """
+        if tracking is None:
+            tracking = [STATIC] * len(images)
+        
+        detected, points, sizes = [], [], []
+        for i, (image, state) in enumerate(zip(images, tracking)):
+            if state == TRACK_RESTART:
+                self.reset_tracking()
+            found = self._pose_points(image, state != STATIC)
+            if found is None:
+                continue
+            detected.append(i)
+            points.extend(found)
+            sizes.append(image.shape[:2])
+        
+        if not detected:
+            return [], np.empty((0, NUM_POSE_LANDMARKS, 4), dtype=np.float32)
+        
+        # Un seul tableau pour les landmarks de tout le batch, puis passage en pixels
+        landmarks = np.fromiter(
+            (value for lm in points for value in (lm.x, lm.y, lm.z, lm.visibility)),
+            dtype=np.float64, count=len(points) * 4,
+        ).reshape(len(detected), NUM_POSE_LANDMARKS, 4)
+        landmarks[:, :, :2] *= np.array(sizes, dtype=np.float64)[:, None, ::-1]
+        return detected, landmarks.astype(np.float32)
+    
+    def detect_pose_landmarks(self, image: np.ndarray, tracking: bool = False) -> Optional[np.ndarray]:
+        """
+        Détecte tous les landmarks pose (suivi vidéo si tracking)
+        Retourne: (33, 4) float32 = x, y (pixels), z, visibility
+        """
+        detected, landmarks = self.detect_pose_batch([image], [TRACK if tracking else STATIC])
+        return landmarks[0] if detected else None
+    
     def detect_face_region(self, image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
         """Détecte région du visage"""
         try:
@@ -112,247 +316,694 @@ class ZoneDetector:
             logger.debug(f"⚠️ Erreur face detection: {e}")
             return None
     
-    def extract_eyes(self, image: np.ndarray, landmarks: list) -> Optional[np.ndarray]:
-        """Extrait région des yeux"""
+    def extract_zones(self, images: List[np.ndarray], landmarks: np.ndarray) -> List[Dict]:
+        """
+        Extrait les zones d'un batch d'images
+        landmarks: (B, 33, 4) de detect_pose_landmarks
+        Retourne par image: {full_body, eyes, mouth, hands}
+        """
+        sizes = np.array([img.shape[:2] for img in images]).reshape(-1, 2)
+        boxes, valid = compute_zone_boxes(landmarks, sizes)
+        
+        zones = []
+        for b, image in enumerate(images):
+            crops = {'full_body': None, 'eyes': None, 'mouth': None, 'hands': []}
+            for z in np.flatnonzero(valid[b]):
+                name = ZONE_NAMES[z]
+                x_min, x_max, y_min, y_max = boxes[b, z]
+                try:
+                    crop = image[y_min:y_max, x_min:x_max]
+                    if name == 'full_body':
+                        crop = square_pad(crop)
+                    height, width = ZONE_CROP_SHAPES['hands' if name in HAND_ZONES else name][:2]
+                    resized = cv2.resize(crop, (width, height), interpolation=cv2.INTER_AREA)
+                except Exception as e:
+                    logger.debug(f"⚠️ Erreur extraction {name}: {e}")
+                    continue
+                if name in HAND_ZONES:
+                    crops['hands'].append(resized)
+                else:
+                    crops[name] = resized
+            zones.append(crops)
+        return zones
+
+
+# ============= CLASSE 2: BATCH PROCESSOR =============
+
+class AdvancedImageProcessor:
+    """Traite images avec détection multi-zone"""
+    
+    def __init__(self, decode_strategy: str = 'reduced', video_mode: str = 'static',
+                 tracking_confidence: float = 0.5):
+        if decode_strategy not in DECODE_STRATEGIES:
+            raise ValueError(f"Stratégie de décodage inconnue: {decode_strategy}")
+        if video_mode not in VIDEO_MODES:
+            raise ValueError(f"Mode vidéo inconnu: {video_mode}")
+        self.zone_detector = ZoneDetector(tracking_confidence)
+        self.decode_strategy = decode_strategy
+        self.video_mode = video_mode
+        self.tracking_confidence = tracking_confidence
+        # Dernière frame suivie: ((répertoire, clip), numéro)
+        self.last_frame = None
+        self.tracked_segments = 0
+    
+    def process_images(self, images: List[np.ndarray],
+                       tracking: Optional[List[str]] = None) -> List[Dict[str, Optional[np.ndarray]]]:
+        """
+        Traite un batch d'images et extrait toutes les zones
+        Les boîtes de toutes les zones sont calculées en une fois pour le batch
+        tracking: état de suivi par image (voir tracking_state), STATIC par défaut
+        Retourne par image: {full_body, eyes, mouth, hands, landmarks}
+        """
+        results = [
+            {'full_body': None, 'eyes': None, 'mouth': None, 'hands': [], 'landmarks': None}
+            for _ in images
+        ]
+        
+        # Redimensionner si trop gros
+        resized = []
+        for img in images:
+            h, w = img.shape[:2]
+            if max(h, w) > MAX_IMAGE_SIDE:
+                scale = MAX_IMAGE_SIDE / max(h, w)
+                img = cv2.resize(img, (int(w*scale), int(h*scale)))
+            resized.append(img)
+        
+        # Détection pose
+        detected, landmarks = self.zone_detector.detect_pose_batch(resized, tracking)
+        for i, image_landmarks in zip(detected, landmarks):
+            results[i]['landmarks'] = image_landmarks
+        
+        # Extraction zones
+        if detected:
+            zones = self.zone_detector.extract_zones([resized[i] for i in detected], landmarks)
+            for i, crops in zip(detected, zones):
+                results[i].update(crops)
+        
+        return results
+    
+    def process_image(self, img: np.ndarray, tracking: str = STATIC) -> Dict[str, Optional[np.ndarray]]:
+        """
+        Traite une image et extrait toutes les zones
+        Retourne: {full_body, eyes, mouth, hands, landmarks}
+        """
+        return self.process_images([img], [tracking])[0]
+    
+    def tracking_state(self, img_file: Path) -> str:
+        """
+        État de suivi de img_file, à demander dans l'ordre des images:
+        TRACK pour une frame vidéo suivie (mode track), TRACK_RESTART quand le clip
+        change ou que les numéros reculent, STATIC sinon
+        """
+        if self.video_mode != 'track' or not is_video_frame(img_file):
+            return STATIC
+        clip, index = frame_position(img_file)
+        restart = self.last_frame is None or self.last_frame[0] != clip or index <= self.last_frame[1]
+        if restart:
+            self.tracked_segments += 1
+        self.last_frame = (clip, index)
+        return TRACK_RESTART if restart else TRACK
+    
+    def load_image(self, img_file: Path) -> Optional[np.ndarray]:
+        """
+        Étape décodage (relâche le GIL)
+        En stratégie reduced, un JPEG trop grand est décodé directement à l'échelle
+        1/2, 1/4 ou 1/8 qui reste au-dessus de MAX_IMAGE_SIDE (en-tête lu d'abord)
+        """
+        if self.decode_strategy == 'reduced':
+            return imread_max_side(img_file, MAX_IMAGE_SIDE)
+        return cv2.imread(str(img_file))
+    
+    def read_image(self, img_file: Path) -> Optional[np.ndarray]:
+        """load_image, None si le fichier est illisible"""
         try:
-            h, w = image.shape[:2]
-            
-            # Points des yeux
-            eye_indices = [33, 133, 362, 263, 160, 387]  # left+right eyes+corners
-            points = []
-            
-            for idx in eye_indices:
-                if idx < len(landmarks):
-                    points.append([landmarks[idx]['x'], landmarks[idx]['y']])
-            
-            if len(points) < 4:
-                return None
-            
-            points = np.array(points, dtype=np.float32)
-            x_min = int(max(np.min(points[:, 0]) - 20, 0))
-            x_max = int(min(np.max(points[:, 0]) + 20, w))
-            y_min = int(max(np.min(points[:, 1]) - 15, 0))
-            y_max = int(min(np.max(points[:, 1]) + 15, h))
-            
-            crop = image[y_min:y_max, x_min:x_max]
-            if crop.size == 0:
-                return None
-            
-            # Redimensionner à 64x64
-            resized = cv2.resize(crop, (64, 64), interpolation=cv2.INTER_AREA)
-            return resized
+            return self.load_image(img_file)
         except Exception as e:
-            logger.debug(f"⚠️ Erreur extraction yeux: {e}")
+            logger.debug(f"⚠️ Erreur lecture {img_file}: {e}")
             return None
     
-    def extract_mouth(self, image: np.ndarray, landmarks: list) -> Optional[np.ndarray]:
-        """Extrait région de la bouche"""
+    def extract_batch(self, items: List[Tuple[Path, str, Optional[np.ndarray]]],
+                      output_format: str = 'jpeg') -> List[Dict]:
+        """
+        Étape inférence: zones d'un batch d'images décodées [(image, morpho, img)], sans I/O disque
+        Retourne par image: {stats, outputs (JPEG à écrire), writes, samples, landmarks}
+        writes = [(fichier, crop)] pour l'étape écriture
+        samples = [(zone, nom, crop)] pour le writer de shards (format shards/both)
+        """
+        
+        results, decoded = [], []
+        for img_file, morpho, img in items:
+            stats = new_stats()
+            stats['total'] += 1
+            result = {'stats': stats, 'outputs': [], 'writes': [], 'samples': [], 'landmarks': None}
+            results.append(result)
+            if img is None:
+                stats['failed'] += 1
+            else:
+                decoded.append((result, img_file, morpho, img))
+        
+        if not decoded:
+            return results
+        
         try:
-            h, w = image.shape[:2]
-            
-            # Points de la bouche
-            mouth_indices = [0, 17, 78, 308, 13, 14]  # mouth points
-            points = []
-            
-            for idx in mouth_indices:
-                if idx < len(landmarks):
-                    points.append([landmarks[idx]['x'], landmarks[idx]['y']])
+            # Traiter (états de suivi dans l'ordre des images)
+            tracking = [self.tracking_state(img_file) for _, img_file, _, _ in decoded]
+            zones_batch = self.process_images([img for _, _, _, img in decoded], tracking)
+        except Exception as e:
+            for result, _, _, _ in decoded:
+                result['stats']['failed'] += 1
+            logger.debug(f"⚠️ Erreur: {e}")
+            return results
+        
+        write_jpeg = output_format in ('jpeg', 'both')
+        keep_samples = output_format in ('shards', 'both')
+        for (result, img_file, morpho, _), zones in zip(decoded, zones_batch):
+            crops = []
+            if zones['full_body'] is not None:
+                crops.append(('full_body', OUTPUT_FULL_BODY, img_file.name, zones['full_body']))
+            if zones['eyes'] is not None:
+                crops.append(('eyes', OUTPUT_EYES, f"eyes_{img_file.stem}.jpg", zones['eyes']))
+            if zones['mouth'] is not None:
+                crops.append(('mouth', OUTPUT_MOUTH, f"mouth_{img_file.stem}.jpg", zones['mouth']))
+            for i, hand in enumerate(zones['hands']):
+                crops.append(('hands', OUTPUT_HANDS, f"hand{i}_{img_file.stem}.jpg", hand))
             
-            if len(points) < 3:
-                return None
+            for zone, zone_dir, name, crop in crops:
+                if write_jpeg:
+                    output_file = zone_dir / morpho / name
+                    result['writes'].append((output_file, crop))
+                    result['outputs'].append(str(output_file))
+                if keep_samples:
+                    result['samples'].append((zone, name, crop))
+                result['stats'][zone] += 1
             
-            points = np.array(points, dtype=np.float32)
-            x_min = int(max(np.min(points[:, 0]) - 15, 0))
-            x_max = int(min(np.max(points[:, 0]) + 15, w))
-            y_min = int(max(np.min(points[:, 1]) - 10, 0))
-            y_max = int(min(np.max(points[:, 1]) + 10, h))
+            if keep_samples:
+                result['landmarks'] = zones['landmarks']
+        
+        return results
+    
+    def extract(self, img_file: Path, morpho: str, img: Optional[np.ndarray], output_format: str = 'jpeg') -> Dict:
+        """Étape inférence pour une seule image (voir extract_batch)"""
+        return self.extract_batch([(img_file, morpho, img)], output_format)[0]
+    
+    @staticmethod
+    def write_outputs(writes: List[Tuple[Path, np.ndarray]]):
+        """Étape écriture: encode et sauvegarde les crops en JPEG"""
+        for output_file, crop in writes:
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            cv2.imwrite(str(output_file), crop)
+    
+    def process_files(self, items: List[Tuple[Path, str]], output_format: str = 'jpeg',
+                      batch_size: int = BATCH_SIZE, stages: Optional[Dict[str, 'StageStats']] = None) -> List[Dict]:
+        """
+        Traite des (image, morpho) par batchs de batch_size et sauvegarde leurs zones
+        (les trois étapes à la suite), dans l'ordre
+        stages: StageStats decode/inference/write à alimenter (comme le StagedExtractor)
+        Retourne par image: {stats, outputs (JPEG écrits), samples, landmarks}
+        """
+        if stages is None:
+            stages = new_stage_stats()
+        results = []
+        batch_size = max(int(batch_size), 1)
+        for start in range(0, len(items), batch_size):
+            started = time.perf_counter()
+            batch = [
+                (img_file, morpho, self.read_image(img_file))
+                for img_file, morpho in items[start:start + batch_size]
+            ]
+            stages['decode'].add(time.perf_counter() - started, count=len(batch))
             
-            crop = image[y_min:y_max, x_min:x_max]
-            if crop.size == 0:
-                return None
+            started = time.perf_counter()
+            extracted = self.extract_batch(batch, output_format)
+            stages['inference'].add(time.perf_counter() - started, count=len(batch))
             
-            # Redimensionner à 64x64
-            resized = cv2.resize(crop, (64, 64), interpolation=cv2.INTER_AREA)
-            return resized
-        except Exception as e:
-            logger.debug(f"⚠️ Erreur extraction bouche: {e}")
-            return None
+            for result in extracted:
+                writes = result.pop('writes')
+                if writes:
+                    started, errors = time.perf_counter(), 0
+                    try:
+                        self.write_outputs(writes)
+                    except Exception as e:
+                        result['stats']['failed'] += 1
+                        errors = 1
+                        logger.debug(f"⚠️ Erreur: {e}")
+                    stages['write'].add(time.perf_counter() - started, errors=errors)
+                results.append(result)
+        return results
     
-    def extract_hands(self, image: np.ndarray, landmarks: list) -> List[np.ndarray]:
-        """Extrait régions des mains"""
-        hands_crops = []
-        try:
-            h, w = image.shape[:2]
-            
-            # Indices des mains dans MediaPipe Pose
-            left_hand_indices = [15, 17, 19, 21]  # left hand points
-            right_hand_indices = [16, 18, 20, 22]  # right hand points
+    def process_file(self, img_file: Path, morpho: str, output_format: str = 'jpeg') -> Dict:
+        """
+        Traite une image et sauvegarde ses zones (les trois étapes à la suite)
+        Retourne: {stats, outputs (JPEG écrits), samples, landmarks}
+        """
+        return self.process_files([(img_file, morpho)], output_format)[0]
+    
+    def process_batch(self, input_dir: Path, morpho: str) -> Dict:
+        """Traite un batch d'images et sauvegarde par zone"""
+        
+        stats = new_stats()
+        
+        img_files = sorted(input_dir.glob("*.jpg"))
+        for result in self.process_files([(img_file, morpho) for img_file in img_files]):
+            merge_stats(stats, result['stats'])
             
-            for hand_indices in [left_hand_indices, right_hand_indices]:
-                points = []
-                for idx in hand_indices:
-                    if idx < len(landmarks) and landmarks[idx]['visibility'] > 0.5:
-                        points.append([landmarks[idx]['x'], landmarks[idx]['y']])
-                
-                if len(points) < 2:
-                    continue
-                
-                points = np.array(points, dtype=np.float32)
-                x_min = int(max(np.min(points[:, 0]) - 20, 0))
-                x_max = int(min(np.max(points[:, 0]) + 20, w))
-                y_min = int(max(np.min(points[:, 1]) - 20, 0))
-                y_max = int(min(np.max(points[:, 1]) + 20, h))
-                
-                crop = image[y_min:y_max, x_min:x_max]
-                if crop.size > 0:
-                    resized = cv2.resize(crop, (64, 64), interpolation=cv2.INTER_AREA)
-                    hands_crops.append(resized)
+            if stats['full_body'] % 50 == 0:
+                logger.info(f"   ✓ {stats['full_body']} images traitées")
         
-        except Exception as e:
-            logger.debug(f"⚠️ Erreur extraction mains: {e}")
+        return stats
+
+
+# ============= WORKERS (--workers N) =============
+
+# Processeur propre à chaque process du pool (MediaPipe n'est pas partageable)
+_worker_processor = None
+_worker_output_format = 'jpeg'
+_worker_batch_size = BATCH_SIZE
+
+
+def _init_worker(output_format: str = 'jpeg', decode_strategy: str = 'reduced',
+                 video_mode: str = 'static', tracking_confidence: float = 0.5,
+                 batch_size: int = BATCH_SIZE):
+    """Initialise le ZoneDetector du process worker"""
+    global _worker_processor, _worker_output_format, _worker_batch_size
+    # Un thread OpenCV par process: le parallélisme vient du pool
+    cv2.setNumThreads(1)
+    init_detectors('pose')
+    _worker_processor = AdvancedImageProcessor(decode_strategy, video_mode, tracking_confidence)
+    _worker_output_format = output_format
+    _worker_batch_size = batch_size
+
+
+def _process_units(units: List[Tuple[str, List[Path]]]) -> Tuple[List[List[Dict]], Dict[str, Tuple], int]:
+    """
+    Traite des unités de travail (images d'une morphologie partageant le même nom de sortie,
+    ou un clip vidéo entier en mode track), à la suite et par batchs d'images.
+    Retourne (résultats par unité, {étape: (images, secondes, erreurs)}, segments suivis),
+    que le parent additionne pour le rapport. En format shards les crops sont renvoyés
+    au parent, seul écrivain des shards.
+    """
+    items = [(img_file, morpho) for morpho, files in units for img_file in files]
+    stages = new_stage_stats()
+    segments_before = _worker_processor.tracked_segments
+    results = _worker_processor.process_files(items, _worker_output_format, _worker_batch_size, stages)
+    per_unit, start = [], 0
+    for _, files in units:
+        per_unit.append(results[start:start + len(files)])
+        start += len(files)
+    stage_totals = {name: (stage.count, stage.busy, stage.errors) for name, stage in stages.items()}
+    return per_unit, stage_totals, _worker_processor.tracked_segments - segments_before
+
+
+def group_units(units: List[Tuple[str, List[Path]]], batch_size: int) -> List[List[Tuple[str, List[Path]]]]:
+    """Tâches du pool: unités consécutives totalisant au moins batch_size images (sauf la dernière)"""
+    tasks, task, count = [], [], 0
+    for unit in units:
+        task.append(unit)
+        count += len(unit[1])
+        if count >= batch_size:
+            tasks.append(task)
+            task, count = [], 0
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+# ============= SORTIE EN SHARDS (--output-format shards|both) =============
+
+class ZoneShardOutput:
+    """
+    Écrit les crops de chaque zone dans un jeu de shards .npy (voir shards.py),
+    dans l'ordre du run séquentiel. Les images ignorées par le manifeste sont
+    recopiées depuis le jeu de shards précédent, sans redécodage.
+    """
+    
+    def __init__(self, base_dir: Path = OUTPUT_SHARDS, shard_size: int = SHARD_SIZE):
+        self.base_dir = base_dir
+        self.previous = {}
+        self.previous_by_source = {}
+        for zone in ZONE_CROP_SHAPES:
+            if ShardReader.exists(base_dir / zone):
+                reader = ShardReader(base_dir / zone)
+                by_source = defaultdict(list)
+                for i, sample in enumerate(reader.samples):
+                    by_source[sample['source']].append(i)
+                self.previous[zone] = reader
+                self.previous_by_source[zone] = by_source
+        self.writers = {
+            zone: ShardWriter(base_dir / zone, shape, shard_size=shard_size)
+            for zone, shape in ZONE_CROP_SHAPES.items()
+        }
+    
+    def previous_samples(self) -> set:
+        """Clés (zone, source, nom) des crops du jeu de shards précédent"""
+        return {
+            (zone, sample['source'], sample['name'])
+            for zone, reader in self.previous.items()
+            for sample in reader.samples
+        }
+    
+    def append(self, img_file: Path, morpho: str, result: Dict):
+        for zone, name, crop in result['samples']:
+            self.writers[zone].append(crop, result['landmarks'], source=str(img_file), morpho=morpho, name=name)
+    
+    def copy_previous(self, img_file: Path):
+        for zone, reader in self.previous.items():
+            for i in self.previous_by_source[zone].get(str(img_file), []):
+                crop, landmarks, sample = reader[i]
+                self.writers[zone].append(crop, landmarks, **sample)
+    
+    def close(self) -> Dict[str, int]:
+        # Les mmaps du jeu précédent empêchent de remplacer le répertoire sous Windows
+        for reader in self.previous.values():
+            reader.close()
+        self.previous.clear()
+        counts = {}
+        for zone, writer in self.writers.items():
+            writer.close()
+            counts[zone] = len(writer)
+        return counts
+
+
+# ============= PIPELINE À TROIS ÉTAGES (mode séquentiel) =============
+
+class StageStats:
+    """Images traitées, temps actif et erreurs d'une étape (thread-safe)"""
+    
+    def __init__(self, name: str, threads: int = 1):
+        self.name = name
+        self.threads = threads
+        self.count = 0
+        self.busy = 0.0
+        self.errors = 0
+        self._lock = threading.Lock()
+    
+    def add(self, seconds: float, count: int = 1, errors: int = 0):
+        with self._lock:
+            self.busy += seconds
+            self.count += count
+            self.errors += errors
+    
+    @property
+    def throughput(self) -> float:
+        """Débit de l'étape si elle n'attendait jamais les autres (images/s)"""
+        if not self.busy:
+            return 0.0
+        return self.count / (self.busy / self.threads)
+
+
+def new_stage_stats(threads: Tuple[int, int, int] = (1, 1, 1)) -> Dict[str, StageStats]:
+    """StageStats des étapes decode, inference et write"""
+    return {name: StageStats(name, count) for name, count in zip(('decode', 'inference', 'write'), threads)}
+
+
+def stage_report(stages: Dict[str, StageStats], waits: Dict[str, float], write_errors: int,
+                 elapsed: float) -> Dict:
+    """Débit par étape; la plus lente limite le pipeline"""
+    active = [name for name, stage in stages.items() if stage.count]
+    return {
+        'stages': {
+            name: {
+                'images': stage.count,
+                'threads': stage.threads,
+                'busy_seconds': round(stage.busy, 3),
+                'images_per_second': round(stage.throughput, 2),
+            }
+            for name, stage in stages.items()
+        },
+        'bottleneck': min(active, key=lambda name: stages[name].throughput) if active else None,
+        'inference_wait_seconds': {name: round(value, 3) for name, value in waits.items()},
+        'write_errors': write_errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'images_per_second': round(stages['inference'].count / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+class StagedExtractor:
+    """
+    Décodage (pool de threads, prefetch borné) → inférence (thread appelant,
+    MediaPipe, par batchs de batch_size images de la fenêtre de prefetch) →
+    encodage/écriture JPEG (pool de threads, file bornée).
+    cv2.imread/imwrite relâchent le GIL: le disque travaille pendant l'inférence.
+    Les résultats sortent dans l'ordre des sources.
+    """
+    
+    def __init__(self, processor: AdvancedImageProcessor, output_format: str = 'jpeg',
+                 decode_threads: int = 4, write_threads: int = 4, prefetch: int = 32,
+                 batch_size: int = BATCH_SIZE):
+        self.processor = processor
+        self.output_format = output_format
+        self.batch_size = max(int(batch_size), 1)
+        # La fenêtre de prefetch doit contenir un batch entier
+        self.prefetch = max(int(prefetch), self.batch_size)
+        decode_threads = max(int(decode_threads), 1)
+        write_threads = max(int(write_threads), 1)
         
-        return hands_crops
+        self.decoder = ThreadPoolExecutor(decode_threads, thread_name_prefix='decode')
+        self.writer = ThreadPoolExecutor(write_threads, thread_name_prefix='write')
+        self.stages = new_stage_stats((decode_threads, 1, write_threads))
+        # Temps passé par l'inférence à attendre le décodage / une place en écriture
+        self.waits = {'decode': 0.0, 'write': 0.0}
+        self.write_errors = 0
+        # (morpho, image) dont l'écriture a échoué, à retraiter au prochain run
+        self.failed_writes = []
+        self._write_slots = threading.BoundedSemaphore(self.prefetch)
+        self._pending_writes = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._elapsed = None
+    
+    def __enter__(self):
+        return self
     
-    def extract_full_body(self, image: np.ndarray, landmarks: list) -> Optional[np.ndarray]:
-        """Extrait corps complet avec padding"""
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _decode(self, img_file: Path) -> Optional[np.ndarray]:
+        start = time.perf_counter()
         try:
-            h, w = image.shape[:2]
-            
-            points = []
-            for lm in landmarks:
-                points.append([lm['x'], lm['y']])
-            
-            points = np.array(points, dtype=np.float32)
-            
-            x_min = int(max(np.min(points[:, 0]) - 0.05 * w, 0))
-            x_max = int(min(np.max(points[:, 0]) + 0.05 * w, w))
-            y_min = int(max(np.min(points[:, 1]) - 0.05 * h, 0))
-            y_max = int(min(np.max(points[:, 1]) + 0.05 * h, h))
-            
-            crop = image[y_min:y_max, x_min:x_max]
-            if crop.size == 0:
-                return None
+            return self.processor.read_image(img_file)
+        finally:
+            self.stages['decode'].add(time.perf_counter() - start)
+    
+    def _write(self, morpho: str, img_file: Path, writes: List[Tuple[Path, np.ndarray]], previous: List[Future]):
+        # Jumeaux statique/vidéo: la dernière écriture d'un fichier doit rester celle du run séquentiel
+        wait(previous)
+        start = time.perf_counter()
+        try:
+            self.processor.write_outputs(writes)
+        except Exception as e:
+            with self._lock:
+                self.write_errors += 1
+                self.failed_writes.append((morpho, img_file))
+            logger.warning(f"⚠️ Erreur écriture: {e}")
+        finally:
+            self.stages['write'].add(time.perf_counter() - start)
+            self._write_slots.release()
+    
+    def _forget_writes(self, paths: List[Path], future: Future):
+        with self._lock:
+            for path in paths:
+                if self._pending_writes.get(path) is future:
+                    del self._pending_writes[path]
+    
+    def _submit_writes(self, morpho: str, img_file: Path, writes: List[Tuple[Path, np.ndarray]]):
+        if not writes:
+            return
+        start = time.perf_counter()
+        self._write_slots.acquire()
+        self.waits['write'] += time.perf_counter() - start
+        
+        paths = [output_file for output_file, _ in writes]
+        with self._lock:
+            previous = [self._pending_writes[path] for path in paths if path in self._pending_writes]
+            future = self.writer.submit(self._write, morpho, img_file, writes, previous)
+            for path in paths:
+                self._pending_writes[path] = future
+        future.add_done_callback(lambda done: self._forget_writes(paths, done))
+    
+    def run(self, sources: Iterable[Tuple[str, Path]]) -> Iterator[Tuple[str, Path, Dict]]:
+        """Traite les (morpho, image) et produit (morpho, image, résultat) dans le même ordre"""
+        sources = iter(sources)
+        queue = deque()
+        
+        def fill():
+            while len(queue) < self.prefetch:
+                try:
+                    morpho, img_file = next(sources)
+                except StopIteration:
+                    return
+                queue.append((morpho, img_file, self.decoder.submit(self._decode, img_file)))
+        
+        fill()
+        while queue:
+            batch = []
+            while queue and len(batch) < self.batch_size:
+                morpho, img_file, decoded = queue.popleft()
+                start = time.perf_counter()
+                img = decoded.result()
+                self.waits['decode'] += time.perf_counter() - start
+                batch.append((img_file, morpho, img))
+                fill()
             
-            # Padding pour carré
-            ch, cw = crop.shape[:2]
-            if ch > cw:
-                pad_left = (ch - cw) // 2
-                pad_right = ch - cw - pad_left
-                canvas = cv2.copyMakeBorder(crop, 0, 0, pad_left, pad_right, cv2.BORDER_CONSTANT)
-            else:
-                pad_top = (cw - ch) // 2
-                pad_bottom = cw - ch - pad_top
-                canvas = cv2.copyMakeBorder(crop, pad_top, pad_bottom, 0, 0, cv2.BORDER_CONSTANT)
+            start = time.perf_counter()
+            results = self.processor.extract_batch(batch, self.output_format)
+            self.stages['inference'].add(time.perf_counter() - start, count=len(batch))
             
-            resized = cv2.resize(canvas, (128, 128), interpolation=cv2.INTER_AREA)
-            return resized
-        except Exception as e:
-            logger.debug(f"⚠️ Erreur extraction corps: {e}")
-            return None
+            for (img_file, morpho, _), result in zip(batch, results):
+                self._submit_writes(morpho, img_file, result.pop('writes'))
+                yield morpho, img_file, result
+    
+    def close(self):
+        self.decoder.shutdown(wait=True)
+        self.writer.shutdown(wait=True)
+        if self._elapsed is None:
+            self._elapsed = time.perf_counter() - self._started
+    
+    def report(self) -> Dict:
+        """Débit par étape; la plus lente limite le pipeline"""
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+        return stage_report(self.stages, self.waits, self.write_errors, elapsed)
 
 
-# ============= CLASSE 2: BATCH PROCESSOR =============
+# ============= MANIFESTE INCRÉMENTAL =============
 
-class AdvancedImageProcessor:
-    """Traite images avec détection multi-zone"""
+class ProcessingManifest:
+    """
+    Manifeste des images déjà traitées: source (taille, mtime, hash) → zones produites.
+    Une image dont la taille et le mtime n'ont pas changé n'est pas relue;
+    sinon son contenu est hashé, un simple touch ne force donc pas de retraitement.
+    """
+    
+    # 2: boîtes des yeux et de la bouche sur les indices de Pose (tout est retraité)
+    VERSION = 2
+    
+    def __init__(self, path: Path = MANIFEST_FILE):
+        self.path = path
+        self.entries = {}
+        self.output_format = None
+        self.video_mode = None
+        self.decode_strategy = None
+        self.fingerprints = {}
+        self.stale_outputs = set()
+        self.load()
+    
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Manifeste illisible, retraitement complet: {e}")
+            return
+        if data.get('version') == self.VERSION:
+            self.entries = data.get('sources', {})
+            self.output_format = data.get('output_format', 'jpeg')
+            self.video_mode = data.get('video_mode', 'static')
+            # Manifestes antérieurs à --decode-strategy: décodage complet
+            self.decode_strategy = data.get('decode_strategy', 'full')
     
-    def __init__(self):
-        self.zone_detector = ZoneDetector()
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.VERSION,
+                'output_format': self.output_format,
+                'video_mode': self.video_mode,
+                'decode_strategy': self.decode_strategy,
+                'sources': self.entries,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_file, self.path)
     
-    def process_image(self, img: np.ndarray) -> Dict[str, Optional[np.ndarray]]:
+    def fingerprint(self, img_file: Path) -> Dict:
+        return file_fingerprint(img_file, self.entries.get(str(img_file)))
+    
+    def is_current(self, img_file: Path, fingerprint: Dict, group: List[str],
+                   shard_samples: Optional[set] = None) -> bool:
         """
-        Traite une image et extrait toutes les zones
-        Retourne: {full_body, eyes, mouth, hands}
+        shard_samples: clés (zone, source, nom) du jeu de shards précédent,
+        None si la sortie n'est pas en shards
         """
-        result = {
-            'full_body': None,
-            'eyes': None,
-            'mouth': None,
-            'hands': []
-        }
-        
-        # Redimensionner si trop gros
-        h, w = img.shape[:2]
-        if max(h, w) > 800:
-            scale = 800 / max(h, w)
-            img = cv2.resize(img, (int(w*scale), int(h*scale)))
-        
-        # Détection pose
-        pose_data = self.zone_detector.detect_pose_landmarks(img)
-        if not pose_data or not pose_data['valid']:
-            return result
-        
-        landmarks = pose_data['landmarks']
-        
-        # Extraction zones
-        result['full_body'] = self.zone_detector.extract_full_body(img, landmarks)
-        result['eyes'] = self.zone_detector.extract_eyes(img, landmarks)
-        result['mouth'] = self.zone_detector.extract_mouth(img, landmarks)
-        result['hands'] = self.zone_detector.extract_hands(img, landmarks)
-        
-        return result
+        entry = self.entries.get(str(img_file))
+        if entry is None or entry['hash'] != fingerprint['hash']:
+            return False
+        # Un jumeau (même nom en statique/vidéo) apparu ou disparu change la dernière écriture
+        if entry['group'] != group:
+            return False
+        # Une zone supprimée à la main force le retraitement
+        if not all(Path(output).exists() for output in entry['outputs']):
+            return False
+        # Idem pour un shard supprimé: ses crops ne pourraient pas être recopiés
+        if shard_samples is not None:
+            samples = entry.get('samples')
+            if samples is None:
+                return False
+            return all((zone, str(img_file), name) in shard_samples for zone, name in samples)
+        return True
     
-    def process_batch(self, input_dir: Path, morpho: str) -> Dict:
-        """Traite un batch d'images et sauvegarde par zone"""
-        
-        stats = {
-            'total': 0,
-            'full_body': 0,
-            'eyes': 0,
-            'mouth': 0,
-            'hands': 0,
-            'failed': 0
+    def select_pending(self, units: List[Tuple[str, List[Path]]], force: bool = False,
+                       shard_samples: Optional[set] = None) -> set:
+        """
+        Images à (re)traiter. Une unité (mêmes fichiers de sortie) est retraitée
+        en entier dès qu'une de ses images a changé, pour garder l'ordre d'écriture.
+        """
+        pending = set()
+        for _, files in units:
+            group = [str(img_file) for img_file in files]
+            fingerprints = {img_file: self.fingerprint(img_file) for img_file in files}
+            self.fingerprints.update(fingerprints)
+            if force or not all(self.is_current(f, fp, group, shard_samples) for f, fp in fingerprints.items()):
+                pending.update(files)
+            else:
+                # Contenu identique: mémoriser le nouveau mtime pour ne plus rehasher
+                for img_file, fingerprint in fingerprints.items():
+                    self.entries[str(img_file)].update(fingerprint)
+        return pending
+    
+    def stored_stats(self, img_file: Path) -> Dict:
+        return dict(self.entries[str(img_file)]['stats'])
+    
+    def record(self, img_file: Path, morpho: str, stats: Dict, outputs: List[str], group: List[Path],
+               samples: Optional[List[Tuple[str, str]]] = None):
+        """samples: (zone, nom) des crops écrits dans les shards"""
+        previous = self.entries.get(str(img_file))
+        if previous:
+            self.stale_outputs.update(set(previous['outputs']) - set(outputs))
+        fingerprint = self.fingerprints.get(img_file) or self.fingerprint(img_file)
+        self.entries[str(img_file)] = {
+            **fingerprint,
+            'morpho': morpho,
+            'group': [str(member) for member in group],
+            'stats': stats,
+            'outputs': outputs,
+            'samples': [[zone, name] for zone, name in samples or []],
         }
+    
+    def forget(self, img_file: Path):
+        """Retire une source du manifeste: elle sera retraitée au prochain run"""
+        self.entries.pop(str(img_file), None)
+    
+    def prune(self, sources: set) -> Tuple[int, int]:
+        """
+        Oublie les sources disparues et supprime les sorties qui ne sont plus
+        produites par aucune source. Retourne (sources retirées, fichiers supprimés).
+        """
+        sources = {str(img_file) for img_file in sources}
+        removed = [key for key in self.entries if key not in sources]
+        for key in removed:
+            self.stale_outputs.update(self.entries.pop(key)['outputs'])
         
-        for img_file in sorted(input_dir.glob("*.jpg")):
-            stats['total'] += 1
-            
+        claimed = {output for entry in self.entries.values() for output in entry['outputs']}
+        deleted = 0
+        for output in sorted(self.stale_outputs - claimed):
             try:
-                img = cv2.imread(str(img_file))
-                if img is None:
-                    stats['failed'] += 1
-                    continue
-                
-                # Traiter
-                zones = self.process_image(img)
-                
-                # Sauvegarder full_body
-                if zones['full_body'] is not None:
-                    output_dir = OUTPUT_FULL_BODY / morpho
-                    output_dir.mkdir(parents=True, exist_ok=True)
-                    cv2.imwrite(str(output_dir / img_file.name), zones['full_body'])
-                    stats['full_body'] += 1
-                
-                # Sauvegarder eyes
-                if zones['eyes'] is not None:
-                    output_dir = OUTPUT_EYES / morpho
-                    output_dir.mkdir(parents=True, exist_ok=True)
-                    cv2.imwrite(str(output_dir / f"eyes_{img_file.stem}.jpg"), zones['eyes'])
-                    stats['eyes'] += 1
-                
-                # Sauvegarder mouth
-                if zones['mouth'] is not None:
-                    output_dir = OUTPUT_MOUTH / morpho
-                    output_dir.mkdir(parents=True, exist_ok=True)
-                    cv2.imwrite(str(output_dir / f"mouth_{img_file.stem}.jpg"), zones['mouth'])
-                    stats['mouth'] += 1
-                
-                # Sauvegarder hands
-                if zones['hands']:
-                    output_dir = OUTPUT_HANDS / morpho
-                    output_dir.mkdir(parents=True, exist_ok=True)
-                    for i, hand in enumerate(zones['hands']):
-                        cv2.imwrite(str(output_dir / f"hand{i}_{img_file.stem}.jpg"), hand)
-                    stats['hands'] += len(zones['hands'])
-                
-                if stats['full_body'] % 50 == 0:
-                    logger.info(f"   ✓ {stats['full_body']} images traitées")
-            
-            except Exception as e:
-                stats['failed'] += 1
-                logger.debug(f"⚠️ Erreur: {e}")
-        
-        return stats
+                Path(output).unlink()
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        self.stale_outputs.clear()
+        return len(removed), deleted
 
 
 # ============= PIPELINE PRINCIPAL =============
@@ -360,9 +1011,37 @@ class AdvancedImageProcessor:
 class AdvancedDataProcessingPipeline:
     """Pipeline avancé avec détection multi-zone"""
     
-    def __init__(self):
-        self.processor = AdvancedImageProcessor()
+    def __init__(self, workers: int = 1, full: bool = False, output_format: str = 'jpeg',
+                 decode_threads: int = 4, write_threads: int = 4, prefetch: int = 32,
+                 decode_strategy: str = 'reduced', video_mode: str = 'static',
+                 tracking_confidence: float = 0.5, batch_size: int = BATCH_SIZE):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Format de sortie inconnu: {output_format}")
+        ensure_output_dirs()
+        self.workers = max(int(workers), 1)
+        self.full = full
+        self.output_format = output_format
+        self.decode_threads = decode_threads
+        self.write_threads = write_threads
+        self.prefetch = prefetch
+        self.batch_size = max(int(batch_size), 1)
+        self.stage_report = None
+        self.tracked_segments = 0
+        self.shards = None
+        self.shard_counts = {}
+        self.video_mode = video_mode
+        self.processor = AdvancedImageProcessor(decode_strategy, video_mode, tracking_confidence)
         self.stats_global = defaultdict(dict)
+        self.manifest = ProcessingManifest()
+        self.incremental_stats = {'processed': 0, 'skipped': 0, 'removed_sources': 0, 'deleted_outputs': 0}
+    
+    @staticmethod
+    def source_dirs(morpho: str) -> List[Tuple[str, Path]]:
+        """Répertoires sources d'une morphologie, dans l'ordre de traitement"""
+        return [
+            ('📷 Images statiques', STATIC_IMAGES_DIR / morpho),
+            ('🎬 Frames vidéo', VIDEO_FRAMES_DIR / morpho / "frames"),
+        ]
     
     def process_all_images(self):
         """Traite images statiques + vidéos"""
@@ -371,36 +1050,222 @@ class AdvancedDataProcessingPipeline:
         logger.info("🔬 TRAITEMENT AVANCÉ - DÉTECTION MULTI-ZONE")
         logger.info("=" * 70)
         
-        for morpho in MORPHOLOGIES:
-            logger.info(f"\n  📁 Morphologie: {morpho}")
-            
-            stats_total = {
-                'total': 0, 'full_body': 0, 'eyes': 0, 'mouth': 0, 'hands': 0, 'failed': 0
-            }
-            
-            # Traiter images statiques
-            static_dir = STATIC_IMAGES_DIR / morpho
-            if static_dir.exists():
-                logger.info(f"     📷 Images statiques...")
-                stats = self.processor.process_batch(static_dir, morpho)
-                for key in stats:
-                    stats_total[key] += stats[key]
+        sources = self.list_sources()
+        units = self.build_work_units(sources)
+        # Changer de format, de mode vidéo ou de décodage (crops différents) oblige à tout produire à nouveau
+        force = (self.full or self.manifest.output_format != self.output_format
+                 or self.manifest.video_mode != self.video_mode
+                 or self.manifest.decode_strategy != self.processor.decode_strategy)
+        if self.output_format in ('shards', 'both'):
+            self.shards = ZoneShardOutput()
+        shard_samples = self.shards.previous_samples() if self.shards is not None else None
+        pending = self.manifest.select_pending(units, force=force, shard_samples=shard_samples)
+        logger.info(f"  🗂️ {len(pending)} images nouvelles ou modifiées, "
+                    f"{sum(len(files) for _, files in units) - len(pending)} inchangées")
+        
+        groups = {img_file: files for _, files in units for img_file in files}
+        if self.workers > 1:
+            self.process_all_images_parallel(sources, units, pending, groups)
+        else:
+            files_by_dir = defaultdict(list)
+            for _, img_file in sources:
+                files_by_dir[img_file.parent].append(img_file)
             
-            # Traiter frames vidéo
-            video_dir = VIDEO_FRAMES_DIR / morpho / "frames"
-            if video_dir.exists():
-                logger.info(f"     🎬 Frames vidéo...")
-                stats = self.processor.process_batch(video_dir, morpho)
-                for key in stats:
-                    stats_total[key] += stats[key]
+            with StagedExtractor(self.processor, self.output_format, self.decode_threads,
+                                 self.write_threads, self.prefetch, self.batch_size) as extractor:
+                results = extractor.run((morpho, img_file) for morpho, img_file in sources if img_file in pending)
+                
+                for morpho in MORPHOLOGIES:
+                    logger.info(f"\n  📁 Morphologie: {morpho}")
+                    
+                    stats_total = new_stats()
+                    
+                    for label, input_dir in self.source_dirs(morpho):
+                        if input_dir.exists():
+                            logger.info(f"     {label}...")
+                            merge_stats(stats_total, self.process_source_dir(
+                                files_by_dir[input_dir], morpho, pending, groups, results
+                            ))
+                    
+                    self.stats_global[morpho] = stats_total
+                    self.log_morpho_stats(morpho, stats_total)
             
-            self.stats_global[morpho] = stats_total
+            # Après close(): toutes les écritures sont terminées
+            for morpho, img_file in extractor.failed_writes:
+                # Comme process_file: compté en échec, et retraité au prochain run
+                self.stats_global[morpho]['failed'] += 1
+                self.manifest.forget(img_file)
+            self.stage_report = extractor.report()
+            self.tracked_segments = self.processor.tracked_segments
+        self.log_stage_report()
+        
+        if self.shards is not None:
+            self.shard_counts = self.shards.close()
+        
+        removed, deleted = self.manifest.prune({img_file for _, img_file in sources})
+        self.incremental_stats['removed_sources'] = removed
+        self.incremental_stats['deleted_outputs'] = deleted
+        self.manifest.output_format = self.output_format
+        self.manifest.video_mode = self.video_mode
+        self.manifest.decode_strategy = self.processor.decode_strategy
+        self.manifest.save()
+    
+    def process_source_dir(self, files: List[Path], morpho: str, pending: set, groups: Dict,
+                           results: Iterator[Tuple[str, Path, Dict]]) -> Dict:
+        """
+        Enregistre les images modifiées d'un répertoire (résultats du StagedExtractor,
+        dans l'ordre des sources), reprend les stats des autres
+        """
+        
+        stats = new_stats()
+        
+        for img_file in files:
+            if img_file in pending:
+                _, _, result = next(results)
+                image_stats = self.record_result(img_file, morpho, result, groups[img_file])
+                
+                if self.incremental_stats['processed'] % 50 == 0:
+                    logger.info(f"   ✓ {self.incremental_stats['processed']} images traitées")
+            else:
+                image_stats = self.reuse_previous(img_file)
+            merge_stats(stats, image_stats)
+        
+        return stats
+    
+    def record_result(self, img_file: Path, morpho: str, result: Dict, group: List[Path]) -> Dict:
+        """Enregistre une image traitée (manifeste, shards), retourne ses stats"""
+        self.manifest.record(img_file, morpho, result['stats'], result['outputs'], group,
+                             [(zone, name) for zone, name, _ in result['samples']])
+        if self.shards is not None:
+            self.shards.append(img_file, morpho, result)
+        self.incremental_stats['processed'] += 1
+        return result['stats']
+    
+    def reuse_previous(self, img_file: Path) -> Dict:
+        """Image inchangée: stats du manifeste, crops recopiés des shards précédents"""
+        if self.shards is not None:
+            self.shards.copy_previous(img_file)
+        self.incremental_stats['skipped'] += 1
+        return self.manifest.stored_stats(img_file)
+    
+    def list_sources(self) -> List[Tuple[str, Path]]:
+        """(morphologie, image) dans l'ordre du run séquentiel (frames par clip en mode track)"""
+        sources = []
+        for morpho in MORPHOLOGIES:
+            for _, input_dir in self.source_dirs(morpho):
+                if input_dir.exists():
+                    files = input_dir.glob("*.jpg")
+                    if self.video_mode == 'track' and VIDEO_FRAMES_DIR in input_dir.parents:
+                        files = sorted(files, key=frame_sort_key)
+                    else:
+                        files = sorted(files)
+                    sources.extend((morpho, img_file) for img_file in files)
+        return sources
+    
+    def build_work_units(self, sources: List[Tuple[str, Path]]) -> List[Tuple[str, List[Path]]]:
+        """
+        Découpe le travail par image pour le pool.
+        Les images d'une morphologie qui écrivent les mêmes fichiers de sortie
+        (même nom en statique et en vidéo) restent dans une seule unité, dans
+        l'ordre du run séquentiel, pour que la dernière écriture soit la même.
+        """
+        by_name = {}
+        for morpho, img_file in sources:
+            by_name.setdefault((morpho, img_file.name), []).append(img_file)
+        units = [(morpho, files) for (morpho, _), files in by_name.items()]
+        if self.video_mode != 'track':
+            return units
+        
+        # Mode track: un clip entier (et les jumeaux statiques de ses frames) dans une
+        # seule unité, le suivi MediaPipe vit dans un process et suit l'ordre des frames
+        order = {img_file: i for i, (_, img_file) in enumerate(sources)}
+        clips = {}
+        merged = []
+        for morpho, files in units:
+            frames = [img_file for img_file in files if is_video_frame(img_file)]
+            if not frames:
+                merged.append((morpho, files))
+                continue
+            clip, _ = frame_position(frames[0])
+            if clip in clips:
+                clips[clip][1].extend(files)
+            else:
+                clips[clip] = (morpho, list(files))
+                merged.append(clips[clip])
+        for _, files in clips.values():
+            files.sort(key=order.__getitem__)
+        return merged
+    
+    def process_all_images_parallel(self, sources: List[Tuple[str, Path]], units: List[Tuple[str, List[Path]]],
+                                    pending: set, groups: Dict):
+        """Traite les images modifiées sur un pool de self.workers process"""
+        
+        for morpho in MORPHOLOGIES:
+            self.stats_global[morpho] = new_stats()
+        
+        pending_units = [unit for unit in units if unit[1][0] in pending]
+        logger.info(f"  ⚙️ {self.workers} workers, {len(pending_units)} images")
+        
+        # Tâches d'environ batch_size images, en petits chunks: le coût par image
+        # varie beaucoup (pose détectée ou non)
+        tasks = group_units(pending_units, self.batch_size)
+        chunksize = max(1, len(tasks) // (self.workers * 16))
+        context = multiprocessing.get_context('spawn')
+        initargs = (self.output_format, self.processor.decode_strategy,
+                    self.video_mode, self.processor.tracking_confidence, self.batch_size)
+        # Étapes de tous les workers: chacun enchaîne décodage, inférence et écriture
+        # (un thread par étape et par worker, l'inférence n'attend jamais)
+        stages = new_stage_stats((self.workers,) * 3)
+        started = time.perf_counter()
+        with context.Pool(self.workers, initializer=_init_worker, initargs=initargs) as pool:
+            def completed_units():
+                # imap garde l'ordre des unités; les résultats sont consommés dans l'ordre
+                # du run séquentiel (jumeaux vidéo mis de côté), stats et shards sont identiques
+                for task, (task_results, stage_totals, segments) in zip(
+                        tasks, pool.imap(_process_units, tasks, chunksize=chunksize)):
+                    for name, (count, busy, errors) in stage_totals.items():
+                        stages[name].add(busy, count, errors)
+                    # Un clip entier par unité: la somme des workers est celle du run séquentiel
+                    self.tracked_segments += segments
+                    yield from zip(task, task_results)
             
-            logger.info(f"\n     ✅ {morpho}:")
-            logger.info(f"        Corps complet: {stats_total['full_body']}")
-            logger.info(f"        Yeux: {stats_total['eyes']}")
-            logger.info(f"        Bouche: {stats_total['mouth']}")
-            logger.info(f"        Mains: {stats_total['hands']}")
+            completed = completed_units()
+            buffered = {}
+            done = 0
+            for morpho, img_file in sources:
+                if img_file not in pending:
+                    merge_stats(self.stats_global[morpho], self.reuse_previous(img_file))
+                    continue
+                
+                while img_file not in buffered:
+                    (_, files), results = next(completed)
+                    buffered.update(zip(files, results))
+                    done += 1
+                    if done % 500 == 0:
+                        logger.info(f"   ✓ {done}/{len(pending_units)} images traitées")
+                result = buffered.pop(img_file)
+                merge_stats(self.stats_global[morpho], self.record_result(img_file, morpho, result, groups[img_file]))
+        
+        self.stage_report = stage_report(stages, {'decode': 0.0, 'write': 0.0}, stages['write'].errors,
+                                         time.perf_counter() - started)
+        for morpho in MORPHOLOGIES:
+            self.log_morpho_stats(morpho, self.stats_global[morpho])
+    
+    def log_stage_report(self):
+        logger.info("\n  ⏱️ Débit par étape (images/s, threads):")
+        for name, stage in self.stage_report['stages'].items():
+            logger.info(f"        {name:10s} {stage['images_per_second']:9.1f}  ({stage['threads']} threads, "
+                        f"{stage['images']} images)")
+        logger.info(f"        global     {self.stage_report['images_per_second']:9.1f}")
+        if self.stage_report['bottleneck']:
+            logger.info(f"        ➜ étape la plus lente: {self.stage_report['bottleneck']}")
+    
+    def log_morpho_stats(self, morpho: str, stats_total: Dict):
+        logger.info(f"\n     ✅ {morpho}:")
+        logger.info(f"        Corps complet: {stats_total['full_body']}")
+        logger.info(f"        Yeux: {stats_total['eyes']}")
+        logger.info(f"        Bouche: {stats_total['mouth']}")
+        logger.info(f"        Mains: {stats_total['hands']}")
     
     def generate_report(self):
         """Génère rapport final"""
@@ -412,6 +1277,9 @@ class AdvancedDataProcessingPipeline:
         report = {
             'timestamp': datetime.now().isoformat(),
             'morphologies': self.stats_global,
+            'incremental': self.incremental_stats,
+            'output_format': self.output_format,
+            'video_mode': self.video_mode,
             'output_directories': {
                 'full_body': str(OUTPUT_FULL_BODY),
                 'eyes': str(OUTPUT_EYES),
@@ -419,12 +1287,22 @@ class AdvancedDataProcessingPipeline:
                 'hands': str(OUTPUT_HANDS)
             }
         }
+        if self.shards is not None:
+            report['output_directories']['shards'] = str(OUTPUT_SHARDS)
+            report['shard_samples'] = self.shard_counts
+        # Mêmes clés en séquentiel et avec --workers N (étapes additionnées sur les workers)
+        report['pipeline_stages'] = self.stage_report
+        report['tracked_segments'] = self.tracked_segments
         
         # Sauvegarder
         report_file = STATS_DIR / "advanced_processing_report.json"
         with open(report_file, 'w', encoding='utf-8') as f:
             json.dump(report, f, indent=2, ensure_ascii=False)
         
+        logger.info(f"\n  🗂️ Images traitées: {self.incremental_stats['processed']}")
+        logger.info(f"  ⏭️ Images inchangées (ignorées): {self.incremental_stats['skipped']}")
+        logger.info(f"  🧹 Sources disparues: {self.incremental_stats['removed_sources']} "
+                    f"({self.incremental_stats['deleted_outputs']} fichiers supprimés)")
         logger.info(f"\n📋 Rapport: {report_file}")
         
         return report
@@ -432,9 +1310,56 @@ class AdvancedDataProcessingPipeline:
 
 # ============= EXÉCUTION =============
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Traitement avancé - détection multi-zone")
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Nombre de process (1 = séquentiel, défaut: 1)"
+    )
+    parser.add_argument(
+        '--full', action='store_true',
+        help="Ignore le manifeste et retraite toutes les images"
+    )
+    parser.add_argument(
+        '--decode-strategy', choices=DECODE_STRATEGIES, default='reduced',
+        help="reduced: JPEG trop grands décodés à 1/2, 1/4 ou 1/8; full: décodage complet (défaut: reduced)"
+    )
+    parser.add_argument(
+        '--decode-threads', type=int, default=4,
+        help="Threads de décodage en mode séquentiel (défaut: 4)"
+    )
+    parser.add_argument(
+        '--write-threads', type=int, default=4,
+        help="Threads d'encodage/écriture JPEG en mode séquentiel (défaut: 4)"
+    )
+    parser.add_argument(
+        '--prefetch', type=int, default=32,
+        help="Images décodées d'avance / écritures en attente au maximum (défaut: 32)"
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=BATCH_SIZE,
+        help=f"Images décodées traitées ensemble par l'inférence (défaut: {BATCH_SIZE})"
+    )
+    parser.add_argument(
+        '--video-mode', choices=VIDEO_MODES, default='static',
+        help="static: frames vidéo traitées comme des images; track: suivi MediaPipe par clip (défaut: static)"
+    )
+    parser.add_argument(
+        '--tracking-confidence', type=float, default=0.5,
+        help="Mode track: confiance du suivi sous laquelle la détection complète est relancée (défaut: 0.5)"
+    )
+    parser.add_argument(
+        '--output-format', choices=OUTPUT_FORMATS, default='jpeg',
+        help="jpeg: un fichier par crop, shards: shards .npy (mmap), both: les deux (défaut: jpeg)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Exécute pipeline avancé"""
     
+    args = parse_args(argv)
+    
     logger.info("\n")
     logger.info("╔" + "=" * 68 + "╗")
     logger.info("║" + " TRAITEMENT AVANCÉ - DÉTECTION MULTI-ZONE ".center(68) + "║")
@@ -442,7 +1367,12 @@ def main():
     logger.info("╚" + "=" * 68 + "╝")
     
     try:
-        pipeline = AdvancedDataProcessingPipeline()
+        pipeline = AdvancedDataProcessingPipeline(
+            workers=args.workers, full=args.full, output_format=args.output_format,
+            decode_threads=args.decode_threads, write_threads=args.write_threads, prefetch=args.prefetch,
+            decode_strategy=args.decode_strategy, video_mode=args.video_mode,
+            tracking_confidence=args.tracking_confidence, batch_size=args.batch_size
+        )
         pipeline.process_all_images()
         report = pipeline.generate_report()
         
@@ -0,0 +1,59 @@
+"""
+Database router sending read-only API traffic to a Postgres replica.
+
+Reads go to the replica only while the current request has been marked
+replica-safe by bodyanalytics.middleware.ReplicaRoutingMiddleware (GET/HEAD
+on a list or detail view, no recent write from the same client). Everything
+else, including all writes and migrations, stays on the primary.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def get_replica_alias():
+    """Return the configured replica alias, or None if no replica is defined"""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def set_read_from_replica(enabled):
+    _read_from_replica.set(bool(enabled))
+
+
+def is_reading_from_replica():
+    return _read_from_replica.get()
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    """Route reads inside the block to the replica (used by tests and scripts)"""
+    token = _read_from_replica.set(bool(enabled))
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Primary for writes, replica for reads of replica-safe requests"""
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get():
+            return get_replica_alias() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is fed by Postgres replication, never migrated directly
+        return db != get_replica_alias()
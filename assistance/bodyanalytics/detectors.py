@@ -0,0 +1,89 @@
+"""
+Lazily built MediaPipe detectors, cached per process.
+
+Importing mediapipe and building a Pose graph costs several hundred ms and
+a lot of RSS, so nothing is created at import time: datatraitement, pretrait
+and train ask for their detectors here when they first need them. Worker
+processes call init_detectors() once in their pool initializer.
+"""
+import os
+import threading
+
+_detectors = {}
+_owner_pid = None
+_lock = threading.Lock()
+
+
+def _mediapipe():
+    import mediapipe as mp
+    return mp
+
+
+def _get(kind, factory, **options):
+    global _owner_pid
+    key = (kind, tuple(sorted(options.items())))
+    with _lock:
+        # A forked child must not reuse the parent's graphs
+        if _owner_pid != os.getpid():
+            _detectors.clear()
+            _owner_pid = os.getpid()
+        detector = _detectors.get(key)
+        if detector is None:
+            detector = _detectors[key] = factory(**options)
+        return detector
+
+
+def get_pose(static_image_mode=True, model_complexity=1, min_detection_confidence=0.5, **options):
+    """Shared MediaPipe Pose instance of this process for the given options"""
+    return _get(
+        'pose',
+        lambda **kwargs: _mediapipe().solutions.pose.Pose(**kwargs),
+        static_image_mode=static_image_mode,
+        model_complexity=model_complexity,
+        min_detection_confidence=min_detection_confidence,
+        **options
+    )
+
+
+def get_face_detector(min_detection_confidence=0.5, **options):
+    """Shared MediaPipe FaceDetection instance of this process"""
+    return _get(
+        'face_detection',
+        lambda **kwargs: _mediapipe().solutions.face_detection.FaceDetection(**kwargs),
+        min_detection_confidence=min_detection_confidence,
+        **options
+    )
+
+
+def get_hands(static_image_mode=True, min_detection_confidence=0.5, **options):
+    """Shared MediaPipe Hands instance of this process"""
+    return _get(
+        'hands',
+        lambda **kwargs: _mediapipe().solutions.hands.Hands(**kwargs),
+        static_image_mode=static_image_mode,
+        min_detection_confidence=min_detection_confidence,
+        **options
+    )
+
+
+FACTORIES = {
+    'pose': get_pose,
+    'face_detection': get_face_detector,
+    'hands': get_hands,
+}
+
+
+def init_detectors(*kinds):
+    """Build the given detectors (default: pose) now rather than on first use"""
+    for kind in kinds or ('pose',):
+        FACTORIES[kind]()
+
+
+def close_detectors():
+    """Release the graphs held by this process"""
+    with _lock:
+        for detector in _detectors.values():
+            close = getattr(detector, 'close', None)
+            if close is not None:
+                close()
+        _detectors.clear()
@@ -0,0 +1,31 @@
+"""
+Content fingerprints of source files, shared by the incremental caches
+(datatraitement's ProcessingManifest, landmark_cache.LandmarkCache).
+
+A fingerprint is {'size', 'mtime_ns', 'hash'}, where the hash is a
+16-byte blake2b of the content. The hash of a known entry is reused
+while size and mtime are unchanged, so only new or touched files are
+read again. A touched file whose content did not change keeps its hash,
+so callers do not redo its work.
+"""
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: Path, known: Optional[Dict] = None) -> Dict:
+    """Fingerprint of `path`; `known` is its previous entry (with size, mtime_ns and hash), if any"""
+    st = path.stat()
+    if known and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+        content_hash = known['hash']
+    else:
+        content_hash = file_hash(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': content_hash}
@@ -0,0 +1,90 @@
+"""
+Reduced-resolution JPEG decoding.
+
+libjpeg can decode a JPEG directly at 1/2, 1/4 or 1/8 scale by dropping
+DCT coefficients (cv2.IMREAD_REDUCED_COLOR_2/4/8). That is much cheaper
+than a full decode followed by cv2.resize. read_jpeg_size() parses only
+the SOF header. imread_max_side() uses it to pick the largest reduction
+whose output is still at least the target size, so the final resize
+only ever downscales.
+"""
+import struct
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# SOFn markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) do not
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Markers read before giving up (SOF normally follows a few APPn/DQT segments)
+MAX_HEADER_SEGMENTS = 64
+
+
+def read_jpeg_size(path: Path) -> Optional[Tuple[int, int]]:
+    """(height, width) from the JPEG SOF header, or None if not a baseline/progressive JPEG"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(2) != b'\xff\xd8':
+                return None
+            for _ in range(MAX_HEADER_SEGMENTS):
+                byte = f.read(1)
+                if byte != b'\xff':
+                    return None
+                # Fill bytes (0xFF padding) may precede a marker
+                while byte == b'\xff':
+                    byte = f.read(1)
+                if not byte:
+                    return None
+                marker = byte[0]
+                if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                    continue
+                if marker in (0xD9, 0xDA):
+                    # End of image / start of scan before any frame header
+                    return None
+                length_bytes = f.read(2)
+                if len(length_bytes) != 2:
+                    return None
+                length = struct.unpack('>H', length_bytes)[0]
+                if marker in SOF_MARKERS:
+                    frame = f.read(5)
+                    if len(frame) != 5:
+                        return None
+                    _, height, width = struct.unpack('>BHH', frame)
+                    return (height, width) if height and width else None
+                f.seek(length - 2, 1)
+    except OSError:
+        return None
+    return None
+
+
+def reduced_flag(height: int, width: int, max_side: int) -> Tuple[int, int]:
+    """(factor, imread flag) decoding at least max_side on the long side"""
+    long_side = max(height, width)
+    for factor, flag in REDUCED_FLAGS:
+        if long_side // factor >= max_side:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def imread_max_side(path: Path, max_side: int) -> Optional[np.ndarray]:
+    """
+    cv2.imread that decodes oversized JPEGs at 1/2, 1/4 or 1/8 scale,
+    keeping the long side >= max_side. Other files are decoded normally.
+    """
+    size = read_jpeg_size(path)
+    if size is None:
+        return cv2.imread(str(path))
+    factor, flag = reduced_flag(size[0], size[1], max_side)
+    img = cv2.imread(str(path), flag)
+    if img is None and factor > 1:
+        # Some encoders/variants reject scaled decoding: fall back to a full decode
+        img = cv2.imread(str(path))
+    return img
@@ -0,0 +1,109 @@
+"""
+Helpers to keep inline base64 frames out of the ``data`` table.
+
+Clients post captured frames as data URIs (``data:image/jpeg;base64,...``)
+in ``image_data``. Those are decoded here, written to ``default_storage``
+and replaced by the storage URL, so the row only holds a short reference.
+"""
+import base64
+import binascii
+import os
+import re
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.text import slugify
+
+
+DATA_URI_PATTERN = re.compile(r'^data:(?P<mime>[^;,]+)?(?:;[^;,]*)*?;base64,', re.IGNORECASE)
+
+# Storage prefix for frames moved out of the database
+IMAGE_DATA_UPLOAD_DIR = 'movement_frames'
+
+MIME_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+}
+
+
+def is_data_uri(value):
+    """Return True if value is a base64 data URI"""
+    return isinstance(value, str) and DATA_URI_PATTERN.match(value) is not None
+
+
+def decode_data_uri(value):
+    """
+    Decode a base64 data URI.
+    Returns (bytes, extension) or raises ValueError if the payload is invalid:
+    characters outside the base64 alphabet or bad padding are rejected instead
+    of being silently dropped.
+    """
+    match = DATA_URI_PATTERN.match(value)
+    if match is None:
+        raise ValueError('Not a base64 data URI')
+
+    mime = (match.group('mime') or 'image/jpeg').lower()
+    payload = value[match.end():].strip()
+    try:
+        content = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f'Invalid base64 image data: {e}')
+
+    if not content:
+        raise ValueError('Empty image data')
+
+    return content, MIME_EXTENSIONS.get(mime, 'bin')
+
+
+def storage_owner(user_id):
+    """
+    Directory name of a user's frames. user_id comes from the request, so it
+    is reduced to an integer (or a slug) and can never contain '..' or a
+    path separator that would leave IMAGE_DATA_UPLOAD_DIR.
+    """
+    if user_id is None or isinstance(user_id, bool):
+        return 'anonymous'
+    try:
+        return str(int(user_id))
+    except (TypeError, ValueError):
+        return slugify(str(user_id)) or 'anonymous'
+
+
+def store_image_data(value, user_id=None):
+    """
+    Store a data URI in default_storage and return its URL.
+    Values that are not data URIs (URLs, paths, None) are returned unchanged.
+    """
+    if not is_data_uri(value):
+        return value
+
+    content, extension = decode_data_uri(value)
+    timestamp_ms = int(timezone.now().timestamp() * 1000)
+    owner = storage_owner(user_id)
+    filename = f"{IMAGE_DATA_UPLOAD_DIR}/{owner}/{timestamp_ms}_{uuid.uuid4().hex[:12]}.{extension}"
+
+    path = default_storage.save(filename, ContentFile(content))
+    return default_storage.url(path)
+
+
+def resolve_image_reference(reference):
+    """
+    Map an image_data reference to a local file path.
+    Handles storage URLs (MEDIA_URL/...), absolute paths and paths relative to BASE_DIR.
+    """
+    if not reference or is_data_uri(reference):
+        return None
+
+    media_url = settings.MEDIA_URL or ''
+    if media_url and reference.startswith(media_url):
+        return os.path.join(settings.MEDIA_ROOT, reference[len(media_url):])
+
+    if os.path.isabs(reference):
+        return reference
+    return os.path.join(settings.BASE_DIR, reference)
@@ -0,0 +1,147 @@
+"""
+On-disk cache of pose landmarks for a directory of images.
+
+One cache per image directory (a zone directory such as full_body_128):
+- <name>.npy: float32 landmarks, shape (N, 33, 4), one row per image in
+  the order of the last lookup; NaN rows mark images where no pose was
+  found (or that could not be read), so misses are not recomputed;
+- <name>.json: for each image, size, mtime_ns, content hash and row;
+- <name>.<suffix>.npy / .json: arrays derived from the landmarks (e.g.
+  features, see derived()) and the landmarks file they were computed from.
+
+Rows are keyed by content hash: an image that was renamed or moved keeps
+its landmarks, a modified one is recomputed. Unchanged files (same size
+and mtime) are not rehashed. Only images whose hash is unknown are
+decoded and run through the pose model.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+
+try:
+    from .file_fingerprint import file_fingerprint
+    from .npy_arrays import NpyAppender
+except ImportError:
+    from file_fingerprint import file_fingerprint
+    from npy_arrays import NpyAppender
+
+INDEX_VERSION = 1
+LANDMARKS_SHAPE = (33, 4)
+
+
+class LandmarkCache:
+    """(N, 33, 4) landmarks of a list of images, computed once per image content"""
+
+    def __init__(self, cache_dir: Path, name: str, extract: Callable[[Path], Optional[np.ndarray]]):
+        """
+        extract(path) returns the (33, 4) landmarks of one image, or None
+        """
+        self.cache_dir = Path(cache_dir)
+        self.name = name
+        self.array_file = self.cache_dir / f"{name}.npy"
+        self.index_file = self.cache_dir / f"{name}.json"
+        self.extract = extract
+        self.files = {}
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    def _load_index(self):
+        if not (self.index_file.exists() and self.array_file.exists()):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get('version') == INDEX_VERSION:
+            self.files = index.get('files', {})
+
+    def fingerprint(self, path: Path) -> dict:
+        return file_fingerprint(path, self.files.get(str(path)))
+
+    def landmarks(self, paths: List[Path]) -> np.ndarray:
+        """
+        Landmarks of `paths`, in that order, as a read-only memmap of the cache.
+        Rows of images without a detected pose are NaN.
+        """
+        fingerprints = [self.fingerprint(path) for path in paths]
+
+        # Rows already computed, by content hash
+        known = {entry['hash']: entry['row'] for entry in self.files.values()}
+        self.hits = sum(fp['hash'] in known for fp in fingerprints)
+        self.misses = len(fingerprints) - self.hits
+
+        in_order = all(
+            self.files.get(str(path), {}).get('row') == row and fp['hash'] == self.files[str(path)]['hash']
+            for row, (path, fp) in enumerate(zip(paths, fingerprints))
+        )
+        if in_order and len(self.files) == len(paths) and self.array_file.exists():
+            return np.load(self.array_file, mmap_mode='r')
+
+        previous = np.load(self.array_file, mmap_mode='r') if self.array_file.exists() and known else None
+        computed = {}
+        self.array_file.parent.mkdir(parents=True, exist_ok=True)
+        # Without an index the cache is ignored: a crash below cannot pair old rows with a new array
+        self.index_file.unlink(missing_ok=True)
+        with NpyAppender(self.array_file, len(paths), LANDMARKS_SHAPE, np.float32) as writer:
+            for path, fp in zip(paths, fingerprints):
+                if fp['hash'] in known and previous is not None:
+                    row = previous[known[fp['hash']]]
+                else:
+                    if fp['hash'] not in computed:
+                        landmarks = self.extract(path)
+                        if landmarks is None or np.shape(landmarks) != LANDMARKS_SHAPE:
+                            landmarks = np.full(LANDMARKS_SHAPE, np.nan, dtype=np.float32)
+                        computed[fp['hash']] = np.asarray(landmarks, dtype=np.float32)
+                    row = computed[fp['hash']]
+                writer.append(row)
+            # Release the previous array before the new file replaces it
+            del previous
+
+        self.files = {
+            str(path): {**fp, 'row': row}
+            for row, (path, fp) in enumerate(zip(paths, fingerprints))
+        }
+        tmp_file = self.index_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'count': len(paths), 'files': self.files}, f)
+        os.replace(tmp_file, self.index_file)
+
+        if not paths:
+            return np.empty((0,) + LANDMARKS_SHAPE, dtype=np.float32)
+        return np.load(self.array_file, mmap_mode='r')
+
+    def derived(self, suffix: str, version: int, compute: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        compute(landmarks) of the landmarks of the last lookup, stored as
+        <name>.<suffix>.npy and returned as a read-only memmap. Recomputed only
+        when the landmarks file or `version` changed. Call after landmarks().
+        """
+        derived_file = self.cache_dir / f"{self.name}.{suffix}.npy"
+        meta_file = self.cache_dir / f"{self.name}.{suffix}.json"
+        if not self.array_file.exists():
+            return compute(np.empty((0,) + LANDMARKS_SHAPE, dtype=np.float32))
+        st = self.array_file.stat()
+        source = {'version': version, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+        if derived_file.exists() and meta_file.exists():
+            try:
+                with open(meta_file, 'r', encoding='utf-8') as f:
+                    if json.load(f) == source:
+                        return np.load(derived_file, mmap_mode='r')
+            except (OSError, ValueError):
+                pass
+
+        meta_file.unlink(missing_ok=True)
+        result = np.ascontiguousarray(compute(np.load(self.array_file, mmap_mode='r')))
+        tmp_file = derived_file.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            np.save(f, result)
+        os.replace(tmp_file, derived_file)
+        with open(meta_file, 'w', encoding='utf-8') as f:
+            json.dump(source, f)
+        return np.load(derived_file, mmap_mode='r')
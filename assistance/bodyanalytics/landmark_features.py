@@ -0,0 +1,79 @@
+"""
+Per-frame features of pose landmarks, shared by training and inference.
+
+landmark_features() turns MediaPipe landmarks (..., n_frames, 33, 4)
+(x, y, z, visibility) into (..., n_frames, 33, FEATURE_DIM) float32:
+- 0:3 hip-centred, scale-normalised coordinates: origin at the middle of
+  the hips, unit = torso size (middle of the hips to middle of the
+  shoulders), so neither where the person stands in the image nor their
+  distance to the camera changes the features;
+- 3: visibility;
+- 4:7 velocity: difference of the normalised coordinates with the previous
+  frame, 0 on the first frame and after a frame without pose;
+- 7: visibility mask, 1.0 where visibility > VISIBILITY_THRESHOLD.
+Channels 0:4 keep the layout of the raw landmarks, so they can be used as
+targets in place of them. Rows without a pose (NaN) stay NaN.
+
+Everything is computed on whole arrays, without a loop over frames.
+train.py runs it once when a dataset is built and caches the result next
+to the landmarks (LandmarkCache.derived); motion_inference runs it on the
+poses of each request.
+"""
+import numpy as np
+
+FEATURES_VERSION = 1
+FEATURE_DIM = 8
+TARGET_DIM = 4
+
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_HIP, RIGHT_HIP = 23, 24
+VISIBILITY_THRESHOLD = 0.5
+# Smallest torso size, relative to image size: avoids dividing by ~0
+MIN_SCALE = 1e-3
+
+
+def body_frame(landmarks: np.ndarray):
+    """
+    Origin (..., 3) and scale (..., 1) of each frame of landmarks (..., 33, 4):
+    middle of the hips and torso size
+    """
+    xyz = landmarks[..., :3]
+    hips = (xyz[..., LEFT_HIP, :] + xyz[..., RIGHT_HIP, :]) / 2
+    shoulders = (xyz[..., LEFT_SHOULDER, :] + xyz[..., RIGHT_SHOULDER, :]) / 2
+    scale = np.linalg.norm(shoulders - hips, axis=-1, keepdims=True)
+    return hips, np.maximum(scale, MIN_SCALE)
+
+
+def landmark_features(landmarks: np.ndarray) -> np.ndarray:
+    """(..., n_frames, 33, 4) landmarks -> (..., n_frames, 33, FEATURE_DIM) features"""
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    origin, scale = body_frame(landmarks)
+    coords = (landmarks[..., :3] - origin[..., None, :]) / scale[..., None, :]
+
+    features = np.empty(landmarks.shape[:-1] + (FEATURE_DIM,), dtype=np.float32)
+    features[..., 0:3] = coords
+    features[..., 3] = landmarks[..., 3]
+    features[..., 4:7] = 0
+    if landmarks.shape[-3] > 1:
+        velocity = coords[..., 1:, :, :] - coords[..., :-1, :, :]
+        # After a frame without pose (NaN), the velocity is unknown: 0
+        previous_missing = np.isnan(coords[..., :-1, :, :]).any(axis=(-2, -1))
+        velocity[previous_missing] = 0
+        features[..., 1:, :, 4:7] = velocity
+    with np.errstate(invalid='ignore'):
+        features[..., 7] = landmarks[..., 3] > VISIBILITY_THRESHOLD
+    # The mask of a frame without pose is NaN too, like its other channels
+    features[np.isnan(landmarks).any(axis=(-2, -1))] = np.nan
+    return features
+
+
+def to_image_coordinates(coords: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
+    """
+    Inverse of the normalisation: one point per frame, coords (..., C >= 3)
+    in the body frame of each frame's landmarks (..., 33, 4), back to image
+    coordinates. Channels after the third (visibility) are unchanged.
+    """
+    origin, scale = body_frame(np.asarray(landmarks, dtype=np.float32))
+    result = np.array(coords, dtype=np.float32)
+    result[..., :3] = result[..., :3] * scale + origin
+    return result
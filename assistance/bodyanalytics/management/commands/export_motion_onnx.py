@@ -0,0 +1,140 @@
+"""
+Management command to export the sequential motion models to ONNX
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bodyanalytics.motion_inference import ZONES, TorchZoneModel, get_config
+from bodyanalytics.motion_onnx import (
+    DEFAULT_OPSET, OnnxZoneModel, export_zone, max_abs_diff, median_latency_ms, onnx_path, quantize_zone,
+    sample_inputs,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Export sequential_{zone}.pth checkpoints to ONNX (optionally int8-quantised), '
+        'check parity with eager PyTorch and compare latencies'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--zones',
+            nargs='+',
+            choices=ZONES,
+            default=list(ZONES),
+            help='Zones to export (default: all with a checkpoint)',
+        )
+        parser.add_argument(
+            '--checkpoints-dir',
+            default=None,
+            help='Directory of the checkpoints and exports (default: MOTION_INFERENCE CHECKPOINTS_DIR)',
+        )
+        parser.add_argument(
+            '--quantize',
+            action='store_true',
+            help='Also write sequential_{zone}.int8.onnx with dynamic int8 LSTM and Linear weights',
+        )
+        parser.add_argument(
+            '--opset',
+            type=int,
+            default=DEFAULT_OPSET,
+            help=f'ONNX opset (default: {DEFAULT_OPSET})',
+        )
+        parser.add_argument(
+            '--skip-check',
+            action='store_true',
+            help='Export only, without parity check and latency comparison',
+        )
+        parser.add_argument(
+            '--atol',
+            type=float,
+            default=1e-4,
+            help='Maximum absolute difference between eager and ONNX fp32 outputs (default: 1e-4)',
+        )
+        parser.add_argument(
+            '--int8-atol',
+            type=float,
+            default=5e-2,
+            help='Maximum absolute difference between eager and int8 outputs (default: 5e-2)',
+        )
+        parser.add_argument(
+            '--batch-sizes',
+            nargs='+',
+            type=int,
+            default=[1, 32],
+            help='Batch sizes of the latency comparison (default: 1 32)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Timed runs per model and batch size (default: 50)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=None,
+            help='Intra-op threads of torch and onnxruntime during the comparison',
+        )
+
+    def handle(self, *args, **options):
+        from bodyanalytics.train import ZONE_LANDMARKS_MAP
+
+        checkpoints_dir = Path(options['checkpoints_dir'] or get_config()['CHECKPOINTS_DIR'])
+        failures = []
+        exported = 0
+
+        for zone in options['zones']:
+            checkpoint_path = checkpoints_dir / f'sequential_{zone}.pth'
+            if not checkpoint_path.exists():
+                self.stdout.write(f'  - {zone}: no checkpoint at {checkpoint_path}, skipped')
+                continue
+
+            landmarks = len(ZONE_LANDMARKS_MAP[zone])
+            paths = {'onnx': onnx_path(checkpoints_dir, zone)}
+            seq_len = export_zone(checkpoint_path, paths['onnx'], landmarks, options['opset'])
+            if options['quantize']:
+                paths['onnx-int8'] = onnx_path(checkpoints_dir, zone, quantized=True)
+                quantize_zone(paths['onnx'], paths['onnx-int8'])
+            exported += 1
+            sizes = ', '.join(f'{path.name} {path.stat().st_size / 1024:.0f} KB' for path in paths.values())
+            self.stdout.write(f'  - {zone}: {sizes}')
+
+            if options['skip_check']:
+                continue
+
+            eager = TorchZoneModel(checkpoint_path, options['threads'])
+            models = {'torch': eager}
+            models.update({
+                backend: OnnxZoneModel(path, options['threads']) for backend, path in paths.items()
+            })
+
+            # Parity on a batch other than the one used for the export trace
+            inputs = sample_inputs(8, seq_len, landmarks, eager.input_size, seed=1)
+            tolerances = {'onnx': options['atol'], 'onnx-int8': options['int8_atol']}
+            for backend in paths:
+                diff = max_abs_diff(eager, models[backend], inputs)
+                ok = diff <= tolerances[backend]
+                self.stdout.write(
+                    f'    parity {backend:9s} max |diff| {diff:.2e} '
+                    f'({"ok" if ok else "FAILED"}, tolerance {tolerances[backend]:.0e})'
+                )
+                if not ok:
+                    failures.append(f'{zone} {backend}')
+
+            for batch_size in options['batch_sizes']:
+                inputs = sample_inputs(max(batch_size, 1), seq_len, landmarks, eager.input_size, seed=2)
+                latencies = {
+                    backend: median_latency_ms(model, inputs, max(options['repeat'], 1))
+                    for backend, model in models.items()
+                }
+                line = ', '.join(
+                    f'{backend} {ms:.2f} ms (x{latencies["torch"] / ms:.1f})' for backend, ms in latencies.items()
+                )
+                self.stdout.write(f'    batch {batch_size:3d}: {line}')
+
+        if failures:
+            raise CommandError(f'ONNX parity check failed: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS(f'Exported {exported} zone models to {checkpoints_dir}'))
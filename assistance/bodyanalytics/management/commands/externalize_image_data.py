@@ -0,0 +1,75 @@
+"""
+Management command to move inline base64 image_data out of the data table
+"""
+from django.core.management.base import BaseCommand
+from bodyanalytics.models import Data as MovementRecord
+from bodyanalytics.image_storage import store_image_data
+
+
+class Command(BaseCommand):
+    help = 'Move inline base64 image_data from MovementRecord rows to default_storage in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of records loaded per batch (default: 200)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after this many records',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count records with inline image data',
+        )
+
+    def handle(self, *args, **options):
+        inline_records = MovementRecord.objects.filter(image_data__startswith='data:')
+
+        if options['dry_run']:
+            self.stdout.write(f'Found {inline_records.count()} records with inline image data')
+            return
+
+        batch_size = max(options['batch_size'], 1)
+        limit = options['limit']
+        last_id = 0
+        moved_count = 0
+        failed_count = 0
+
+        while limit is None or moved_count + failed_count < limit:
+            # Keyset pagination on id: only id, user_id and image_data are loaded
+            batch = list(
+                inline_records.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'user_id', 'image_data')[:batch_size]
+            )
+            if not batch:
+                break
+
+            for record in batch:
+                last_id = record.id
+                if limit is not None and moved_count + failed_count >= limit:
+                    break
+                try:
+                    reference = store_image_data(record.image_data, record.user_id)
+                except ValueError as e:
+                    self.stdout.write(f'  - Could not decode image data for record {record.id}: {e}')
+                    failed_count += 1
+                    continue
+
+                # Update the single column so concurrent writes to other fields are kept
+                MovementRecord.objects.filter(id=record.id).update(image_data=reference)
+                moved_count += 1
+
+            self.stdout.write(f'  - Processed up to record {last_id} ({moved_count} moved)')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Moved {moved_count} inline images to storage ({failed_count} failed)'
+            )
+        )
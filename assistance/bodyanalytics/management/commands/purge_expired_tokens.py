@@ -0,0 +1,75 @@
+"""
+Management command to purge expired refresh tokens and stale blacklist rows
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from bodyanalytics.models import RefreshTokens, TokenBlacklist
+from bodyanalytics.token_blacklist import blacklist_retention
+
+
+class Command(BaseCommand):
+    help = 'Delete expired refresh_tokens and token_blacklist rows in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows deleted per transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--blacklist-retention-days',
+            type=int,
+            default=None,
+            help="Keep blacklist rows younger than this (default: TOKEN_BLACKLIST_CACHE['RETENTION_DAYS'])",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count rows that would be deleted',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = max(options['batch_size'], 1)
+
+        retention_days = options['blacklist_retention_days']
+        if retention_days is None:
+            retention = blacklist_retention()
+        else:
+            retention = timedelta(days=retention_days)
+
+        # A blacklisted token older than the longest token lifetime (of Django and
+        # of the Spring Boot service writing the table) has expired anyway
+        expired_refresh = RefreshTokens.objects.filter(expiry_date__lt=now)
+        stale_blacklist = TokenBlacklist.objects.filter(blacklisted_at__lt=now - retention)
+
+        if options['dry_run']:
+            self.stdout.write(f'Found {expired_refresh.count()} expired refresh tokens')
+            self.stdout.write(f'Found {stale_blacklist.count()} blacklist rows older than {retention}')
+            return
+
+        refresh_count = self.delete_in_batches(expired_refresh, batch_size, 'refresh tokens')
+        blacklist_count = self.delete_in_batches(stale_blacklist, batch_size, 'blacklist rows')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Deleted {refresh_count} expired refresh tokens and {blacklist_count} blacklist rows'
+            )
+        )
+
+    def delete_in_batches(self, queryset, batch_size, label):
+        """Delete by id chunks so each transaction stays short on the shared tables"""
+        deleted_total = 0
+        while True:
+            ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                deleted, _ = queryset.model.objects.filter(id__in=ids).delete()
+            deleted_total += deleted
+            self.stdout.write(f'  - Deleted {deleted_total} {label}')
+        return deleted_total
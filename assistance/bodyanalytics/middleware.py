@@ -0,0 +1,177 @@
+"""
+Middleware for the bodyanalytics API
+"""
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from .db_routers import get_replica_alias, set_read_from_replica
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_BUDGET = {
+    'MAX_QUERIES': 50,
+    'MAX_DB_TIME_MS': 500,
+    'RESPONSE_HEADERS': False,
+}
+
+
+class QueryCounter:
+    """execute_wrapper that counts queries and accumulates their duration"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts queries and DB time for each request across all database aliases.
+    Requests over settings.QUERY_BUDGET are logged with their view name, which
+    makes N+1 regressions in the Django* views visible.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        budget = {**DEFAULT_QUERY_BUDGET, **getattr(settings, 'QUERY_BUDGET', {})}
+        self.max_queries = budget['MAX_QUERIES']
+        self.max_db_time_ms = budget['MAX_DB_TIME_MS']
+        self.response_headers = budget['RESPONSE_HEADERS']
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        with self.count_queries(counter):
+            response = self.get_response(request)
+        return self.finish(request, response, counter)
+
+    async def __acall__(self, request):
+        # Connections are thread-local and the async ORM runs its queries in
+        # the request's sync thread, so the wrappers are installed there
+        counter = QueryCounter()
+        stack = await sync_to_async(self.count_queries)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, counter)
+
+    def count_queries(self, counter):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(counter))
+        return stack
+
+    def finish(self, request, response, counter):
+        self.check_budget(request, counter)
+        if self.response_headers:
+            response['X-DB-Query-Count'] = str(counter.count)
+            response['X-DB-Time-Ms'] = f'{counter.duration_ms:.1f}'
+        return response
+
+    def check_budget(self, request, counter):
+        over_queries = self.max_queries is not None and counter.count > self.max_queries
+        over_time = self.max_db_time_ms is not None and counter.duration_ms > self.max_db_time_ms
+        if not (over_queries or over_time):
+            return
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else request.path
+        logger.warning(
+            'Query budget exceeded by %s %s (%s): %d queries, %.1f ms DB time (budget: %s queries, %s ms)',
+            request.method, request.path, view_name,
+            counter.count, counter.duration_ms,
+            self.max_queries, self.max_db_time_ms,
+        )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Marks GET/HEAD requests to the views in settings.REPLICA_READ_VIEWS as
+    replica-safe for PrimaryReplicaRouter. A successful write pins the client
+    to the primary (cookie) for REPLICA_PIN_SECONDS, so users read their own
+    writes even while the replica lags.
+    The URL is resolved here rather than in process_view, which Django would
+    run through sync_to_async for the async views.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.read_views = set(getattr(settings, 'REPLICA_READ_VIEWS', []))
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+        self.pin_cookie = getattr(settings, 'REPLICA_PIN_COOKIE_NAME', 'db_primary_pin')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        set_read_from_replica(self.use_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            set_read_from_replica(False)
+        return self.pin_writes(request, response)
+
+    async def __acall__(self, request):
+        set_read_from_replica(self.use_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            set_read_from_replica(False)
+        return self.pin_writes(request, response)
+
+    def pin_writes(self, request, response):
+        if request.method not in self.SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                self.pin_cookie, '1',
+                max_age=self.pin_seconds,
+                httponly=True,
+                # The Angular app calls the API cross-origin with credentials:
+                # a Lax cookie would not be sent on its XHRs. Browsers only
+                # accept SameSite=None on Secure cookies (localhost included).
+                samesite='None',
+                secure=True,
+            )
+        return response
+
+    def use_replica(self, request):
+        if get_replica_alias() is None:
+            return False
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if request.COOKIES.get(self.pin_cookie):
+            return False
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return False
+        return match.url_name in self.read_views
@@ -0,0 +1,281 @@
+"""
+Batched inference for the sequential motion models trained by train.py.
+
+Each zone model (CHECKPOINTS_DIR/sequential_{zone}.pth) is loaded once per
+process, on first use. Requests do not run the model one by one: a
+MicroBatcher thread per zone waits for the first request, then for up to
+MAX_WAIT_MS more (or until MAX_BATCH_SIZE requests are queued). Requests
+of the same shape are stacked and go through the model in one forward
+pass. Each caller gets its own rows back through a Future.
+
+Models trained on landmark features (train.py without --raw-landmarks)
+take full poses of 33 landmarks: the request goes through the same
+landmark_features() transform as the training data, then the landmarks of
+the zone are selected, and the predicted coordinates are mapped back from
+the body frame of the frame they predict to image coordinates.
+
+torch and train.py (or onnxruntime, with an ONNX backend) are only
+imported when the first model is loaded, so importing this module (and
+the Django views) stays cheap.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .landmark_features import landmark_features, to_image_coordinates
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MOTION_INFERENCE = {
+    # Directory of the sequential_{zone}.pth checkpoints written by train.py
+    'CHECKPOINTS_DIR': str(Path(__file__).resolve().parent / 'checkpoints_sequential'),
+    'MAX_BATCH_SIZE': 32,
+    # How long the first request of a batch waits for others
+    'MAX_WAIT_MS': 5,
+    # 'torch' (eager checkpoint), 'onnx' or 'onnx-int8' (exports of the
+    # export_motion_onnx command, run with onnxruntime; torch is not imported)
+    'BACKEND': 'torch',
+    # Intra-op threads of the model (None: torch / onnxruntime default)
+    'THREADS': None,
+    # Seconds a request waits for its batch before failing
+    'TIMEOUT_SECONDS': 10,
+}
+
+ZONES = ('eyes', 'mouth', 'hands', 'full_body')
+BACKENDS = ('torch', 'onnx', 'onnx-int8')
+# Same alphabet as train.ALPHABET: letters outside it are encoded as 0
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz .,!?\n'
+CHAR_TO_IDX = {c: i for i, c in enumerate(ALPHABET)}
+# Landmarks of a full MediaPipe pose, needed by models trained on features
+POSE_LANDMARKS = 33
+
+
+def get_config():
+    return {**DEFAULT_MOTION_INFERENCE, **getattr(settings, 'MOTION_INFERENCE', {})}
+
+
+def encode_text(text, seq_len):
+    """Letter indices of text, lower-cased, truncated or padded with 0 to seq_len"""
+    indices = [CHAR_TO_IDX.get(c, 0) for c in text.lower()[:seq_len]]
+    indices += [0] * (seq_len - len(indices))
+    return np.array(indices, dtype=np.int64)
+
+
+class TorchZoneModel:
+    """
+    Eager PyTorch model of one zone, in eval mode.
+    features: version of landmark_features the model was trained on (0: raw
+    landmarks); landmark_indices: landmarks of the zone in a full pose.
+    """
+
+    def __init__(self, checkpoint_path, threads=None):
+        import torch
+        from . import train
+
+        if threads:
+            torch.set_num_threads(int(threads))
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=True)
+        self.torch = torch
+        self.seq_len = int(checkpoint.get('seq_len', train.SEQUENCE_LENGTH))
+        # Checkpoints written before landmark features: raw landmarks
+        self.input_size = int(checkpoint.get('input_size', 4))
+        self.features = int(checkpoint.get('features', 0))
+        self.landmark_indices = list(checkpoint.get('landmark_indices', []))
+        self.model = train.SequentialTextToMovementModel(seq_len=self.seq_len, input_size=self.input_size)
+        self.model.load_state_dict(checkpoint['model_state'])
+        self.model.eval()
+
+    def predict(self, text_seqs, pose_seqs):
+        """text_seqs [B, seq_len] int64, pose_seqs [B, seq_len, n, input_size] float32 -> [B, seq_len, 4]"""
+        with self.torch.inference_mode():
+            motion_pred, _, _ = self.model(
+                self.torch.from_numpy(text_seqs), self.torch.from_numpy(pose_seqs)
+            )
+        return motion_pred.float().numpy()
+
+
+class PendingRequest:
+    __slots__ = ('text_seq', 'pose_seq', 'future')
+
+    def __init__(self, text_seq, pose_seq):
+        self.text_seq = text_seq
+        self.pose_seq = pose_seq
+        self.future = Future()
+
+
+class MicroBatcher:
+    """Collects concurrent requests of one zone into batches for a single model"""
+
+    def __init__(self, zone, load_model, max_batch_size=32, max_wait_ms=5):
+        self.zone = zone
+        self.load_model = load_model
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000
+        self.model = None
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.batched_requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def seq_len(self):
+        return self.get_model().seq_len
+
+    def get_model(self):
+        if self.model is None:
+            with self._lock:
+                if self.model is None:
+                    self.model = self.load_model()
+        return self.model
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name=f'motion-batcher-{self.zone}', daemon=True
+                    )
+                    self._thread.start()
+
+    def submit(self, text_seq, pose_seq):
+        """Queue one request; the Future resolves to (prediction [seq_len, 4], batch size)"""
+        self._ensure_thread()
+        request = PendingRequest(text_seq, pose_seq)
+        self.requests.put(request)
+        return request.future
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Only requests of the same shape can be stacked
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.pose_seq.shape, []).append(request)
+            for requests in groups.values():
+                self._run_group(requests)
+
+    def _run_group(self, requests):
+        requests = [request for request in requests if request.future.set_running_or_notify_cancel()]
+        if not requests:
+            return
+        try:
+            predictions = self.get_model().predict(
+                np.stack([request.text_seq for request in requests]),
+                np.stack([request.pose_seq for request in requests]),
+            )
+        except Exception as e:
+            logger.exception('Motion prediction failed for zone %s', self.zone)
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_requests += len(requests)
+        for request, prediction in zip(requests, predictions):
+            request.future.set_result((prediction, len(requests)))
+
+
+_batchers = {}
+_owner_pid = None
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(zone):
+    """Process-wide MicroBatcher of a zone, configured from settings.MOTION_INFERENCE"""
+    global _owner_pid
+    if zone not in ZONES:
+        raise ValueError(f"unknown zone {zone!r}, expected one of {', '.join(ZONES)}")
+    with _batchers_lock:
+        # Batcher threads do not survive a fork (gunicorn preload)
+        if _owner_pid != os.getpid():
+            _batchers.clear()
+            _owner_pid = os.getpid()
+        batcher = _batchers.get(zone)
+        if batcher is None:
+            config = get_config()
+            backend = config['BACKEND']
+            if backend not in BACKENDS:
+                raise ImproperlyConfigured(f"MOTION_INFERENCE BACKEND must be one of {', '.join(BACKENDS)}, not {backend!r}")
+            checkpoints_dir = Path(config['CHECKPOINTS_DIR'])
+            if backend == 'torch':
+                model_path = checkpoints_dir / f"sequential_{zone}.pth"
+            else:
+                from .motion_onnx import onnx_path
+                model_path = onnx_path(checkpoints_dir, zone, quantized=backend == 'onnx-int8')
+
+            def load_model():
+                if not model_path.exists():
+                    raise FileNotFoundError(f"no {backend} model for zone {zone}: {model_path}")
+                if backend == 'torch':
+                    model = TorchZoneModel(model_path, config['THREADS'])
+                else:
+                    from .motion_onnx import OnnxZoneModel
+                    model = OnnxZoneModel(model_path, config['THREADS'])
+                logger.info('Motion model %s loaded from %s', zone, model_path)
+                return model
+
+            batcher = _batchers[zone] = MicroBatcher(
+                zone, load_model, config['MAX_BATCH_SIZE'], config['MAX_WAIT_MS']
+            )
+        return batcher
+
+
+def predict_motion(zone, text, poses, timeout=None):
+    """
+    Predicted landmark sequence for one request.
+    text: string, encoded and padded to the model sequence length;
+    poses: [seq_len, n_landmarks, 4] landmarks (x, y, z, visibility), a full
+    pose (33 landmarks) for models trained on landmark features.
+    Returns (prediction [seq_len, 4] ndarray, number of requests in its batch);
+    row t is the predicted motion at frame t + 1.
+    Raises ValueError for invalid input, FileNotFoundError without a model.
+    """
+    batcher = get_batcher(zone)
+    model = batcher.get_model()
+    seq_len = model.seq_len
+    if not isinstance(text, str):
+        raise ValueError('text must be a string')
+    try:
+        pose_seq = np.asarray(poses, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise ValueError('poses must be a [seq_len, n_landmarks, 4] array of numbers')
+    if pose_seq.ndim != 3 or pose_seq.shape[0] != seq_len or pose_seq.shape[2] != 4 or pose_seq.shape[1] == 0:
+        raise ValueError(f"poses must have shape [{seq_len}, n_landmarks, 4], got {list(pose_seq.shape)}")
+    if not np.isfinite(pose_seq).all():
+        raise ValueError('poses must be finite numbers')
+    model_input = pose_seq
+    if model.features:
+        if pose_seq.shape[1] != POSE_LANDMARKS:
+            raise ValueError(f"poses must be full poses of shape [{seq_len}, {POSE_LANDMARKS}, 4], "
+                             f"got {list(pose_seq.shape)}")
+        model_input = landmark_features(pose_seq)[:, model.landmark_indices]
+
+    future = batcher.submit(encode_text(text, seq_len), model_input)
+    prediction, batch_size = future.result(
+        timeout=timeout if timeout is not None else get_config()['TIMEOUT_SECONDS']
+    )
+    if model.features:
+        # Row t predicts frame t + 1, normalised in that frame's body frame (see
+        # train.motion_loss); the last row looks past the input and keeps its last frame
+        target_frames = np.concatenate([pose_seq[1:], pose_seq[-1:]])
+        prediction = to_image_coordinates(prediction, target_frames)
+    return prediction, batch_size
@@ -0,0 +1,143 @@
+"""
+ONNX export and onnxruntime serving of the sequential motion models.
+
+export_zone() turns a sequential_{zone}.pth checkpoint into
+sequential_{zone}.onnx (inputs text_seq [batch, seq_len] int64 and
+pose_seq [batch, seq_len, landmarks, input_size] float32, output
+motion_pred [batch, seq_len, 4]; batch and landmarks are dynamic).
+quantize_zone()
+writes sequential_{zone}.int8.onnx, with the LSTM and MatMul/Gemm
+(Linear) weights dynamically quantised to int8.
+
+OnnxZoneModel runs an export with onnxruntime on CPU and has the same
+predict() as motion_inference.TorchZoneModel, which max_abs_diff() and
+median_latency_ms() compare it with. It needs neither torch nor train.py:
+seq_len and the input transform (input_size, features, landmark_indices)
+are stored in the model metadata.
+
+torch, onnx and onnxruntime are imported only by the functions that
+use them.
+"""
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .motion_inference import TorchZoneModel
+
+INPUT_NAMES = ['text_seq', 'pose_seq']
+OUTPUT_NAMES = ['motion_pred']
+DEFAULT_OPSET = 17
+QUANTIZED_OPS = ['LSTM', 'MatMul', 'Gemm']
+
+
+def onnx_path(checkpoints_dir, zone, quantized=False):
+    suffix = '.int8.onnx' if quantized else '.onnx'
+    return Path(checkpoints_dir) / f"sequential_{zone}{suffix}"
+
+
+def sample_inputs(batch_size, seq_len, landmarks, input_size=4, seed=0):
+    rng = np.random.default_rng(seed)
+    text_seqs = rng.integers(0, 32, size=(batch_size, seq_len), dtype=np.int64)
+    pose_seqs = rng.random((batch_size, seq_len, landmarks, input_size), dtype=np.float32)
+    return text_seqs, pose_seqs
+
+
+def export_zone(checkpoint_path, output_path, landmarks, opset=DEFAULT_OPSET):
+    """Export a checkpoint to ONNX; returns seq_len"""
+    import onnx
+    import torch
+
+    eager = TorchZoneModel(checkpoint_path)
+    model, seq_len = eager.model, eager.seq_len
+
+    class MotionOnly(torch.nn.Module):
+        """Only motion_pred is served; the text and pose contexts are dropped"""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, text_seq, pose_seq):
+            return self.model(text_seq, pose_seq)[0]
+
+    text_seqs, pose_seqs = sample_inputs(2, seq_len, landmarks, eager.input_size)
+    with torch.no_grad():
+        torch.onnx.export(
+            MotionOnly(model),
+            (torch.from_numpy(text_seqs), torch.from_numpy(pose_seqs)),
+            str(output_path),
+            input_names=INPUT_NAMES,
+            output_names=OUTPUT_NAMES,
+            dynamic_axes={
+                'text_seq': {0: 'batch'},
+                'pose_seq': {0: 'batch', 2: 'landmarks'},
+                'motion_pred': {0: 'batch'},
+            },
+            opset_version=opset,
+        )
+
+    exported = onnx.load(str(output_path))
+    onnx.helper.set_model_props(exported, {
+        'seq_len': str(seq_len),
+        'landmarks': str(landmarks),
+        'input_size': str(eager.input_size),
+        'features': str(eager.features),
+        'landmark_indices': ','.join(str(i) for i in eager.landmark_indices),
+    })
+    onnx.checker.check_model(exported)
+    onnx.save(exported, str(output_path))
+    return seq_len
+
+
+def quantize_zone(input_path, output_path):
+    """Dynamic int8 quantisation of the LSTM and Linear weights"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        str(input_path), str(output_path),
+        op_types_to_quantize=QUANTIZED_OPS,
+        weight_type=QuantType.QInt8,
+    )
+
+
+class OnnxZoneModel:
+    """onnxruntime CPU session of one exported zone model"""
+
+    def __init__(self, model_path, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(str(model_path), options, providers=['CPUExecutionProvider'])
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.seq_len = int(metadata['seq_len'])
+        # Exports written before landmark features: raw landmarks
+        self.input_size = int(metadata.get('input_size', 4))
+        self.features = int(metadata.get('features', 0))
+        self.landmark_indices = [int(i) for i in metadata.get('landmark_indices', '').split(',') if i]
+
+    def predict(self, text_seqs, pose_seqs):
+        """text_seqs [B, seq_len] int64, pose_seqs [B, seq_len, n, input_size] float32 -> [B, seq_len, 4]"""
+        return self.session.run(OUTPUT_NAMES, {
+            'text_seq': np.ascontiguousarray(text_seqs, dtype=np.int64),
+            'pose_seq': np.ascontiguousarray(pose_seqs, dtype=np.float32),
+        })[0]
+
+
+def max_abs_diff(reference, candidate, inputs):
+    return float(np.max(np.abs(reference.predict(*inputs) - candidate.predict(*inputs))))
+
+
+def median_latency_ms(model, inputs, repeat, warmup=3):
+    for _ in range(warmup):
+        model.predict(*inputs)
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict(*inputs)
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs) * 1000
@@ -0,0 +1,151 @@
+"""
+Bounded-memory .npy writing and lazy normalisation.
+
+NpyAppender fills an on-disk .npy row by row:
+- np.lib.format.open_memmap preallocates "<path>.partial" for `capacity`
+  rows and writes the header;
+- rows are then written with plain file writes at the data offset. Dirty
+  pages of a writable mapping would count in RSS until unmapped, while
+  written pages go to the page cache and can be reclaimed.
+Peak RSS therefore does not depend on the number of rows. close()
+publishes the file, trimmed to the rows actually written; trimming
+copies the data by chunks.
+
+Pixels stay uint8 on disk; NormalizedImages turns them into float32 in
+[0, 1] only for the rows that are indexed.
+"""
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Rows copied at a time when the written part is trimmed
+COPY_CHUNK_ROWS = 1024
+
+
+def allocate_npy(path: Path, shape: Tuple[int, ...], dtype) -> int:
+    """Create a .npy of the given shape (sparse on most filesystems), return its data offset"""
+    array = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+    offset = array.offset
+    del array
+    return offset
+
+
+class NpyAppender:
+    """Appends fixed-shape rows to a preallocated .npy file"""
+
+    def __init__(self, path: Path, capacity: int, row_shape: Optional[Tuple[int, ...]] = None, dtype=np.uint8):
+        self.path = Path(path)
+        self.partial = self.path.with_name(self.path.name + '.partial')
+        self.capacity = int(capacity)
+        self.row_shape = tuple(row_shape) if row_shape is not None else None
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._file = None
+        self._offset = 0
+        self._row_bytes = 0
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def _open(self, row_shape: Tuple[int, ...]):
+        self.row_shape = tuple(row_shape)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._offset = allocate_npy(self.partial, (self.capacity,) + self.row_shape, self.dtype)
+        self._row_bytes = int(np.prod(self.row_shape, dtype=np.int64)) * self.dtype.itemsize
+        self._file = open(self.partial, 'r+b')
+        self._file.seek(self._offset)
+
+    def append(self, row: np.ndarray) -> bool:
+        """
+        Write one row. The first row fixes the row shape if none was given.
+        Returns False (row skipped) if its shape differs.
+        """
+        row = np.asarray(row)
+        if self._file is None:
+            self._open(self.row_shape if self.row_shape is not None else row.shape)
+        if row.shape != self.row_shape:
+            return False
+        if self.count == self.capacity:
+            raise IndexError(f"{self.path}: capacity of {self.capacity} rows reached")
+        self._file.write(np.ascontiguousarray(row, dtype=self.dtype).tobytes())
+        self.count += 1
+        return True
+
+    def close(self) -> int:
+        """Publish the rows written so far; no file is left if there are none"""
+        if self._file is None or self.count == 0:
+            self.discard()
+            return 0
+
+        if self.count == self.capacity:
+            self._file.close()
+            self._file = None
+            os.replace(self.partial, self.path)
+            return self.count
+
+        trimmed_file = self.path.with_name(self.path.name + '.trimmed')
+        try:
+            trimmed_offset = allocate_npy(trimmed_file, (self.count,) + self.row_shape, self.dtype)
+            chunk_bytes = COPY_CHUNK_ROWS * self._row_bytes
+            remaining = self.count * self._row_bytes
+            self._file.seek(self._offset)
+            with open(trimmed_file, 'r+b') as out:
+                out.seek(trimmed_offset)
+                while remaining:
+                    chunk = self._file.read(min(chunk_bytes, remaining))
+                    if not chunk:
+                        # Truncated behind our back: the rows written are lost
+                        raise OSError(f"{self.partial}: unexpected end of file, "
+                                      f"{remaining} bytes of {self.count} rows missing")
+                    out.write(chunk)
+                    remaining -= len(chunk)
+            os.replace(trimmed_file, self.path)
+        except BaseException:
+            trimmed_file.unlink(missing_ok=True)
+            raise
+        finally:
+            self.discard()
+        return self.count
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.partial.unlink(missing_ok=True)
+
+
+class NormalizedImages:
+    """Read-only float32 view in [0, 1] over uint8 images (memory-mapped or not)"""
+
+    def __init__(self, images: np.ndarray, scale: float = 255.0):
+        self.images = images
+        self.scale = scale
+
+    @property
+    def shape(self):
+        return self.images.shape
+
+    @property
+    def dtype(self):
+        return np.dtype(np.float32)
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, index) -> np.ndarray:
+        return np.asarray(self.images[index]).astype(np.float32) / self.scale
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[:]
+        return array if dtype is None else array.astype(dtype, copy=False)
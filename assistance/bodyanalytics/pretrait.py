@@ -1,176 +1,253 @@
-﻿import numpy as np
+﻿import argparse
+import os
+import numpy as np
 import pickle
 import cv2
 from pathlib import Path
 
+try:
+    from .detectors import get_pose
+    from .npy_arrays import NormalizedImages, NpyAppender
+except ImportError:
+    # Exécuté comme script depuis bodyanalytics/
+    from detectors import get_pose
+    from npy_arrays import NormalizedImages, NpyAppender
+
 # Configuration
 ZOOM_DIR = Path("morphologie_zoom_128_fullbody")
 NPZ_DIR = Path("morphologie_npz")
 PKL_DIR = Path("morphologie_pkl")
+ARRAY_DIR = Path("morphologie_npy")  # tableaux .npy partagés par les métadonnées NPZ et PKL
 LANDMARK_DIR = "landmarks"  # sous-dossier avec fichiers .npy des landmarks
 
-# Créer les dossiers de sortie
-NPZ_DIR.mkdir(parents=True, exist_ok=True)
-PKL_DIR.mkdir(parents=True, exist_ok=True)
-
-def images_to_npz(morpho_folder, output_file):
-    """Convertir toutes les images d'une morphologie en fichier NPZ"""
-    images, filenames = [], []
-    for img_file in morpho_folder.glob("*.jpg"):
-        img = cv2.imread(str(img_file))
-        if img is not None:
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            images.append(img_rgb)
-            filenames.append(img_file.name)
-    if not images:
-        return 0
-    arr = np.array(images, dtype=np.uint8)
-    np.savez_compressed(
-        output_file,
-        images=arr,
-        filenames=np.array(filenames),
-        shape=arr.shape,
-        morphology=morpho_folder.name
-    )
-    print(f"✓ NPZ images: {morpho_folder.name} -> {len(arr)}")
-    return len(arr)
-
-def images_to_pkl(morpho_folder, output_file):
-    """Convertir toutes les images d'une morphologie en fichier PKL"""
-    data = {
-        'morphology': morpho_folder.name,
-        'images': [],
-        'filenames': [],
-        'metadata': {'image_size': (128,128,3), 'total_count': 0}
-    }
-    for img_file in morpho_folder.glob("*.jpg"):
-        img = cv2.imread(str(img_file))
-        if img is not None:
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).astype(np.float32)/255.0
-            data['images'].append(img_rgb)
-            data['filenames'].append(img_file.name)
-    if not data['images']:
-        return 0
-    data['images'] = np.array(data['images'])
-    data['metadata']['total_count'] = len(data['images'])
-    with open(output_file, 'wb') as f:
-        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
-    print(f"✓ PKL images: {morpho_folder.name} -> {data['metadata']['total_count']}")
-    return data['metadata']['total_count']
-
-import mediapipe as mp
-
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(
-    static_image_mode=True,
-    model_complexity=1,
-    enable_segmentation=False,
-    min_detection_confidence=0.5
-)
-
-def landmarks_to_npz(morpho_folder, output_file):
-    """Extraire landmarks des images JPG et les convertir en NPZ"""
-    points, filenames = [], []
-    
-    # Traiter directement les fichiers .jpg
-    for img_file in morpho_folder.glob("*.jpg"):
-        img = cv2.imread(str(img_file))
-        if img is not None:
-            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb)
-            
-            if results.pose_landmarks:
-                # Extraire les coordonnées des landmarks
-                landmarks = []
-                for lm in results.pose_landmarks.landmark:
-                    landmarks.extend([lm.x, lm.y, lm.z, lm.visibility])
-                
-                points.append(np.array(landmarks, dtype=np.float32))
-                filenames.append(img_file.name)
-    
-    if not points:
-        return 0
-    
-    arr = np.array(points, dtype=np.float32)
-    np.savez_compressed(
-        output_file,
-        landmarks=arr,
-        filenames=np.array(filenames),
-        shape=arr.shape,
-        morphology=morpho_folder.name
+FORMATS = ('npz', 'pkl')
+CONTENTS = ('images', 'landmarks')
+
+# Disposition des sorties: métadonnées .npz/.pkl + un tableau .npy par contenu dans
+# ARRAY_DIR, commun aux deux formats, lus par load_converted() (seul lecteur
+# supporté). Les noms portent la version: un ancien lecteur qui attend les tableaux
+# dans <nom>_<contenu>.npz/.pkl échoue au lieu de lire des données périmées
+OUTPUT_VERSION = 2
+
+
+def get_pretrait_pose():
+    """Pose MediaPipe du process, créé au premier appel"""
+    return get_pose(
+        static_image_mode=True,
+        model_complexity=1,
+        enable_segmentation=False,
+        min_detection_confidence=0.5
     )
+
+def extract_landmarks(rgb):
+    """Landmarks pose d'une image RGB: (132,) float32 = 33 x (x, y, z, visibility), ou None"""
+    results = get_pretrait_pose().process(rgb)
+    if not results.pose_landmarks:
+        return None
     
-    print(f"✓ NPZ landmarks: {morpho_folder.name} -> {len(arr)} sets")
-    return len(arr)
+    landmarks = []
+    for lm in results.pose_landmarks.landmark:
+        landmarks.extend([lm.x, lm.y, lm.z, lm.visibility])
+    return np.array(landmarks, dtype=np.float32)
 
+def array_path(name, content):
+    """Tableau .v2.npy d'un contenu, commun aux sorties NPZ et PKL"""
+    return ARRAY_DIR / f"{name}_{content}.v{OUTPUT_VERSION}.npy"
 
-def landmarks_to_pkl(morpho_folder, output_file):
-    """Extraire landmarks des images JPG et les convertir en fichier PKL"""
-    data = {
-        'morphology': morpho_folder.name,
-        'landmarks': [],
-        'filenames': [],
-        'metadata': {'total_count': 0}
+def output_paths(directory, name, content, fmt):
+    """(fichier de métadonnées .v2.npz/.v2.pkl, tableau .v2.npy) d'une sortie"""
+    return directory / f"{name}_{content}.v{OUTPUT_VERSION}.{fmt}", array_path(name, content)
+
+def legacy_path(directory, name, content, fmt):
+    """Sortie des versions précédentes (tableaux dans le .npz/.pkl)"""
+    return directory / f"{name}_{content}.{fmt}"
+
+def save_metadata(fmt, content, morphology, output_file, array_file, filenames, shape):
+    """
+    Écrit le fichier .npz/.pkl d'une sortie. Les tableaux restent dans le .npy
+    partagé (images en uint8), référencé relativement au fichier de métadonnées
+    et relu par load_converted()
+    """
+    array_name = os.path.relpath(array_file, output_file.parent)
+    if fmt == 'npz':
+        np.savez_compressed(
+            output_file,
+            version=OUTPUT_VERSION,
+            filenames=np.array(filenames),
+            shape=np.array(shape),
+            morphology=morphology,
+            **{f"{content}_file": array_name}
+        )
+    else:
+        metadata = {'total_count': shape[0]}
+        if content == 'images':
+            metadata.update({'image_size': (128,128,3), 'dtype': 'uint8', 'scale': 255.0})
+        data = {
+            'version': OUTPUT_VERSION,
+            'morphology': morphology,
+            f"{content}_file": array_name,
+            'filenames': list(filenames),
+            'metadata': metadata
+        }
+        with open(output_file, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def convert_morphology(morpho_folder, formats, contents):
+    """
+    Une seule passe sur les images d'une morphologie: chaque JPG est décodé
+    une fois et passe une fois dans MediaPipe Pose. Les lignes sont écrites au fil
+    de l'eau dans un .npy par contenu (open_memmap), partagé par les formats
+    demandés: la mémoire ne dépend pas du nombre d'images.
+    Retourne {(format, contenu): nombre}
+    """
+    name = morpho_folder.name
+    img_files = list(morpho_folder.glob("*.jpg"))
+    selected = [content for content in CONTENTS if content in contents]
+    directories = {'npz': NPZ_DIR, 'pkl': PKL_DIR}
+    row_shapes = {'images': None, 'landmarks': (132,)}
+    dtypes = {'images': np.uint8, 'landmarks': np.float32}
+    
+    writers = {
+        content: NpyAppender(array_path(name, content), len(img_files), row_shapes[content], dtypes[content])
+        for content in selected
     }
+    filenames = {content: [] for content in CONTENTS}
+    
+    def append(content, row, img_file):
+        if writers[content].append(row):
+            filenames[content].append(img_file.name)
+        else:
+            print(f"⚠️ {img_file.name}: taille {row.shape} différente des autres images, ignorée")
     
-    # Traiter directement les fichiers .jpg
-    for img_file in morpho_folder.glob("*.jpg"):
-        img = cv2.imread(str(img_file))
-        if img is not None:
+    try:
+        for img_file in img_files:
+            img = cv2.imread(str(img_file))
+            if img is None:
+                continue
             rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb)
             
-            if results.pose_landmarks:
-                # Extraire les coordonnées des landmarks
-                landmarks = []
-                for lm in results.pose_landmarks.landmark:
-                    landmarks.extend([lm.x, lm.y, lm.z, lm.visibility])
-                
-                data['landmarks'].append(np.array(landmarks, dtype=np.float32))
-                data['filenames'].append(img_file.name)
-    
-    if not data['landmarks']:
-        return 0
+            if 'images' in contents:
+                append('images', rgb, img_file)
+            
+            if 'landmarks' in contents:
+                landmarks = extract_landmarks(rgb)
+                if landmarks is not None:
+                    append('landmarks', landmarks, img_file)
+    except BaseException:
+        for writer in writers.values():
+            writer.discard()
+        raise
     
-    data['landmarks'] = np.array(data['landmarks'])
-    data['metadata']['total_count'] = len(data['landmarks'])
+    counts = {}
+    for content, writer in writers.items():
+        count = writer.close()
+        array_file = array_path(name, content)
+        if not count:
+            array_file.unlink(missing_ok=True)
+        for fmt in FORMATS:
+            output_file = output_paths(directories[fmt], name, content, fmt)[0]
+            # Ancienne disposition: .npy voisin des métadonnées
+            output_file.with_suffix('.npy').unlink(missing_ok=True)
+            if fmt not in formats:
+                # Les métadonnées d'un format non demandé décriraient un .npy réécrit
+                output_file.unlink(missing_ok=True)
+                continue
+            counts[(fmt, content)] = count
+            # Une sortie d'un run précédent ne doit pas survivre à ce run
+            legacy_path(directories[fmt], name, content, fmt).unlink(missing_ok=True)
+            if not count:
+                output_file.unlink(missing_ok=True)
+                continue
+            save_metadata(fmt, content, name, output_file, array_file, filenames[content],
+                          (count,) + writer.row_shape)
+            unit = " sets" if content == 'landmarks' else ""
+            print(f"✓ {fmt.upper()} {content}: {name} -> {count}{unit}")
+    return counts
+
+def load_converted(path, mmap_mode='r', normalize=None):
+    """
+    Seul lecteur supporté des sorties de pretrait: <nom>_<contenu>.v2.npz / .v2.pkl
+    (voir output_paths), ou les anciens <nom>_<contenu>.npz / .pkl aux tableaux intégrés.
+    Retourne {morphology, filenames, images et/ou landmarks, ...}. Le .npy est mappé
+    en mémoire; les images uint8 sont normalisées en float32 [0, 1] à l'accès
+    (NormalizedImages). normalize=None: comme les anciens fichiers (PKL normalisé,
+    NPZ en uint8)
+    """
+    path = Path(path)
+    if path.suffix == '.npz':
+        with np.load(path) as npz:
+            data = {key: npz[key] for key in npz.files}
+        data['morphology'] = str(data['morphology'])
+        data['filenames'] = data['filenames'].tolist()
+        data['version'] = int(data.get('version', 1))
+    else:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        data.setdefault('version', 1)
+    if normalize is None:
+        normalize = path.suffix == '.pkl'
     
-    with open(output_file, 'wb') as f:
-        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    for content in CONTENTS:
+        array_file = data.pop(f"{content}_file", None)
+        if array_file is None:
+            # Ancien fichier: tableau intégré, déjà dans sa forme d'origine
+            continue
+        array = np.load(path.parent / str(array_file), mmap_mode=mmap_mode)
+        if content == 'images' and normalize:
+            array = NormalizedImages(array)
+        data[content] = array
+    return data
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Conversion des images et landmarks en NPZ / PKL")
+    parser.add_argument(
+        '--formats', nargs='+', choices=FORMATS, default=list(FORMATS),
+        help="Formats produits (défaut: npz pkl)"
+    )
+    parser.add_argument(
+        '--contents', nargs='+', choices=CONTENTS, default=list(CONTENTS),
+        help="Contenus produits; sans landmarks MediaPipe n'est pas lancé (défaut: images landmarks)"
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Conversion des images et landmarks de chaque morphologie en NPZ et/ou PKL"""
+    args = parse_args(argv)
+    formats = set(args.formats)
+    contents = set(args.contents)
     
-    print(f"✓ PKL landmarks: {morpho_folder.name} -> {data['metadata']['total_count']}")
-    return data['metadata']['total_count']
+    # Créer les dossiers de sortie (ARRAY_DIR est créé par NpyAppender)
+    for fmt, directory in (('npz', NPZ_DIR), ('pkl', PKL_DIR)):
+        if fmt in formats:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    # Traitement pour chaque morphologie
+    totals = {
+        (fmt, content): 0
+        for content in CONTENTS if content in contents
+        for fmt in FORMATS if fmt in formats
+    }
 
-# Traitement pour chaque morphologie
-total_npz_imgs = total_pkl_imgs = 0
-total_npz_lms = total_pkl_lms = 0
+    print(f"🔄 Conversion ({', '.join(sorted(contents))}) en {' et '.join(fmt.upper() for fmt in FORMATS if fmt in formats)}...")
+    print("="*60)
 
-print("🔄 Conversion des images et landmarks en NPZ et PKL...")
-print("="*60)
+    for morpho_folder in ZOOM_DIR.iterdir():
+        if not morpho_folder.is_dir():
+            continue
+        print(f"\n📁 Traitement: {morpho_folder.name}")
 
-for morpho_folder in ZOOM_DIR.iterdir():
-    if not morpho_folder.is_dir():
-        continue
-    name = morpho_folder.name
-    print(f"\n📁 Traitement: {name}")
-
-    # fichiers de sortie
-    npz_img = NPZ_DIR / f"{name}_images.npz"
-    pkl_img = PKL_DIR / f"{name}_images.pkl"
-    npz_lm  = NPZ_DIR / f"{name}_landmarks.npz"
-    pkl_lm  = PKL_DIR / f"{name}_landmarks.pkl"
-
-    # images
-    total_npz_imgs += images_to_npz(morpho_folder, npz_img)
-    total_pkl_imgs += images_to_pkl(morpho_folder, pkl_img)
-    # landmarks
-    total_npz_lms += landmarks_to_npz(morpho_folder, npz_lm)
-    total_pkl_lms += landmarks_to_pkl(morpho_folder, pkl_lm)
-
-print(f"\n🎉 CONVERSION TERMINÉE!")
-print(f"📊 Total NPZ images: {total_npz_imgs:,}")
-print(f"📊 Total PKL images: {total_pkl_imgs:,}")
-print(f"📊 Total NPZ landmarks: {total_npz_lms:,}")
-print(f"📊 Total PKL landmarks: {total_pkl_lms:,}")
-print(f"📁 NPZ sauvegardés dans: {NPZ_DIR}")
-print(f"📁 PKL sauvegardés dans: {PKL_DIR}")
+        for key, count in convert_morphology(morpho_folder, formats, contents).items():
+            totals[key] += count
+
+    print(f"\n🎉 CONVERSION TERMINÉE!")
+    for (fmt, content), total in totals.items():
+        print(f"📊 Total {fmt.upper()} {content}: {total:,}")
+    if 'npz' in formats:
+        print(f"📁 NPZ sauvegardés dans: {NPZ_DIR}")
+    if 'pkl' in formats:
+        print(f"📁 PKL sauvegardés dans: {PKL_DIR}")
+    print(f"📁 Tableaux .npy dans: {ARRAY_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from .models import Data as MovementRecord
+from .token_blacklist import is_token_blacklisted
 
 
 class MovementRecordSerializer(serializers.ModelSerializer):
@@ -11,4 +14,21 @@ class MovementRecordSerializer(serializers.ModelSerializer):
 class MovementRecordCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = MovementRecord
-        fields = ['user', 'image_data', 'video_url', 'json_data', 'movement_detected']
\ No newline at end of file
+        fields = ['user', 'image_data', 'video_url', 'json_data', 'movement_detected']
+
+
+class BlacklistCheckedTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    TokenRefreshSerializer that refuses refresh tokens present in the shared
+    token_blacklist table, so a logged-out refresh token cannot mint new
+    access tokens.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_token_blacklisted(attrs['refresh'], refresh.get('jti')):
+            raise InvalidToken({
+                'detail': 'Token is blacklisted',
+                'code': 'token_not_valid',
+            })
+        return super().validate(attrs)
@@ -0,0 +1,168 @@
+"""
+Fixed-size .npy shards for zone crops.
+
+A shard set is a directory holding:
+- shard_NNNNN_crops.npy: uint8 crops, shape (n, H, W, 3), in BGR like cv2;
+- shard_NNNNN_landmarks.npy: float32 pose landmarks, shape (n, 33, 4);
+- index.json: the shard list and one metadata dict per sample.
+
+Shards are plain .npy files, so readers open them with
+np.load(mmap_mode='r'). That avoids one inode and one JPEG decode per
+crop, and the lossy JPEG round-trip. Writers stage into
+"<dir>.partial" and swap the directory in on close(), so readers of the
+previous set are never disturbed. On Windows a memory-mapped file cannot be
+moved: close the readers of the previous set (and drop the crops read from
+them) before the writer's close().
+"""
+import bisect
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+SHARD_SIZE = 4096
+INDEX_FILE = 'index.json'
+INDEX_VERSION = 1
+LANDMARKS_SHAPE = (33, 4)
+
+
+class ShardWriter:
+    """Appends (crop, landmarks, metadata) samples to fixed-size shards"""
+
+    def __init__(self, directory: Path, crop_shape: Tuple[int, ...],
+                 shard_size: int = SHARD_SIZE, landmarks_shape: Tuple[int, ...] = LANDMARKS_SHAPE):
+        self.directory = Path(directory)
+        self.staging = self.directory.with_name(self.directory.name + '.partial')
+        self.crop_shape = tuple(crop_shape)
+        self.landmarks_shape = tuple(landmarks_shape)
+        self.shard_size = shard_size
+        self.shards = []
+        self.samples = []
+
+        self._crops = np.empty((shard_size,) + self.crop_shape, dtype=np.uint8)
+        self._landmarks = np.empty((shard_size,) + self.landmarks_shape, dtype=np.float32)
+        self._count = 0
+
+        shutil.rmtree(self.staging, ignore_errors=True)
+        self.staging.mkdir(parents=True)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            shutil.rmtree(self.staging, ignore_errors=True)
+
+    def append(self, crop: np.ndarray, landmarks: Optional[np.ndarray] = None, **metadata):
+        """Add one sample; missing landmarks are stored as NaN"""
+        self._crops[self._count] = crop
+        if landmarks is None:
+            self._landmarks[self._count] = np.nan
+        else:
+            self._landmarks[self._count] = landmarks
+        self.samples.append(metadata)
+        self._count += 1
+        if self._count == self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if not self._count:
+            return
+        number = len(self.shards)
+        crops_file = f"shard_{number:05d}_crops.npy"
+        landmarks_file = f"shard_{number:05d}_landmarks.npy"
+        np.save(self.staging / crops_file, self._crops[:self._count])
+        np.save(self.staging / landmarks_file, self._landmarks[:self._count])
+        self.shards.append({'crops': crops_file, 'landmarks': landmarks_file, 'count': self._count})
+        self._count = 0
+
+    def close(self):
+        """Write the last shard and the index, then publish the directory"""
+        self.flush()
+        index = {
+            'version': INDEX_VERSION,
+            'shard_size': self.shard_size,
+            'crop_shape': list(self.crop_shape),
+            'landmarks_shape': list(self.landmarks_shape),
+            'count': len(self.samples),
+            'shards': self.shards,
+            'samples': self.samples,
+        }
+        with open(self.staging / INDEX_FILE, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+
+        previous = self.directory.with_name(self.directory.name + '.old')
+        # A leftover of an interrupted publish; failing here keeps the current set
+        if previous.exists():
+            shutil.rmtree(previous)
+        if self.directory.exists():
+            os.replace(self.directory, previous)
+        try:
+            os.replace(self.staging, self.directory)
+        except OSError:
+            if previous.exists():
+                os.replace(previous, self.directory)
+            raise
+        if previous.exists():
+            shutil.rmtree(previous)
+
+
+class ShardReader:
+    """Random access over a shard set, memory-mapped by default"""
+
+    def __init__(self, directory: Path, mmap_mode: Optional[str] = 'r'):
+        self.directory = Path(directory)
+        with open(self.directory / INDEX_FILE, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported shard index version in {self.directory}")
+
+        self.crop_shape = tuple(index['crop_shape'])
+        self.samples = index['samples']
+        self.crops = [np.load(self.directory / shard['crops'], mmap_mode=mmap_mode) for shard in index['shards']]
+        self.landmarks = [np.load(self.directory / shard['landmarks'], mmap_mode=mmap_mode) for shard in index['shards']]
+        self.offsets = [0]
+        for shard in index['shards']:
+            self.offsets.append(self.offsets[-1] + shard['count'])
+
+    def close(self):
+        """
+        Drop the shard arrays. A shard file is unmapped as soon as no array
+        returned by __getitem__ still refers to it, so release those too
+        before a writer replaces the directory (Windows).
+        """
+        self.crops, self.landmarks = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (Path(directory) / INDEX_FILE).exists()
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def locate(self, i: int) -> Tuple[int, int]:
+        """(shard number, row in shard) of sample i"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        shard = bisect.bisect_right(self.offsets, i) - 1
+        return shard, i - self.offsets[shard]
+
+    def __getitem__(self, i: int) -> Tuple[np.ndarray, np.ndarray, Dict]:
+        shard, row = self.locate(i)
+        return self.crops[shard][row], self.landmarks[shard][row], self.samples[i]
@@ -1,2 +1,13 @@
-# Empty signals file - no signals currently needed
-# The project uses a custom Users model instead of Django's built-in User with UserProfile
\ No newline at end of file
+# Signal handlers of the bodyanalytics app
+# The project uses a custom Users model instead of Django's built-in User with UserProfile
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import TokenBlacklist
+from .token_blacklist import get_blacklist_cache
+
+
+@receiver(post_save, sender=TokenBlacklist)
+def add_to_blacklist_filter(sender, instance, **kwargs):
+    """Tokens blacklisted through Django (admin) are rejected before the next filter refresh"""
+    get_blacklist_cache().add(instance.token)
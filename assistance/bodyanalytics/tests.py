@@ -1,3 +1,1157 @@
-from django.test import TestCase
+"""
+Tests of the bodyanalytics helpers.
 
-# Create your tests here.
+Run with the SQLite primary/replica stand-ins:
+    python manage.py test bodyanalytics --settings=assistance.test_settings
+"""
+import base64
+import json
+import os
+import tempfile
+import threading
+import unittest
+import weakref
+from concurrent.futures import Future
+from datetime import timedelta
+from importlib.util import find_spec
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .async_views import AsyncUploadMovementDataView
+from . import file_fingerprint
+from .db_routers import PrimaryReplicaRouter, get_replica_alias, is_reading_from_replica, read_from_replica
+from .image_storage import decode_data_uri, resolve_image_reference, storage_owner, store_image_data
+from .landmark_cache import LandmarkCache
+from .landmark_features import FEATURE_DIM, body_frame, landmark_features, to_image_coordinates
+from .middleware import ReplicaRoutingMiddleware
+from .motion_inference import MicroBatcher, predict_motion
+from .models import Data, TokenBlacklist, Users
+from .npy_arrays import NormalizedImages, NpyAppender
+from .shards import ShardReader, ShardWriter
+from .training_telemetry import StepTelemetry, load_telemetry, plot_telemetry, smooth, summarize
+from .token_blacklist import BloomFilter, TokenBlacklistCache, blacklist_retention
+
+
+# ============= DATABASE ROUTING =============
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_replica_configured(self):
+        self.assertEqual(get_replica_alias(), 'replica')
+
+    def test_reads_use_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(Data), DEFAULT_DB_ALIAS)
+
+    def test_reads_use_replica_when_marked(self):
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Data), 'replica')
+        self.assertFalse(is_reading_from_replica())
+
+    def test_writes_always_use_primary(self):
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_write(Data), DEFAULT_DB_ALIAS)
+
+    def test_replica_is_never_migrated(self):
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'bodyanalytics'))
+        self.assertFalse(self.router.allow_migrate('replica', 'bodyanalytics'))
+
+    @override_settings(REPLICA_DATABASE_ALIAS='missing')
+    def test_without_replica_reads_stay_on_primary(self):
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Data), DEFAULT_DB_ALIAS)
+        self.assertTrue(self.router.allow_migrate('replica', 'bodyanalytics'))
+
+
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = []
+
+        def get_response(request):
+            self.seen.append(is_reading_from_replica())
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        self.middleware = ReplicaRoutingMiddleware(get_response)
+
+    def test_read_view_get_uses_replica(self):
+        self.middleware(self.factory.get('/ai/movement-records/'))
+        self.assertEqual(self.seen, [True])
+        self.assertFalse(is_reading_from_replica())
+
+    def test_other_views_and_writes_use_primary(self):
+        self.middleware(self.factory.get('/ai/ev-faq/'))
+        self.middleware(self.factory.post('/ai/movement-records/'))
+        self.middleware(self.factory.get('/ai/unknown/'))
+        self.assertEqual(self.seen, [False, False, False])
+
+    def test_successful_write_pins_client_to_primary(self):
+        response = self.middleware(self.factory.post('/ai/movement-records/'))
+        cookie = response.cookies[self.middleware.pin_cookie]
+        self.assertEqual(cookie['max-age'], self.middleware.pin_seconds)
+
+        request = self.factory.get('/ai/movement-records/')
+        request.COOKIES[self.middleware.pin_cookie] = cookie.value
+        self.middleware(request)
+        self.assertEqual(self.seen, [False, False])
+
+    def test_pin_cookie_is_sent_cross_site(self):
+        request = self.factory.post('/ai/movement-records/', HTTP_ORIGIN='http://localhost:4200')
+        cookie = self.middleware(request).cookies[self.middleware.pin_cookie]
+        # A SameSite=Lax cookie would be dropped on the Angular app's cross-site XHRs
+        self.assertEqual(cookie['samesite'], 'None')
+        self.assertTrue(cookie['secure'])
+        self.assertTrue(cookie['httponly'])
+
+    def test_failed_write_does_not_pin(self):
+        middleware = ReplicaRoutingMiddleware(lambda request: HttpResponse(status=400))
+        response = middleware(self.factory.post('/ai/movement-records/'))
+        self.assertNotIn(middleware.pin_cookie, response.cookies)
+
+
+class ReplicaRoutingRequestTests(TestCase):
+    databases = {DEFAULT_DB_ALIAS, 'replica'}
+
+    def request_aliases(self, path, **extra):
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            response = self.client.get(path, **extra)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_list_view_reads_from_replica(self):
+        primary, replica = self.request_aliases('/ai/movement-records/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_pinned_client_reads_from_primary(self):
+        self.client.cookies[ReplicaRoutingMiddleware(None).pin_cookie] = '1'
+        primary, replica = self.request_aliases('/ai/movement-records/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+
+    def test_pinned_cross_origin_client_reads_from_primary(self):
+        # The Angular app (CORS_ALLOWED_ORIGINS) sends its cookies with credentials
+        origin = {'HTTP_ORIGIN': 'http://localhost:4200'}
+        self.client.cookies[ReplicaRoutingMiddleware(None).pin_cookie] = '1'
+        response = self.client.options(
+            '/ai/movement-records/', HTTP_ACCESS_CONTROL_REQUEST_METHOD='GET', **origin
+        )
+        self.assertEqual(response['Access-Control-Allow-Credentials'], 'true')
+        primary, replica = self.request_aliases('/ai/movement-records/', **origin)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+# ============= IMAGE STORAGE =============
+
+class StorageOwnerTests(SimpleTestCase):
+    def test_user_ids(self):
+        self.assertEqual(storage_owner(12), '12')
+        self.assertEqual(storage_owner('12'), '12')
+        self.assertEqual(storage_owner(None), 'anonymous')
+
+    def test_path_components_cannot_escape(self):
+        for user_id in ('../x', '..', 'a/b', 'a\\b', '/etc'):
+            owner = storage_owner(user_id)
+            self.assertNotIn('/', owner)
+            self.assertNotIn('\\', owner)
+            self.assertNotIn('..', owner)
+
+
+JPEG_DATA_URI = 'data:image/jpeg;base64,' + base64.b64encode(b'\xff\xd8 frame \xff\xd9').decode()
+
+
+class ImageStorageTests(SimpleTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        storage_settings = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+
+    def test_decode_rejects_malformed_base64(self):
+        self.assertEqual(decode_data_uri(JPEG_DATA_URI), (b'\xff\xd8 frame \xff\xd9', 'jpg'))
+        for payload in ('abc', 'ab!d', 'YWJj ZA==', '=YWJj', ''):
+            with self.assertRaises(ValueError):
+                decode_data_uri('data:image/png;base64,' + payload)
+
+    def test_store_and_resolve(self):
+        reference = store_image_data(JPEG_DATA_URI, '../7')
+        self.assertTrue(reference.startswith('/media/movement_frames/7/'))
+        self.assertTrue(reference.endswith('.jpg'))
+        path = resolve_image_reference(reference)
+        self.assertEqual(os.path.dirname(path), os.path.join(self.media_root, 'movement_frames', '7'))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'\xff\xd8 frame \xff\xd9')
+
+    def test_references_are_left_unchanged(self):
+        for value in (None, '', '/media/movement_frames/1/a.jpg', 'https://cdn.example.com/a.jpg'):
+            self.assertEqual(store_image_data(value, 1), value)
+        self.assertIsNone(resolve_image_reference(JPEG_DATA_URI))
+        self.assertIsNone(resolve_image_reference(None))
+        self.assertEqual(resolve_image_reference('/srv/frames/a.jpg'), '/srv/frames/a.jpg')
+
+
+class InlineImageDataTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage_settings = override_settings(MEDIA_ROOT=media.name, MEDIA_URL='/media/')
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.user = Users.objects.create(
+            account_non_expired=True, account_non_locked=True, credentials_non_expired=True, enabled=True,
+            created_at=timezone.now(), email='frames@example.com', firstname='A', lastname='B', password='x',
+        )
+
+    def record(self, image_data):
+        now = timezone.now()
+        return Data.objects.create(
+            user=self.user, movement_detected=False, created_at=now, timestamp=now, image_data=image_data,
+        )
+
+    def externalize(self, *args):
+        out = StringIO()
+        call_command('externalize_image_data', *args, stdout=out)
+        return out.getvalue()
+
+    def test_create_rejects_malformed_image_data(self):
+        now = timezone.now().isoformat()
+        response = self.client.post(
+            '/ai/movement-records/',
+            {
+                'user': self.user.id, 'movement_detected': False, 'created_at': now, 'timestamp': now,
+                'image_data': 'data:image/jpeg;base64,not base64!',
+            },
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn('image_data', response.json())
+        self.assertFalse(Data.objects.exists())
+
+    def test_externalize_in_batches(self):
+        inline = [self.record(JPEG_DATA_URI) for _ in range(5)]
+        kept = self.record('/media/movement_frames/1/existing.jpg')
+        broken = self.record('data:image/jpeg;base64,@@@@')
+
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            output = self.externalize('--batch-size', '2')
+        self.assertIn('Moved 5 inline images to storage (1 failed)', output)
+        # Keyset pagination: 6 inline rows in batches of 2 plus the empty last page
+        selects = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 4)
+        self.assertTrue(all('"data"."id" >' in sql for sql in selects))
+
+        for record in inline:
+            record.refresh_from_db()
+            self.assertTrue(record.image_data.startswith('/media/movement_frames/%d/' % self.user.id))
+            with open(resolve_image_reference(record.image_data), 'rb') as f:
+                self.assertEqual(f.read(), b'\xff\xd8 frame \xff\xd9')
+        kept.refresh_from_db()
+        self.assertEqual(kept.image_data, '/media/movement_frames/1/existing.jpg')
+        broken.refresh_from_db()
+        self.assertEqual(broken.image_data, 'data:image/jpeg;base64,@@@@')
+
+    def test_externalize_rerun_is_idempotent(self):
+        record = self.record(JPEG_DATA_URI)
+        self.externalize()
+        record.refresh_from_db()
+        reference = record.image_data
+
+        self.assertIn('Moved 0 inline images to storage (0 failed)', self.externalize())
+        record.refresh_from_db()
+        self.assertEqual(record.image_data, reference)
+        self.assertIn('Found 0 records with inline image data', self.externalize('--dry-run'))
+
+    def test_externalize_limit(self):
+        for _ in range(3):
+            self.record(JPEG_DATA_URI)
+        self.assertIn('Moved 2 inline images', self.externalize('--limit', '2', '--batch-size', '1'))
+        self.assertEqual(Data.objects.filter(image_data__startswith='data:').count(), 1)
+
+
+# ============= TOKEN BLACKLIST =============
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        tokens = [f'token-{i}' for i in range(1000)]
+        for token in tokens:
+            bloom.add(token)
+        self.assertEqual(bloom.count, 1000)
+        self.assertTrue(all(token in bloom for token in tokens))
+
+    def test_false_positive_rate_near_target(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'token-{i}')
+        false_positives = sum(f'other-{i}' in bloom for i in range(10_000))
+        self.assertLess(false_positives / 10_000, 0.03)
+
+
+def blacklist(token, age=timedelta(0)):
+    return TokenBlacklist.objects.create(token=token, reason='logout', blacklisted_at=timezone.now() - age)
+
+
+class TokenBlacklistCacheTests(TestCase):
+    def setUp(self):
+        self.cache = TokenBlacklistCache({'EXPECTED_ITEMS': 100, 'REFRESH_SECONDS': 0})
+        blacklist('revoked')
+
+    def test_hits_are_confirmed_misses_cost_no_query(self):
+        self.cache.rebuild()
+        self.assertTrue(self.cache.is_blacklisted('revoked'))
+        self.cache.config.update(REFRESH_SECONDS=60, RECHECK_MISSES=False)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.cache.is_blacklisted('valid', None))
+
+    def test_misses_are_rechecked_against_recent_rows(self):
+        self.cache.rebuild()
+        self.cache.config['REFRESH_SECONDS'] = 60
+        # Blacklisted by the Spring Boot service after the last refresh
+        TokenBlacklist.objects.bulk_create([
+            TokenBlacklist(token='revoked-now', reason='logout', blacklisted_at=timezone.now()),
+        ])
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            self.assertTrue(self.cache.is_blacklisted('revoked-now'))
+            self.assertFalse(self.cache.is_blacklisted('valid'))
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all('"blacklisted_at" >=' in query['sql'] for query in queries.captured_queries))
+
+    def test_saved_rows_are_added_to_the_filter(self):
+        self.cache.rebuild()
+        with mock.patch('bodyanalytics.signals.get_blacklist_cache', return_value=self.cache):
+            blacklist('revoked-in-admin')
+        self.assertIn('revoked-in-admin', self.cache._filter)
+
+    def test_refresh_picks_up_new_rows(self):
+        self.cache.rebuild()
+        blacklist('revoked-later')
+        self.assertTrue(self.cache.is_blacklisted('revoked-later'))
+
+    def test_checks_the_table_until_the_first_filter_is_built(self):
+        self.cache.start_rebuild = lambda: None
+        self.assertTrue(self.cache.is_blacklisted('revoked'))
+        self.assertFalse(self.cache.is_blacklisted('valid'))
+        self.assertIsNone(self.cache._filter)
+
+    def test_disabled_cache_queries_the_table(self):
+        cache = TokenBlacklistCache({'ENABLED': False})
+        self.assertTrue(cache.is_blacklisted('revoked'))
+        self.assertIsNone(cache._filter)
+
+
+class TokenRefreshBlacklistTests(TestCase):
+    def refresh(self, token):
+        return self.client.post('/ai/token/refresh/', {'refresh': str(token)}, content_type='application/json')
+
+    def test_blacklisted_refresh_token_is_refused(self):
+        token = RefreshToken()
+        token['user_id'] = 1
+        self.assertEqual(self.refresh(token).status_code, 200)
+
+        blacklist(str(token))
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+        self.assertNotIn('access', response.json())
+
+
+class TokenBlacklistRebuildTests(TransactionTestCase):
+    def test_periodic_rebuild_runs_off_the_request_thread(self):
+        blacklist('revoked')
+        cache = TokenBlacklistCache({'EXPECTED_ITEMS': 100, 'REFRESH_SECONDS': 0, 'REBUILD_SECONDS': 0})
+        cache.rebuild()
+        previous = cache._filter
+        started = []
+        start_rebuild = cache.start_rebuild
+        cache.start_rebuild = lambda: started.append(start_rebuild())
+
+        self.assertTrue(cache.is_blacklisted('revoked'))
+        self.assertEqual(len(started), 1)
+        started[0].join(timeout=10)
+        self.assertIsNot(cache._filter, previous)
+        self.assertIn('revoked', cache._filter)
+
+    def test_one_rebuild_at_a_time(self):
+        cache = TokenBlacklistCache()
+        cache._rebuilding.set()
+        self.assertIsNone(cache.start_rebuild())
+
+
+class PurgeExpiredTokensTests(TestCase):
+    @override_settings(TOKEN_BLACKLIST_CACHE={'RETENTION_DAYS': 10})
+    def test_retention_from_settings(self):
+        self.assertEqual(blacklist_retention(), timedelta(days=10))
+        blacklist('old', age=timedelta(days=11))
+        blacklist('recent', age=timedelta(days=9))
+        call_command('purge_expired_tokens', stdout=StringIO())
+        self.assertEqual(list(TokenBlacklist.objects.values_list('token', flat=True)), ['recent'])
+
+    def test_retention_option_overrides_settings(self):
+        blacklist('old', age=timedelta(days=3))
+        call_command('purge_expired_tokens', '--blacklist-retention-days', '2', stdout=StringIO())
+        self.assertFalse(TokenBlacklist.objects.exists())
+
+
+# ============= ASYNC VIEWS =============
+
+class AsyncUploadMovementDataTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = Users.objects.create(
+            account_non_expired=True, account_non_locked=True, credentials_non_expired=True, enabled=True,
+            created_at=timezone.now(), email='upload@example.com', firstname='A', lastname='B', password='x',
+        )
+
+    def post(self, data, content_type):
+        request = self.factory.post('/ai/movements/upload/', data=data, content_type=content_type)
+        return async_to_sync(AsyncUploadMovementDataView.as_view())(request)
+
+    def test_json_body(self):
+        body = {'user': self.user.id, 'label': 'Squat', 'jsonData': {'movement_name': 'squat'}}
+        response = self.post(body, 'application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        record = Data.objects.get(user=self.user)
+        self.assertIn('Squat', record.json_data)
+        self.assertIn('squat', record.json_data)
+
+    def test_form_body(self):
+        request = self.factory.post('/ai/movements/upload/', data={'user': self.user.id, 'label': 'Squat'})
+        response = async_to_sync(AsyncUploadMovementDataView.as_view())(request)
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_json_body_without_user(self):
+        response = self.post({'label': 'Squat'}, 'application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'User ID is required', response.content)
+
+    def test_malformed_json(self):
+        for body in ('{not json', '[1, 2]'):
+            response = self.post(body, 'application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(b'JSON parse error', response.content)
+
+
+# ============= SHARDS =============
+
+class ShardTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name) / 'eyes'
+
+    def write(self, count, value=0, shard_size=3):
+        with ShardWriter(self.directory, (2, 2, 3), shard_size=shard_size) as writer:
+            for i in range(count):
+                landmarks = None if i == 0 else np.full((33, 4), i, dtype=np.float32)
+                writer.append(np.full((2, 2, 3), value + i, dtype=np.uint8), landmarks, source=f'img{i}.jpg')
+
+    def test_round_trip_across_shards(self):
+        self.write(7)
+        reader = ShardReader(self.directory)
+        self.assertEqual(len(reader), 7)
+        self.assertEqual(len(reader.crops), 3)
+        crop, landmarks, sample = reader[4]
+        self.assertEqual(crop[0, 0, 0], 4)
+        self.assertEqual(landmarks[0, 0], 4)
+        self.assertEqual(sample, {'source': 'img4.jpg'})
+        self.assertTrue(np.isnan(reader[0][1]).all())
+        self.assertEqual(reader.locate(-1), (2, 0))
+        with self.assertRaises(IndexError):
+            reader[7]
+        reader.close()
+
+    def test_close_replaces_the_previous_set(self):
+        self.write(2)
+        with ShardReader(self.directory) as reader:
+            self.assertEqual(len(reader), 2)
+        self.assertEqual(reader.crops, [])
+        self.write(1, value=9)
+        reader = ShardReader(self.directory)
+        self.assertEqual(len(reader), 1)
+        self.assertEqual(reader[0][0][0, 0, 0], 9)
+        reader.close()
+        self.assertFalse(self.directory.with_name('eyes.old').exists())
+        self.assertFalse(self.directory.with_name('eyes.partial').exists())
+
+    def test_close_releases_the_mapped_files(self):
+        self.write(4)
+        reader = ShardReader(self.directory)
+        crop, _, _ = reader[3]
+        shards = [weakref.ref(array) for array in reader.crops + reader.landmarks]
+        reader.close()
+        # The crop still read keeps its own shard mapped, and valid
+        self.assertEqual([ref() is None for ref in shards], [True, False, True, True])
+        self.assertEqual(crop[0, 0, 0], 3)
+        del crop
+        self.assertTrue(all(ref() is None for ref in shards))
+
+    def test_failed_publish_keeps_the_previous_set(self):
+        self.write(2)
+        staging = self.directory.with_name('eyes.partial')
+        real_replace = os.replace
+
+        def replace(src, dst):
+            if Path(src) == staging:
+                raise PermissionError('in use')
+            real_replace(src, dst)
+
+        with mock.patch('bodyanalytics.shards.os.replace', side_effect=replace):
+            with self.assertRaises(PermissionError):
+                self.write(1, value=9)
+        with ShardReader(self.directory) as reader:
+            self.assertEqual(len(reader), 2)
+        self.assertFalse(self.directory.with_name('eyes.old').exists())
+
+    def test_error_while_writing_discards_the_staging(self):
+        with self.assertRaises(RuntimeError):
+            with ShardWriter(self.directory, (2, 2, 3)) as writer:
+                writer.append(np.zeros((2, 2, 3), dtype=np.uint8))
+                raise RuntimeError
+        self.assertFalse(ShardReader.exists(self.directory))
+        self.assertFalse(self.directory.with_name('eyes.partial').exists())
+
+
+# ============= REDUCED DECODE (image_decode.py) =============
+
+@unittest.skipUnless(find_spec('cv2'), 'image_decode needs OpenCV')
+class ImreadMaxSideTests(SimpleTestCase):
+    def setUp(self):
+        import cv2
+        from .image_decode import imread_max_side, read_jpeg_size
+
+        self.cv2 = cv2
+        self.imread_max_side = imread_max_side
+        self.read_jpeg_size = read_jpeg_size
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+
+    def jpeg(self, width, height):
+        path = self.directory / f'{width}x{height}.jpg'
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        img = np.stack(np.broadcast_arrays((x + y) / 2, x + 0 * y, y + 0 * x), axis=-1).astype(np.uint8)
+        self.assertTrue(self.cv2.imwrite(str(path), img))
+        return path
+
+    def test_full_strategy_is_cv2_imread(self):
+        from .datatraitement import MAX_IMAGE_SIDE, AdvancedImageProcessor
+
+        processor = AdvancedImageProcessor(decode_strategy='full')
+        for width, height in ((4000, 3000), (640, 480)):
+            path = self.jpeg(width, height)
+            expected = self.cv2.imread(str(path))
+            img = processor.load_image(path)
+            self.assertEqual(img.shape, expected.shape)
+            self.assertEqual(img.tobytes(), expected.tobytes())
+        # No reduction applies to images at most twice MAX_IMAGE_SIDE: same bytes as cv2.imread
+        path = self.jpeg(2 * MAX_IMAGE_SIDE - 1, MAX_IMAGE_SIDE)
+        self.assertEqual(self.imread_max_side(path, MAX_IMAGE_SIDE).tobytes(), self.cv2.imread(str(path)).tobytes())
+
+    def test_reduced_keeps_long_side_above_max_side(self):
+        from .datatraitement import MAX_IMAGE_SIDE, AdvancedImageProcessor
+
+        processor = AdvancedImageProcessor(decode_strategy='reduced')
+        for width, height, factor in ((6400, 4000, 8), (4000, 3000, 4), (1700, 900, 2), (1000, 1500, 1), (600, 400, 1)):
+            path = self.jpeg(width, height)
+            self.assertEqual(self.read_jpeg_size(path), (height, width))
+            img = processor.load_image(path)
+            self.assertEqual(img.shape[:2], (-(-height // factor), -(-width // factor)))
+            self.assertGreaterEqual(max(img.shape[:2]), min(MAX_IMAGE_SIDE, max(width, height)))
+
+    def test_non_jpeg_is_decoded_normally(self):
+        path = self.directory / 'frame.png'
+        self.cv2.imwrite(str(path), np.full((2000, 1000, 3), 7, np.uint8))
+        self.assertIsNone(self.read_jpeg_size(path))
+        self.assertEqual(self.imread_max_side(path, 800).shape, (2000, 1000, 3))
+
+# ============= PROCESSING MANIFEST (datatraitement.py) =============
+
+@unittest.skipUnless(find_spec('cv2'), 'datatraitement needs OpenCV')
+class ProcessingManifestTests(SimpleTestCase):
+    def setUp(self):
+        from .datatraitement import ProcessingManifest
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.image = self.tmp / 'img_001.jpg'
+        self.image.write_bytes(b'jpeg')
+        self.output = self.tmp / 'eyes_img_001.jpg'
+        self.output.write_bytes(b'crop')
+        self.units = [('M', [self.image])]
+        self.manifest_class = ProcessingManifest
+
+        manifest = ProcessingManifest(self.tmp / 'manifest.json')
+        self.assertEqual(manifest.select_pending(self.units), {self.image})
+        manifest.record(self.image, 'M', {'total': 1}, [str(self.output)], [self.image], [('eyes', 'eyes_img_001.jpg')])
+        manifest.save()
+
+    def pending(self, shard_samples=None):
+        manifest = self.manifest_class(self.tmp / 'manifest.json')
+        return manifest.select_pending(self.units, shard_samples=shard_samples)
+
+    def test_unchanged_image_is_skipped(self):
+        self.assertEqual(self.pending(), set())
+        os.utime(self.image, ns=(0, 0))
+        self.assertEqual(self.pending(), set())
+
+    def test_changed_image_is_pending(self):
+        self.image.write_bytes(b'other jpeg')
+        self.assertEqual(self.pending(), {self.image})
+
+    def test_missing_output_is_pending(self):
+        self.output.unlink()
+        self.assertEqual(self.pending(), {self.image})
+
+    def test_decode_strategy_round_trip(self):
+        manifest = self.manifest_class(self.tmp / 'manifest.json')
+        manifest.decode_strategy = 'reduced'
+        manifest.save()
+        self.assertEqual(self.manifest_class(self.tmp / 'manifest.json').decode_strategy, 'reduced')
+
+        # Manifests written before --decode-strategy: full decoding
+        data = json.loads((self.tmp / 'manifest.json').read_text())
+        del data['decode_strategy']
+        (self.tmp / 'manifest.json').write_text(json.dumps(data))
+        self.assertEqual(self.manifest_class(self.tmp / 'manifest.json').decode_strategy, 'full')
+
+    def test_shard_samples_are_checked(self):
+        key = ('eyes', str(self.image), 'eyes_img_001.jpg')
+        self.assertEqual(self.pending(shard_samples={key}), set())
+        self.assertEqual(self.pending(shard_samples=set()), {self.image})
+
+
+@unittest.skipUnless(find_spec('cv2'), 'datatraitement needs OpenCV')
+class BatchedExtractionTests(SimpleTestCase):
+    def setUp(self):
+        from . import datatraitement
+
+        self.dt = datatraitement
+        self.events = []
+        self.processor = datatraitement.AdvancedImageProcessor(video_mode='track')
+        detector = self.processor.zone_detector
+        rng = np.random.default_rng(0)
+        self.points = rng.uniform(0.2, 0.8, (datatraitement.NUM_POSE_LANDMARKS, 4))
+
+        def pose_points(image, tracking):
+            self.events.append(('detect', int(image[0, 0, 0]), tracking))
+            return [mock.Mock(x=x, y=y, z=z, visibility=v) for x, y, z, v in self.points]
+
+        detector._pose_points = pose_points
+        detector.reset_tracking = lambda: self.events.append(('reset',))
+
+    def test_landmarks_in_pixels(self):
+        images = [np.zeros((100, 200, 3), np.uint8), np.zeros((50, 40, 3), np.uint8)]
+        detected, landmarks = self.processor.zone_detector.detect_pose_batch(images)
+        self.assertEqual(detected, [0, 1])
+        self.assertEqual(landmarks.shape, (2, 33, 4))
+        self.assertEqual(landmarks.dtype, np.float32)
+        for landmarks_b, (h, w) in zip(landmarks, [(100, 200), (50, 40)]):
+            np.testing.assert_allclose(landmarks_b[:, 0], self.points[:, 0] * w, rtol=1e-6)
+            np.testing.assert_allclose(landmarks_b[:, 1], self.points[:, 1] * h, rtol=1e-6)
+            np.testing.assert_allclose(landmarks_b[:, 2:], self.points[:, 2:], rtol=1e-6)
+
+    def test_face_zone_boxes_use_pose_landmarks(self):
+        landmarks = np.zeros((1, 33, 4), np.float32)
+        landmarks[0, :, :2] = [300, 400]
+        landmarks[0, :, 3] = 1
+        # Eyes (1-6) and mouth corners (9, 10) of MediaPipe Pose
+        landmarks[0, 1:7, :2] = [[110, 50], [100, 52], [90, 50], [130, 50], [140, 52], [150, 50]]
+        landmarks[0, 9:11, :2] = [[112, 80], [128, 82]]
+        boxes, valid = self.dt.compute_zone_boxes(landmarks, np.array([[480, 640]]))
+        zones = dict(zip(self.dt.ZONE_NAMES, zip(boxes[0].tolist(), valid[0])))
+        self.assertEqual(zones['eyes'], ([70, 170, 35, 67], True))
+        self.assertEqual(zones['mouth'], ([97, 143, 70, 92], True))
+
+    def test_batch_keeps_image_order(self):
+        items = [
+            (self.dt.STATIC_IMAGES_DIR / 'M' / 'img_001.jpg', 'M', np.full((60, 60, 3), 0, np.uint8)),
+            (self.dt.STATIC_IMAGES_DIR / 'M' / 'img_002.jpg', 'M', None),
+            (self.dt.STATIC_IMAGES_DIR / 'M' / 'img_003.jpg', 'M', np.full((60, 60, 3), 2, np.uint8)),
+        ]
+        results = self.processor.extract_batch(items)
+        self.assertEqual(self.events, [('detect', 0, False), ('detect', 2, False)])
+        self.assertEqual([result['stats']['failed'] for result in results], [0, 1, 0])
+        self.assertEqual(results[2]['stats']['full_body'], 1)
+
+    def test_tracking_state_per_image(self):
+        frames = self.dt.VIDEO_FRAMES_DIR / 'M' / 'frames'
+        items = [
+            (self.dt.STATIC_IMAGES_DIR / 'M' / 'img_001.jpg', 'M', np.full((60, 60, 3), 0, np.uint8)),
+            (frames / 'clipa_001.jpg', 'M', np.full((60, 60, 3), 1, np.uint8)),
+            (frames / 'clipa_002.jpg', 'M', np.full((60, 60, 3), 2, np.uint8)),
+            (frames / 'clipb_001.jpg', 'M', None),
+            (frames / 'clipb_002.jpg', 'M', np.full((60, 60, 3), 4, np.uint8)),
+        ]
+        results = self.processor.extract_batch(items)
+        self.assertEqual(self.events, [
+            ('detect', 0, False),
+            ('reset',), ('detect', 1, True),
+            ('detect', 2, True),
+            ('reset',), ('detect', 4, True),
+        ])
+        self.assertEqual([result['stats']['failed'] for result in results], [0, 0, 0, 1, 0])
+        self.assertEqual(self.processor.tracked_segments, 2)
+
+    def test_worker_returns_stage_totals_and_segments(self):
+        frames = self.dt.VIDEO_FRAMES_DIR / 'M' / 'frames'
+        units = [('M', [frames / 'clipa_001.jpg', frames / 'clipa_002.jpg']), ('M', [frames / 'clipb_001.jpg'])]
+        self.processor.read_image = lambda img_file: np.full((60, 60, 3), int(img_file.stem[-1]), np.uint8)
+        with mock.patch.multiple(self.dt, _worker_processor=self.processor, _worker_output_format='shards'):
+            per_unit, stage_totals, segments = self.dt._process_units(units)
+
+        self.assertEqual([len(results) for results in per_unit], [2, 1])
+        self.assertEqual({name: totals[0] for name, totals in stage_totals.items()},
+                         {'decode': 3, 'inference': 3, 'write': 0})
+        # Summed over the workers by the parent, like the sequential run's tracked_segments
+        self.assertEqual(segments, 2)
+
+
+# ============= NPY OUTPUTS (npy_arrays.py, pretrait.py) =============
+
+class NpyAppenderTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'rows.npy'
+
+    def test_trimmed_to_written_rows(self):
+        with NpyAppender(self.path, capacity=10, dtype=np.float32) as appender:
+            for i in range(3):
+                self.assertTrue(appender.append(np.full(4, i)))
+            self.assertFalse(appender.append(np.zeros(5)))
+        array = np.load(self.path)
+        self.assertEqual(array.shape, (3, 4))
+        self.assertEqual(array.dtype, np.float32)
+        np.testing.assert_array_equal(array[:, 0], [0, 1, 2])
+        self.assertEqual(list(self.path.parent.iterdir()), [self.path])
+
+    def test_full_capacity(self):
+        appender = NpyAppender(self.path, capacity=2, row_shape=(2, 2))
+        appender.append(np.ones((2, 2)))
+        appender.append(np.ones((2, 2)))
+        with self.assertRaises(IndexError):
+            appender.append(np.ones((2, 2)))
+        self.assertEqual(appender.close(), 2)
+        self.assertEqual(np.load(self.path).shape, (2, 2, 2))
+
+    def test_no_rows_no_file(self):
+        self.assertEqual(NpyAppender(self.path, capacity=4).close(), 0)
+        self.assertFalse(self.path.exists())
+
+    def test_error_discards_partial_file(self):
+        with self.assertRaises(RuntimeError):
+            with NpyAppender(self.path, capacity=4) as appender:
+                appender.append(np.ones(3))
+                raise RuntimeError
+        self.assertEqual(list(self.path.parent.iterdir()), [])
+
+    def test_truncated_partial_file_raises(self):
+        appender = NpyAppender(self.path, capacity=4, dtype=np.float32)
+        appender.append(np.ones(3))
+        appender.append(np.ones(3))
+        appender._file.flush()
+        os.truncate(appender.partial, appender._offset + 12)
+        with self.assertRaises(OSError):
+            appender.close()
+        self.assertEqual(list(self.path.parent.iterdir()), [])
+
+    def test_normalized_images(self):
+        images = NormalizedImages(np.array([[0, 255]], dtype=np.uint8))
+        self.assertEqual(images.dtype, np.float32)
+        np.testing.assert_array_equal(images[0], [0.0, 1.0])
+        np.testing.assert_array_equal(np.asarray(images), [[0.0, 1.0]])
+
+
+@unittest.skipUnless(find_spec('cv2'), 'pretrait needs OpenCV')
+class PretraitOutputTests(SimpleTestCase):
+    def setUp(self):
+        import cv2
+        from . import pretrait
+
+        self.pretrait = pretrait
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.morpho = self.tmp / 'zoom' / 'M'
+        self.morpho.mkdir(parents=True)
+        for i in range(3):
+            cv2.imwrite(str(self.morpho / f'img_{i}.jpg'), np.full((8, 8, 3), 40 * i, dtype=np.uint8))
+        for name in ('NPZ_DIR', 'PKL_DIR', 'ARRAY_DIR'):
+            directory = self.tmp / name.lower()
+            directory.mkdir()
+            patcher = mock.patch.object(pretrait, name, directory)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def convert(self):
+        return self.pretrait.convert_morphology(self.morpho, {'npz', 'pkl'}, {'images'})
+
+    def test_round_trip_and_legacy_outputs_removed(self):
+        legacy = self.pretrait.legacy_path(self.pretrait.NPZ_DIR, 'M', 'images', 'npz')
+        legacy.write_bytes(b'old')
+        self.assertEqual(self.convert(), {('npz', 'images'): 3, ('pkl', 'images'): 3})
+        self.assertFalse(legacy.exists())
+
+        for fmt, directory in (('npz', self.pretrait.NPZ_DIR), ('pkl', self.pretrait.PKL_DIR)):
+            metadata_file, _ = self.pretrait.output_paths(directory, 'M', 'images', fmt)
+            data = self.pretrait.load_converted(metadata_file)
+            self.assertEqual(data['version'], self.pretrait.OUTPUT_VERSION)
+            self.assertEqual(sorted(data['filenames']), ['img_0.jpg', 'img_1.jpg', 'img_2.jpg'])
+            self.assertEqual(data['images'].shape, (3, 8, 8, 3))
+            self.assertEqual(data['images'].dtype, np.float32 if fmt == 'pkl' else np.uint8)
+
+    def test_formats_share_one_array_per_content(self):
+        # Previous layout: .npy next to the metadata file
+        neighbour = self.pretrait.NPZ_DIR / 'M_images.v2.npy'
+        neighbour.write_bytes(b'old')
+        self.convert()
+        self.assertFalse(neighbour.exists())
+        self.assertEqual([p.name for p in self.pretrait.ARRAY_DIR.iterdir()], ['M_images.v2.npy'])
+        npz = self.pretrait.load_converted(self.pretrait.NPZ_DIR / 'M_images.v2.npz')
+        pkl = self.pretrait.load_converted(self.pretrait.PKL_DIR / 'M_images.v2.pkl', normalize=False)
+        self.assertEqual(Path(npz['images'].filename).resolve(), Path(pkl['images'].filename).resolve())
+
+    def test_unselected_format_metadata_removed(self):
+        self.convert()
+        self.assertEqual(self.pretrait.convert_morphology(self.morpho, {'npz'}, {'images'}),
+                         {('npz', 'images'): 3})
+        self.assertEqual(list(self.pretrait.PKL_DIR.iterdir()), [])
+
+    def test_empty_run_removes_stale_outputs(self):
+        self.convert()
+        for img_file in self.morpho.iterdir():
+            img_file.unlink()
+        self.assertEqual(self.convert(), {('npz', 'images'): 0, ('pkl', 'images'): 0})
+        self.assertEqual(list(self.pretrait.NPZ_DIR.iterdir()), [])
+        self.assertEqual(list(self.pretrait.PKL_DIR.iterdir()), [])
+        self.assertEqual(list(self.pretrait.ARRAY_DIR.iterdir()), [])
+
+    def test_legacy_files_stay_readable(self):
+        legacy = self.pretrait.legacy_path(self.pretrait.NPZ_DIR, 'M', 'images', 'npz')
+        images = np.zeros((2, 8, 8, 3), dtype=np.uint8)
+        np.savez_compressed(legacy, images=images, filenames=np.array(['a.jpg', 'b.jpg']),
+                            shape=images.shape, morphology='M')
+        data = self.pretrait.load_converted(legacy)
+        self.assertEqual(data['version'], 1)
+        self.assertEqual(data['morphology'], 'M')
+        np.testing.assert_array_equal(data['images'], images)
+
+
+# ============= MOTION INFERENCE =============
+
+class FakeMotionModel:
+    seq_len = 4
+    features = 0
+    landmark_indices = []
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def predict(self, text_seqs, pose_seqs):
+        self.calls.append(len(text_seqs))
+        if self.fail:
+            raise RuntimeError('model failed')
+        # Row b: its text, so each caller can check it got its own rows back
+        return np.repeat(text_seqs[:, :, None], 4, axis=2).astype(np.float32)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def submit_together(self, batcher, shapes):
+        """Submit one request per pose shape while the batcher is busy, return their futures"""
+        busy, gate = threading.Event(), threading.Event()
+        model = batcher.get_model()
+        predict = model.predict
+
+        def blocking_predict(*args):
+            busy.set()
+            gate.wait(5)
+            return predict(*args)
+
+        model.predict = blocking_predict
+        first = batcher.submit(np.zeros(4, dtype=np.int64), np.zeros((4, 2, 4), np.float32))
+        self.assertTrue(busy.wait(5))
+        futures = [
+            batcher.submit(np.full(4, i + 1, dtype=np.int64), np.zeros(shape, np.float32))
+            for i, shape in enumerate(shapes)
+        ]
+        gate.set()
+        first.result(timeout=5)
+        return futures
+
+    def test_concurrent_requests_share_a_batch(self):
+        loads = []
+        batcher = MicroBatcher('hands', lambda: loads.append(1) or FakeMotionModel(), max_batch_size=8)
+        futures = self.submit_together(batcher, [(4, 2, 4)] * 5)
+        for i, future in enumerate(futures):
+            prediction, batch_size = future.result(timeout=5)
+            self.assertEqual(batch_size, 5)
+            self.assertTrue((prediction == i + 1).all())
+        self.assertEqual(batcher.model.calls, [1, 5])
+        self.assertEqual(loads, [1])
+
+    def test_batches_are_capped_and_split_by_shape(self):
+        batcher = MicroBatcher('hands', FakeMotionModel, max_batch_size=3)
+        futures = self.submit_together(batcher, [(4, 2, 4), (4, 3, 4), (4, 2, 4), (4, 2, 4)])
+        sizes = [future.result(timeout=5)[1] for future in futures]
+        self.assertEqual(sizes, [2, 1, 2, 1])
+
+    def test_model_errors_reach_every_caller(self):
+        batcher = MicroBatcher('hands', lambda: FakeMotionModel(fail=True))
+        future = batcher.submit(np.zeros(4, dtype=np.int64), np.zeros((4, 2, 4), np.float32))
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=5)
+
+
+class PredictMotionTests(SimpleTestCase):
+    def setUp(self):
+        self.model = FakeMotionModel()
+        self.model.features = 1
+        self.model.landmark_indices = [15, 16]
+        self.batcher = mock.Mock(get_model=lambda: self.model)
+        patcher = mock.patch('bodyanalytics.motion_inference.get_batcher', return_value=self.batcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def predict(self, poses, prediction):
+        future = Future()
+        future.set_result((prediction, 1))
+        self.batcher.submit.return_value = future
+        return predict_motion('hands', 'hi', poses)[0]
+
+    def test_prediction_mapped_with_the_predicted_frame(self):
+        rng = np.random.default_rng(0)
+        poses = rng.uniform(0.2, 0.8, (4, 33, 4)).astype(np.float32)
+        # The person moves between frames: each frame has its own body frame
+        poses[..., 0] += np.arange(4, dtype=np.float32)[:, None]
+        prediction = np.zeros((4, 4), np.float32)
+        prediction[:, :3] = [0.5, -0.25, 0.0]
+
+        mapped = self.predict(poses, prediction)
+        origin, scale = body_frame(poses)
+        target = [1, 2, 3, 3]
+        np.testing.assert_allclose(mapped[:, :3], prediction[:, :3] * scale[target] + origin[target], rtol=1e-5)
+
+        text_seq, model_input = self.batcher.submit.call_args.args
+        self.assertEqual(model_input.shape, (4, 2, 8))
+
+    def test_feature_models_need_full_poses(self):
+        with self.assertRaises(ValueError):
+            self.predict(np.zeros((4, 8, 4), np.float32), np.zeros((4, 4), np.float32))
+
+
+# ============= FILE FINGERPRINTS =============
+
+class FileFingerprintTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'img.jpg'
+        self.path.write_bytes(b'pixels')
+
+    def test_known_entry_is_not_rehashed(self):
+        known = file_fingerprint.file_fingerprint(self.path)
+        with mock.patch.object(file_fingerprint, 'file_hash') as file_hash:
+            self.assertEqual(file_fingerprint.file_fingerprint(self.path, known), known)
+        file_hash.assert_not_called()
+
+    def test_touched_file_is_rehashed_to_the_same_hash(self):
+        known = file_fingerprint.file_fingerprint(self.path)
+        os.utime(self.path, ns=(known['mtime_ns'] + 10**9,) * 2)
+        fingerprint = file_fingerprint.file_fingerprint(self.path, known)
+        self.assertNotEqual(fingerprint['mtime_ns'], known['mtime_ns'])
+        self.assertEqual(fingerprint['hash'], known['hash'])
+
+        self.path.write_bytes(b'other pixels')
+        self.assertNotEqual(file_fingerprint.file_fingerprint(self.path, fingerprint)['hash'], known['hash'])
+
+
+# ============= LANDMARK CACHE =============
+
+class LandmarkCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.images = self.tmp / 'images'
+        self.images.mkdir()
+        self.paths = []
+        for i in range(3):
+            path = self.images / f'img_{i}.jpg'
+            path.write_bytes(bytes([i]) * 10)
+            self.paths.append(path)
+        self.extracted = []
+
+    def extract(self, path):
+        self.extracted.append(path.name)
+        value = path.read_bytes()[0]
+        # The second image has no pose
+        return None if value == 1 else np.full((33, 4), value, dtype=np.float32)
+
+    def cache(self):
+        return LandmarkCache(self.tmp / 'cache', 'zone', self.extract)
+
+    def test_computed_once_per_content(self):
+        landmarks = self.cache().landmarks(self.paths)
+        self.assertEqual(landmarks.shape, (3, 33, 4))
+        self.assertEqual(landmarks[2, 0, 0], 2)
+        self.assertTrue(np.isnan(landmarks[1]).all())
+        self.assertEqual(self.extracted, ['img_0.jpg', 'img_1.jpg', 'img_2.jpg'])
+
+        cache = self.cache()
+        again = cache.landmarks(self.paths)
+        np.testing.assert_array_equal(again, landmarks)
+        self.assertEqual((cache.hits, cache.misses), (3, 0))
+        self.assertEqual(len(self.extracted), 3)
+
+    def test_renamed_and_reordered_files_keep_their_rows(self):
+        self.cache().landmarks(self.paths)
+        renamed = self.images / 'renamed.jpg'
+        self.paths[0].rename(renamed)
+        landmarks = self.cache().landmarks([self.paths[2], renamed])
+        self.assertEqual(landmarks[0, 0, 0], 2)
+        self.assertEqual(landmarks[1, 0, 0], 0)
+        self.assertEqual(len(self.extracted), 3)
+
+    def test_modified_file_is_recomputed(self):
+        self.cache().landmarks(self.paths)
+        self.paths[0].write_bytes(bytes([5]) * 20)
+        cache = self.cache()
+        landmarks = cache.landmarks(self.paths)
+        self.assertEqual(landmarks[0, 0, 0], 5)
+        self.assertEqual(self.extracted[3:], ['img_0.jpg'])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_derived_arrays_follow_the_landmarks(self):
+        calls = []
+
+        def compute(landmarks):
+            calls.append(1)
+            return np.asarray(landmarks)[..., :1] * 2
+
+        cache = self.cache()
+        cache.landmarks(self.paths)
+        first = cache.derived('double', 1, compute)
+        self.assertEqual(first[2, 0, 0], 4)
+        cache.derived('double', 1, compute)
+        self.assertEqual(len(calls), 1)
+        cache.derived('double', 2, compute)
+        self.assertEqual(len(calls), 2)
+
+        self.paths[2].write_bytes(bytes([3]) * 10)
+        cache = self.cache()
+        cache.landmarks(self.paths)
+        self.assertEqual(cache.derived('double', 2, compute)[2, 0, 0], 6)
+        self.assertEqual(len(calls), 3)
+
+
+# ============= LANDMARK FEATURES =============
+
+def pose(hips=(0.5, 0.6, 0.0), torso=0.2, visibility=0.9):
+    """(33, 4) pose whose hips and shoulders give the requested body frame"""
+    landmarks = np.zeros((33, 4), dtype=np.float32)
+    landmarks[:, :3] = hips
+    landmarks[:, 3] = visibility
+    landmarks[11:13, 1] = hips[1] - torso
+    landmarks[15, :3] = (hips[0] + torso, hips[1], hips[2])
+    return landmarks
+
+
+class LandmarkFeaturesTests(SimpleTestCase):
+    def test_invariant_to_position_and_distance(self):
+        near = pose()
+        far = pose(hips=(0.2, 0.3, 0.1), torso=0.05)
+        features = landmark_features(np.stack([near, far])[:, None])
+        self.assertEqual(features.shape, (2, 1, 33, FEATURE_DIM))
+        np.testing.assert_allclose(features[0, 0, :, :3], features[1, 0, :, :3], atol=1e-5)
+        np.testing.assert_allclose(features[0, 0, 15, :3], [1, 0, 0], atol=1e-5)
+
+    def test_velocity_and_mask(self):
+        frames = np.stack([pose(), pose(), pose(visibility=0.2)])
+        frames[1, 15, 0] += 0.1
+        features = landmark_features(frames)
+        np.testing.assert_array_equal(features[0, :, 4:7], 0)
+        np.testing.assert_allclose(features[1, 15, 4:7], [0.5, 0, 0], atol=1e-5)
+        np.testing.assert_array_equal(features[:2, :, 7], 1)
+        np.testing.assert_array_equal(features[2, :, 7], 0)
+
+    def test_frames_without_pose(self):
+        frames = np.stack([pose(), np.full((33, 4), np.nan, np.float32), pose()])
+        features = landmark_features(frames)
+        self.assertTrue(np.isnan(features[1]).all())
+        # Velocity after a missing frame is unknown: 0
+        np.testing.assert_array_equal(features[2, :, 4:7], 0)
+        self.assertFalse(np.isnan(features[2]).any())
+
+    def test_image_coordinates_invert_the_normalisation(self):
+        frames = np.stack([pose(), pose(hips=(0.2, 0.3, 0.1), torso=0.05)])
+        features = landmark_features(frames)
+        restored = to_image_coordinates(features[:, 15, :4], frames)
+        np.testing.assert_allclose(restored, frames[:, 15], atol=1e-5)
+        origin, scale = body_frame(frames)
+        np.testing.assert_allclose(origin[1], [0.2, 0.3, 0.1], atol=1e-6)
+        np.testing.assert_allclose(scale[1], [0.05], atol=1e-6)
+
+
+# ============= TRAINING TELEMETRY =============
+
+class StepTelemetryTests(SimpleTestCase):
+    def telemetry(self, data_wait):
+        telemetry = StepTelemetry(zone='hands', run='test')
+        for step in range(4):
+            telemetry.record(epoch=step // 2, data_wait=data_wait, forward=0.02, backward=0.03, optimizer=0.01,
+                             step_time=0.08, samples=16, loss=1.0 / (step + 1))
+        return telemetry
+
+    def test_summary(self):
+        summary = self.telemetry(data_wait=0.02).summary()
+        self.assertEqual(summary['steps'], 4)
+        self.assertEqual(summary['samples'], 64)
+        self.assertAlmostEqual(summary['samples_per_sec'], 160, places=3)
+        self.assertAlmostEqual(summary['fractions']['other'], 0.2, places=5)
+        self.assertEqual(summary['bound'], 'compute')
+        self.assertAlmostEqual(summary['final_loss'], 0.25)
+
+    def test_input_bound_run(self):
+        self.assertEqual(self.telemetry(data_wait=0.2).summary()['bound'], 'input')
+        self.assertEqual(summarize(StepTelemetry().arrays()), {'steps': 0})
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.telemetry(data_wait=0.02).save(Path(tmp) / 'runs' / 'hands.npz')
+            metadata, arrays = load_telemetry(path)
+        self.assertEqual(metadata, {'zone': 'hands', 'run': 'test'})
+        np.testing.assert_array_equal(arrays['step'], [0, 1, 2, 3])
+        np.testing.assert_array_equal(arrays['epoch'], [0, 0, 1, 1])
+        np.testing.assert_allclose(arrays['samples_per_sec'], 160, rtol=1e-5)
+
+    def test_smooth(self):
+        np.testing.assert_allclose(smooth(np.array([0.0, 3.0, 0.0, 3.0]), 2), [0, 1.5, 1.5, 1.5])
+        values = np.array([1.0, 2.0])
+        self.assertIs(smooth(values, 1), values)
+
+    @unittest.skipUnless(find_spec('matplotlib'), 'plots need matplotlib')
+    def test_plot_comparison(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [self.telemetry(data_wait=wait).save(Path(tmp) / f'{wait}.npz') for wait in (0.02, 0.2)]
+            output = plot_telemetry(paths, Path(tmp) / 'compare.png', window=2)
+            self.assertTrue(output.exists())
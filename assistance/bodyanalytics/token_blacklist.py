@@ -0,0 +1,250 @@
+"""
+In-process accelerator for the shared token_blacklist table.
+
+The Spring Boot service blacklists tokens in token_blacklist; checking that
+table on every authenticated request costs a query even though almost no
+token is ever blacklisted. TokenBlacklistCache keeps a Bloom filter of the
+blacklisted tokens: a miss means "not blacklisted when the filter was last
+refreshed", only hits are confirmed against the table. The filter is topped
+up from a blacklisted_at watermark every few seconds and rebuilt from scratch
+periodically (rows purged from the table cannot be removed from a Bloom
+filter otherwise). Tokens blacklisted since the watermark are not in the
+filter yet, so misses are re-checked against those recent rows only
+(RECHECK_MISSES); rows saved through Django are added to the filter at once. Rebuilds run in a background thread and swap the new
+filter in when it is complete; requests keep using the current filter, or
+check the table until the first filter is ready.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import TokenBlacklist
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLACKLIST_CACHE = {
+    'ENABLED': True,
+    # Seconds between incremental refreshes from the blacklisted_at watermark
+    'REFRESH_SECONDS': 5,
+    # Seconds between full rebuilds
+    'REBUILD_SECONDS': 600,
+    # Rows blacklisted up to this many seconds before the watermark are re-read,
+    # to catch transactions that committed after a later row was seen
+    'WATERMARK_OVERLAP_SECONDS': 60,
+    # Re-check Bloom misses against the rows blacklisted since the watermark,
+    # so a logout is effective immediately. False skips that query: tokens
+    # blacklisted by the Spring Boot service are then accepted for up to
+    # REFRESH_SECONDS.
+    'RECHECK_MISSES': True,
+    'EXPECTED_ITEMS': 100_000,
+    'FALSE_POSITIVE_RATE': 0.001,
+    # Days blacklist rows are kept by manage.py purge_expired_tokens; must
+    # cover the longest token lifetime of every service writing the table
+    'RETENTION_DAYS': 30,
+}
+
+
+def blacklist_config():
+    return {**DEFAULT_BLACKLIST_CACHE, **(getattr(settings, 'TOKEN_BLACKLIST_CACHE', None) or {})}
+
+
+def blacklist_retention():
+    """How long purge_expired_tokens keeps token_blacklist rows"""
+    return timedelta(days=blacklist_config()['RETENTION_DAYS'])
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)"""
+
+    def __init__(self, expected_items, false_positive_rate):
+        expected_items = max(int(expected_items), 1)
+        size = -expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)
+        self.size = max(int(math.ceil(size)), 8)
+        self.hash_count = max(int(round(self.size / expected_items * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class TokenBlacklistCache:
+    """Bloom-filter front for TokenBlacklist lookups, shared by all threads of a process"""
+
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_BLACKLIST_CACHE, **(config or {})}
+        self._lock = threading.Lock()
+        self._filter = None
+        self._capacity = 0
+        self._watermark = None
+        self._last_refresh = 0.0
+        self._last_rebuild = 0.0
+        self._rebuilding = threading.Event()
+        self._retry_at = 0.0
+
+    @property
+    def enabled(self):
+        return self.config['ENABLED']
+
+    def _build(self):
+        """(filter, capacity, watermark) of every blacklisted token"""
+        rows = TokenBlacklist.objects.using(DEFAULT_DB_ALIAS).values_list('token', 'blacklisted_at')
+        capacity = max(self.config['EXPECTED_ITEMS'], rows.count() * 2)
+        bloom = BloomFilter(capacity, self.config['FALSE_POSITIVE_RATE'])
+        watermark = None
+        for token, blacklisted_at in rows.iterator(chunk_size=5000):
+            bloom.add(token)
+            if watermark is None or blacklisted_at > watermark:
+                watermark = blacklisted_at
+        return bloom, capacity, watermark
+
+    def rebuild(self):
+        """Reload every blacklisted token into a fresh filter, then swap it in"""
+        started = time.monotonic()
+        bloom, capacity, watermark = self._build()
+        with self._lock:
+            # Refreshed from the scan start: rows committed while a long scan
+            # ran are read by the next refresh
+            self._filter = bloom
+            self._capacity = capacity
+            self._watermark = watermark
+            self._last_refresh = self._last_rebuild = started
+        logger.info('Token blacklist filter rebuilt: %d tokens, %d bits, %d hashes',
+                    bloom.count, bloom.size, bloom.hash_count)
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.warning('Token blacklist filter rebuild failed: %s', e)
+            # Retry after REFRESH_SECONDS rather than on the next request
+            self._retry_at = time.monotonic() + self.config['REFRESH_SECONDS']
+        finally:
+            connections[DEFAULT_DB_ALIAS].close()
+            self._rebuilding.clear()
+
+    def start_rebuild(self):
+        """Rebuild in a daemon thread unless a rebuild is already running; returns the thread or None"""
+        with self._lock:
+            if self._rebuilding.is_set() or time.monotonic() < self._retry_at:
+                return None
+            self._rebuilding.set()
+        thread = threading.Thread(target=self._rebuild_in_background, name='token-blacklist-rebuild', daemon=True)
+        thread.start()
+        return thread
+
+    def add(self, token):
+        """Add a token blacklisted in this process (post_save) without waiting for a refresh"""
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(token)
+
+    def refresh(self):
+        """Add tokens blacklisted since the watermark (caller holds the lock)"""
+        rows = TokenBlacklist.objects.using(DEFAULT_DB_ALIAS)
+        if self._watermark is not None:
+            overlap = timedelta(seconds=self.config['WATERMARK_OVERLAP_SECONDS'])
+            rows = rows.filter(blacklisted_at__gte=self._watermark - overlap)
+
+        for token, blacklisted_at in rows.values_list('token', 'blacklisted_at').iterator(chunk_size=5000):
+            # Rows inside the overlap window were usually seen already
+            if token not in self._filter:
+                self._filter.add(token)
+            if self._watermark is None or blacklisted_at > self._watermark:
+                self._watermark = blacklisted_at
+        self._last_refresh = time.monotonic()
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._filter is None:
+            self.start_rebuild()
+            return
+        if now - self._last_refresh < self.config['REFRESH_SECONDS']:
+            return
+
+        # Only one thread refreshes; the others keep using the current filter
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.refresh()
+            # Keep the false positive rate bounded when the table outgrows the filter sizing
+            outgrown = self._filter.count > self._capacity
+        finally:
+            self._lock.release()
+        if outgrown or now - self._last_rebuild >= self.config['REBUILD_SECONDS']:
+            self.start_rebuild()
+
+    def is_blacklisted(self, *tokens):
+        """
+        True if any of the given tokens (raw token, jti, ...) is blacklisted.
+        Bloom misses return without touching the database.
+        """
+        candidates = [token for token in tokens if token]
+        if not candidates:
+            return False
+
+        if not self.enabled:
+            return self._confirm(candidates)
+
+        try:
+            self._ensure_fresh()
+        except Exception as e:
+            logger.warning('Token blacklist filter unavailable, checking the table: %s', e)
+            return self._confirm(candidates)
+
+        # Watermark first: rebuild() and refresh() move it after the filter
+        # content, so an older watermark only widens the re-checked window
+        watermark = self._watermark
+        bloom = self._filter
+        if bloom is None:
+            # First filter still building
+            return self._confirm(candidates)
+        hits = [token for token in candidates if token in bloom]
+        if hits:
+            return self._confirm(hits)
+        if self.config['RECHECK_MISSES']:
+            return self._confirm(candidates, since=watermark)
+        return False
+
+    def _confirm(self, tokens, since=None):
+        rows = TokenBlacklist.objects.using(DEFAULT_DB_ALIAS).filter(token__in=tokens)
+        if since is not None:
+            # Rows older than the watermark (minus the overlap) are in the filter
+            overlap = timedelta(seconds=self.config['WATERMARK_OVERLAP_SECONDS'])
+            rows = rows.filter(blacklisted_at__gte=since - overlap)
+        return rows.exists()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_blacklist_cache():
+    """Process-wide TokenBlacklistCache configured from settings.TOKEN_BLACKLIST_CACHE"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TokenBlacklistCache(blacklist_config())
+    return _cache
+
+
+def is_token_blacklisted(*tokens):
+    return get_blacklist_cache().is_blacklisted(*tokens)
@@ -1,5 +1,4 @@
-﻿ain_sequential.py
-"""
+﻿"""
 train_sequential.py
 Entraînement séquentiel avec logique temporelle
 MediaPipe Pose → Séquençage zones → LSTM → Prédiction mouvement
@@ -8,21 +7,41 @@ Auteur: AI/ML Engineer
 Date: 2025-12-23
 """
 
+import argparse
+import multiprocessing
+import os
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler, SubsetRandomSampler, get_worker_info
 import numpy as np
 import logging
 from pathlib import Path
 from typing import Tuple, Dict, List, Optional
 import json
+import time
 from datetime import datetime
 from collections import defaultdict
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 import cv2
-import mediapipe as mp
-from sklearn.preprocessing import StandardScaler
+
+try:
+    from .cpu_training import (
+        PRECISIONS, COMPILE_MODES, autocast, available_cpus, compile_model, configure_threads, resolve_precision
+    )
+    from .detectors import get_pose
+    from .landmark_cache import LandmarkCache
+    from .landmark_features import FEATURE_DIM, FEATURES_VERSION, TARGET_DIM, landmark_features
+    from .training_telemetry import StepTelemetry, format_summary, plot_telemetry
+except ImportError:
+    # Exécuté comme script depuis bodyanalytics/
+    from cpu_training import (
+        PRECISIONS, COMPILE_MODES, autocast, available_cpus, compile_model, configure_threads, resolve_precision
+    )
+    from detectors import get_pose
+    from landmark_cache import LandmarkCache
+    from landmark_features import FEATURE_DIM, FEATURES_VERSION, TARGET_DIM, landmark_features
+    from training_telemetry import StepTelemetry, format_summary, plot_telemetry
 
 # ============= CONFIGURATION =============
 
@@ -30,24 +49,26 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(me
 logger = logging.getLogger(__name__)
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-logger.info(f"🖥️ Device: {DEVICE}")
 
 # Chemins
 DATA_BASE_DIR = Path("morphologie_processed_advanced")
 CHECKPOINTS_DIR = Path("checkpoints_sequential")
 LOGS_DIR = Path("training_logs_sequential")
+# Landmarks par répertoire de zone (N, 33, 4) et leurs features (landmark_features),
+# réutilisés d'un entraînement à l'autre
+LANDMARK_CACHE_DIR = Path("landmark_cache_sequential")
+
+
+def ensure_output_dirs():
+    """Crée les répertoires de sortie (appelé au lancement, pas à l'import)"""
+    for d in [CHECKPOINTS_DIR, LOGS_DIR]:
+        d.mkdir(parents=True, exist_ok=True)
 
-for d in [CHECKPOINTS_DIR, LOGS_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
 
 MORPHOLOGIES = ["XS", "S", "M", "L", "XL", "XXL", "XXXL"]
 ZONES = ['eyes', 'mouth', 'hands', 'full_body']
 SEQUENCE_LENGTH = 16  # 16 frames = 1 séquence temporelle
 
-# MediaPipe Pose
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(static_image_mode=True, model_complexity=1, min_detection_confidence=0.5)
-
 # Mapping zones → landmarks indices
 ZONE_LANDMARKS_MAP = {
     'eyes': [33, 133, 362, 263, 160, 387],  # Eyes
@@ -66,8 +87,10 @@ IDX_TO_CHAR = {i: c for i, c in enumerate(ALPHABET)}
 class PoseSequenceExtractor:
     """Extrait les séquences de landmarks depuis les images"""
     
-    def __init__(self):
-        self.pose = mp_pose.Pose(static_image_mode=True, model_complexity=1, min_detection_confidence=0.5)
+    @property
+    def pose(self):
+        # Pose MediaPipe partagé par process, créé au premier usage
+        return get_pose(static_image_mode=True, model_complexity=1, min_detection_confidence=0.5)
     
     def extract_landmarks(self, image: np.ndarray) -> Optional[np.ndarray]:
         """
@@ -91,17 +114,29 @@ class PoseSequenceExtractor:
             logger.debug(f"⚠️ Erreur extraction landmarks: {e}")
             return None
     
+    def landmarks_from_file(self, img_path: Path) -> Optional[np.ndarray]:
+        """Décode une image et extrait ses landmarks [33, 4] (None si illisible ou sans pose)"""
+        try:
+            img = cv2.imread(str(img_path))
+            if img is None:
+                return None
+            return self.extract_landmarks(img)
+        except Exception as e:
+            logger.debug(f"⚠️ Erreur chargement {img_path}: {e}")
+            return None
+    
     def extract_zone_features(self, landmarks: np.ndarray, zone: str) -> Optional[np.ndarray]:
         """
         Extrait features pour une zone spécifique
-        Retourne: array [n_landmarks, 4]
+        landmarks: [33, 4] ou [n_frames, 33, 4]
+        Retourne: array [n_landmarks, 4] ou [n_frames, n_landmarks, 4]
         """
         try:
             indices = ZONE_LANDMARKS_MAP.get(zone, [])
             if not indices:
                 return None
             
-            zone_landmarks = landmarks[indices]
+            zone_landmarks = landmarks[..., indices, :]
             return zone_landmarks
         except Exception as e:
             logger.debug(f"⚠️ Erreur extraction zone {zone}: {e}")
@@ -114,13 +149,29 @@ class SequenceTextToMovementDataset(Dataset):
     """
     Dataset: Texte → Séquence de mouvement
     Apprend à générer séquences de mouvement basées sur texte
+    Les features de zone de toutes les frames forment un seul tenseur contigu
+    [n_frames, n_landmarks, input_size]; une séquence est une vue (unfold) à partir de
+    son début, sans copie, même quand les fenêtres se chevauchent.
+    Indexé par une liste d'indices, il renvoie un batch entier (gather_batch).
+    features=True: landmarks centrés sur les hanches et normalisés, vitesses et
+    masque de visibilité (landmark_features, input_size = FEATURE_DIM), calculés
+    une fois à la construction et mis en cache avec les landmarks;
+    features=False: landmarks bruts (input_size = 4).
     """
     
-    def __init__(self, data_dir: Path, zone: str, seq_length: int = 16):
+    def __init__(self, data_dir: Path, zone: str, seq_length: int = 16, features: bool = True):
         self.zone = zone
         self.seq_length = seq_length
-        self.sequences = []  # [(text_seq, pose_seq, zone_features)]
+        self.stride = seq_length // 2
+        self.features = features
+        self.input_size = FEATURE_DIM if features else 4
         self.pose_extractor = PoseSequenceExtractor()
+        self.frames = torch.empty(0)  # [n_frames, n_landmarks, input_size]
+        self.detected = np.zeros(0, dtype=bool)  # frame avec pose
+        self.starts = torch.empty(0, dtype=torch.long)  # début de chaque séquence
+        self.texts = torch.empty(0, dtype=torch.long)  # [n_séquences, seq_length]
+        self.windows = None
+        self.pin_batches = False  # batches alloués en mémoire épinglée (loader sans worker)
         
         # Déterminer le répertoire
         if zone == 'full_body':
@@ -138,52 +189,103 @@ class SequenceTextToMovementDataset(Dataset):
             if morpho_dir.is_dir():
                 image_paths.extend(sorted(list(morpho_dir.glob("*.jpg"))))
         
-        # Créer séquences temporelles
-        for i in range(0, len(image_paths) - seq_length, seq_length // 2):
-            seq_images = image_paths[i:i+seq_length]
-            
-            # Charger et extraire landmarks
-            pose_sequence = []
-            for img_path in seq_images:
-                try:
-                    img = cv2.imread(str(img_path))
-                    if img is None:
-                        continue
-                    
-                    landmarks = self.pose_extractor.extract_landmarks(img)
-                    if landmarks is not None:
-                        zone_features = self.pose_extractor.extract_zone_features(landmarks, zone)
-                        if zone_features is not None:
-                            pose_sequence.append(zone_features)
-                except Exception as e:
-                    logger.debug(f"⚠️ Erreur chargement {img_path}: {e}")
-                    continue
-            
-            if len(pose_sequence) == seq_length:
-                pose_sequence = np.array(pose_sequence, dtype=np.float32)
-                
-                # Générer texte aléatoire (lettre par lettre)
-                text_seq = np.random.choice(list(ALPHABET), size=seq_length)
-                text_seq_encoded = np.array([CHAR_TO_IDX.get(c, 0) for c in text_seq])
-                
-                self.sequences.append({
-                    'text': text_seq_encoded,
-                    'poses': pose_sequence,
-                    'zone': zone
-                })
+        # Landmarks de toutes les images: cache disque, chaque image n'est analysée qu'une fois
+        cache = LandmarkCache(LANDMARK_CACHE_DIR, f"{data_dir.name}_{zone_dir.name}",
+                              self.pose_extractor.landmarks_from_file)
+        landmarks = cache.landmarks(image_paths)
+        if cache.misses:
+            logger.info(f"  🗃️ {zone_dir.name}: {cache.misses} images analysées, {cache.hits} depuis le cache")
+        if self.features:
+            # Sur les 33 landmarks (hanches et épaules), avant la sélection de la zone
+            landmarks = cache.derived('features', FEATURES_VERSION, landmark_features)
         
-        logger.info(f"📦 {zone}: {len(self.sequences)} séquences temporelles")
+        features = self.pose_extractor.extract_zone_features(landmarks, zone)
+        if features is not None:
+            # Lignes NaN: image illisible ou sans pose
+            self.detected = ~np.isnan(landmarks).any(axis=(1, 2))
+            self.frames = torch.from_numpy(np.ascontiguousarray(features, dtype=np.float32))
+        
+        self.set_windows()
+        logger.info(f"📦 {zone}: {len(self)} séquences temporelles")
+    
+    def set_windows(self, seq_length: Optional[int] = None, stride: Optional[int] = None, offset: int = 0):
+        """
+        (Re)calcule les débuts de séquences: toutes les frames d'une séquence ont une pose.
+        Changer longueur, pas ou décalage (augmentation) ne copie pas les poses;
+        un texte aléatoire est tiré pour chaque séquence.
+        """
+        if seq_length is not None:
+            self.seq_length = seq_length
+        if stride is not None:
+            self.stride = stride
+        
+        n_frames = len(self.detected)
+        starts = []
+        if n_frames >= self.seq_length:
+            # Fenêtres entièrement détectées: somme glissante des frames sans pose
+            missing = np.concatenate([[0], np.cumsum(~self.detected)])
+            for i in range(offset, n_frames - self.seq_length, max(self.stride, 1)):
+                if missing[i + self.seq_length] == missing[i]:
+                    starts.append(i)
+        
+        # Générer texte aléatoire (lettre par lettre)
+        texts = []
+        for _ in starts:
+            text_seq = np.random.choice(list(ALPHABET), size=self.seq_length)
+            texts.append([CHAR_TO_IDX.get(c, 0) for c in text_seq])
+        
+        self.starts = torch.tensor(starts, dtype=torch.long)
+        self.texts = torch.tensor(texts, dtype=torch.long).reshape(len(starts), self.seq_length)
+        # Vue [n_frames - seq_length + 1, seq_length, n_landmarks, input_size] sur self.frames
+        self.windows = (
+            self.frames.unfold(0, self.seq_length, 1).permute(0, 3, 1, 2)
+            if len(self.frames) >= self.seq_length else None
+        )
+    
+    def split_windows(self, val_fraction: float) -> Tuple[List[int], List[int]]:
+        """
+        (indices d'entraînement, indices de validation): la validation prend les
+        dernières séquences, et l'entraînement exclut celles qui partagent des
+        frames avec elles (les fenêtres se chevauchent)
+        """
+        n_val = int(round(len(self) * val_fraction)) if val_fraction > 0 else 0
+        if n_val == 0 or n_val >= len(self):
+            return list(range(len(self))), []
+        val = list(range(len(self) - n_val, len(self)))
+        first_val_frame = int(self.starts[val[0]])
+        train = [i for i in range(val[0]) if int(self.starts[i]) + self.seq_length <= first_val_frame]
+        return train, val
     
     def __len__(self):
-        return len(self.sequences)
+        return len(self.starts)
     
     def __getitem__(self, idx):
-        seq = self.sequences[idx]
+        if isinstance(idx, (list, tuple, torch.Tensor, np.ndarray)):
+            return self.gather_batch(idx)
+        return self.texts[idx], self.windows[int(self.starts[idx])]
+    
+    def gather_batch(self, indices):
+        """
+        Batch (textes [B, seq_length], poses [B, seq_length, n_landmarks, input_size]) écrit
+        directement dans des tenseurs alloués une fois: un seul gather par tenseur,
+        sans liste d'échantillons à empiler. Dans un worker, les tenseurs sont en
+        mémoire partagée (pas de copie au retour vers le process principal).
+        """
+        indices = torch.as_tensor(indices, dtype=torch.long)
+        batch = len(indices)
+        rows = (self.starts[indices].unsqueeze(1) + torch.arange(self.seq_length)).reshape(-1)
         
-        text = torch.from_numpy(seq['text']).long()
-        poses = torch.from_numpy(seq['poses']).float()
+        pin = self.pin_batches and get_worker_info() is None
+        text_seq = torch.empty((batch, self.seq_length), dtype=self.texts.dtype, pin_memory=pin)
+        pose_seq = torch.empty((batch, self.seq_length) + tuple(self.frames.shape[1:]),
+                               dtype=self.frames.dtype, pin_memory=pin)
+        if get_worker_info() is not None:
+            text_seq.share_memory_()
+            pose_seq.share_memory_()
         
-        return text, poses
+        torch.index_select(self.texts, 0, indices, out=text_seq)
+        torch.index_select(self.frames, 0, rows, out=pose_seq.view((-1,) + tuple(self.frames.shape[1:])))
+        return text_seq, pose_seq
 
 
 # ============= CLASSE 3: TEXT ENCODER =============
@@ -220,20 +322,13 @@ class PoseLSTMEncoder(nn.Module):
         self.hidden_dim = hidden_dim
     
     def forward(self, pose_seq):
-        # pose_seq: [batch, seq_len, num_landmarks, 4]
-        batch_size, seq_len, num_landmarks, feat_dim = pose_seq.shape
-        
-        # Reshape: [batch*seq_len, num_landmarks, 4]
-        pose_seq_flat = pose_seq.view(batch_size * seq_len, num_landmarks, feat_dim)
-        
-        # Average pooling sur landmarks
-        pose_flat_avg = pose_seq_flat.mean(dim=1)  # [batch*seq_len, 4]
-        
-        # Reshape pour LSTM
-        pose_flat_avg = pose_flat_avg.view(batch_size, seq_len, -1)
+        # pose_seq: [batch, seq_len, num_landmarks, input_size]
+        # Average pooling sur landmarks, features en dernier: [batch, seq_len, input_size]
+        # (pas de view: accepte aussi un batch non contigu)
+        pose_avg = pose_seq.mean(dim=2)
         
         # LSTM
-        _, (h_n, c_n) = self.lstm(pose_flat_avg)
+        _, (h_n, c_n) = self.lstm(pose_avg)
         pose_context = h_n[-1]  # [batch, hidden_dim]
         
         return pose_context
@@ -297,13 +392,15 @@ class SequentialTextToMovementModel(nn.Module):
     Texte → [Text Encoder] → Contexte texte
     Poses → [Pose LSTM] → Contexte pose
     Context texte + pose → [Zone Predictor] → Prédiction mouvement
+    input_size: features par landmark (4 bruts, FEATURE_DIM avec landmark_features);
+    la prédiction garde 4 valeurs (x, y, z, visibility)
     """
     
-    def __init__(self, seq_len: int = 16):
+    def __init__(self, seq_len: int = 16, input_size: int = 4):
         super().__init__()
         
         self.text_encoder = TextEncoder(vocab_size=len(ALPHABET), embedding_dim=64, hidden_dim=128)
-        self.pose_encoder = PoseLSTMEncoder(input_size=4, hidden_dim=128)
+        self.pose_encoder = PoseLSTMEncoder(input_size=input_size, hidden_dim=128)
         self.motion_predictor = ZoneMotionPredictor(text_dim=128, pose_dim=128, output_dim=4, seq_len=seq_len)
     
     def forward(self, text_seq, pose_seq):
@@ -319,16 +416,194 @@ class SequentialTextToMovementModel(nn.Module):
         return motion_pred, text_context, pose_context
 
 
+# ============= PAS D'ENTRAÎNEMENT =============
+
+def motion_loss(criterion, motion_pred: torch.Tensor, pose_seq: torch.Tensor) -> torch.Tensor:
+    """
+    Loss: prédire le mouvement suivant (poses décalées d'une frame).
+    Cible: les 4 premières features (x, y, z, visibility, normalisés avec landmark_features)
+    """
+    # Décaler les poses pour prédiction t+1
+    pose_target = pose_seq[:, 1:, :, :TARGET_DIM]  # Shift temporel
+    motion_pred_adj = motion_pred[:, :-1, :]
+    
+    # Reshaper pour loss: la prédiction [4] de chaque frame vaut pour tous ses landmarks
+    motion_pred_flat = motion_pred_adj.unsqueeze(2).expand_as(pose_target).reshape(-1, TARGET_DIM)
+    pose_target_flat = pose_target.reshape(-1, TARGET_DIM)
+    
+    return criterion(motion_pred_flat.float(), pose_target_flat)
+
+
+def train_step(model: nn.Module, step_model: nn.Module, optimizer, criterion,
+               text_seq: torch.Tensor, pose_seq: torch.Tensor, precision: str = 'fp32',
+               timings: Optional[Dict[str, float]] = None) -> float:
+    """
+    Un pas d'optimisation. step_model: model ou sa version compilée (mêmes paramètres);
+    precision 'bf16': forward et loss sous autocast bfloat16 (CPU).
+    timings: si fourni, reçoit les durées (s) 'forward', 'backward' et 'optimizer'
+    """
+    def lap(phase: str, start: float) -> float:
+        if timings is None:
+            return start
+        if pose_seq.is_cuda:
+            # Noyaux GPU asynchrones: attendre leur fin pour les attribuer à la bonne phase
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        timings[phase] = now - start
+        return now
+    
+    start = time.perf_counter()
+    optimizer.zero_grad()
+    
+    with autocast(precision):
+        # Forward
+        motion_pred, text_context, pose_context = step_model(text_seq, pose_seq)
+        loss = motion_loss(criterion, motion_pred, pose_seq)
+    start = lap('forward', start)
+    
+    loss.backward()
+    start = lap('backward', start)
+    torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+    optimizer.step()
+    lap('optimizer', start)
+    
+    return loss.item()
+
+
+def evaluate(step_model: nn.Module, criterion, loader, precision: str = 'fp32') -> float:
+    """Loss moyenne sur un loader, sans gradient (dropout désactivé)"""
+    step_model.eval()
+    total_loss = 0.0
+    batches = 0
+    with torch.no_grad(), autocast(precision):
+        for text_seq, pose_seq in loader:
+            text_seq = text_seq.to(DEVICE)
+            pose_seq = pose_seq.to(DEVICE)
+            motion_pred, _, _ = step_model(text_seq, pose_seq)
+            total_loss += motion_loss(criterion, motion_pred, pose_seq).item()
+            batches += 1
+    step_model.train()
+    return total_loss / max(batches, 1)
+
+
+def save_checkpoint(state: dict, path: Path):
+    """torch.save atomique: un arrêt pendant l'écriture laisse le checkpoint précédent intact"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
 # ============= CLASSE 7: TRAINER =============
 
 class SequentialTrainer:
     """Entraîneur pour modèles séquentiels par zone"""
     
-    def __init__(self):
+    def __init__(self, num_workers: int = 0, persistent_workers: bool = True,
+                 prefetch_factor: int = 2, pin_memory: Optional[bool] = None,
+                 precision: str = 'fp32', compile_mode: str = 'none',
+                 val_fraction: float = 0.1, patience: int = 5, min_delta: float = 1e-4,
+                 checkpoint_every: int = 1, resume: bool = True, features: bool = True,
+                 run_name: Optional[str] = None, plots: bool = True):
+        """
+        Options des DataLoader: num_workers=0 charge dans le process principal;
+        persistent_workers et prefetch_factor ne servent qu'avec des workers.
+        pin_memory=None: activé seulement sur GPU.
+        Mode CPU: precision ('auto', 'fp32', 'bf16': autocast bfloat16, ignoré sur GPU)
+        et compile_mode ('none', 'compile', 'script') du modèle entraîné.
+        Entraînement par zone: val_fraction des séquences en validation, arrêt après
+        patience epochs sans gain de min_delta (0 = jamais), checkpoint de reprise
+        toutes les checkpoint_every epochs, repris au lancement suivant si resume.
+        features: entrées landmark_features (False: landmarks bruts).
+        Télémétrie par pas (training_telemetry) dans LOGS_DIR/telemetry_{run_name}_{zone}.npz
+        (run_name par défaut: date du lancement), tracée en .png à la fin si plots
+        """
+        ensure_output_dirs()
         self.history = defaultdict(dict)
+        self.num_workers = max(int(num_workers), 0)
+        self.persistent_workers = persistent_workers
+        self.prefetch_factor = prefetch_factor
+        self.pin_memory = DEVICE.type == 'cuda' if pin_memory is None else pin_memory
+        self.precision = resolve_precision(precision) if DEVICE.type == 'cpu' else 'fp32'
+        self.compile_mode = compile_mode
+        self.val_fraction = min(max(val_fraction, 0.0), 0.5)
+        self.patience = patience
+        self.min_delta = min_delta
+        self.checkpoint_every = max(int(checkpoint_every), 1)
+        self.resume = resume
+        self.features = features
+        self.run_name = run_name or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.plots = plots
+        self.datasets = {}
+        self.splits = {}
+        self.loaders = {}
+    
+    def get_dataset(self, zone: str) -> SequenceTextToMovementDataset:
+        """Dataset d'une zone, construit une fois et partagé par les deux phases"""
+        if zone not in self.datasets:
+            self.datasets[zone] = SequenceTextToMovementDataset(DATA_BASE_DIR, zone, seq_length=SEQUENCE_LENGTH,
+                                                                 features=self.features)
+        return self.datasets[zone]
+    
+    def make_loader(self, dataset: SequenceTextToMovementDataset, batch_size: int, shuffle: bool = True,
+                    indices: Optional[List[int]] = None) -> DataLoader:
+        """
+        DataLoader configuré par le trainer, sur tout le dataset ou sur indices.
+        Le sampler produit des listes d'indices et le dataset assemble chaque batch
+        d'un coup (gather_batch): batch_size=None désactive la collation
+        échantillon par échantillon
+        """
+        if indices is None:
+            sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+        else:
+            sampler = SubsetRandomSampler(indices) if shuffle else indices
+        dataset.pin_batches = self.pin_memory and self.num_workers == 0
+        options = {}
+        if self.num_workers > 0:
+            options = {'persistent_workers': self.persistent_workers, 'prefetch_factor': self.prefetch_factor}
+        return DataLoader(
+            dataset,
+            sampler=BatchSampler(sampler, batch_size=batch_size, drop_last=False),
+            batch_size=None,
+            num_workers=self.num_workers,
+            pin_memory=self.pin_memory,
+            **options
+        )
+    
+    def get_split(self, zone: str) -> Tuple[List[int], List[int]]:
+        """(indices d'entraînement, indices de validation) d'une zone"""
+        if zone not in self.splits:
+            self.splits[zone] = self.get_dataset(zone).split_windows(self.val_fraction)
+        return self.splits[zone]
+    
+    def get_loader(self, zone: str, batch_size: int, split: str = 'all') -> DataLoader:
+        """
+        Loader d'une zone ('all', 'train' ou 'val'), réutilisé d'une epoch à l'autre
+        (workers persistants)
+        """
+        key = (zone, batch_size, split)
+        if key not in self.loaders:
+            dataset = self.get_dataset(zone)
+            if split == 'all':
+                self.loaders[key] = self.make_loader(dataset, batch_size)
+            else:
+                train_indices, val_indices = self.get_split(zone)
+                indices = train_indices if split == 'train' else val_indices
+                self.loaders[key] = self.make_loader(dataset, batch_size, shuffle=split == 'train', indices=indices)
+        return self.loaders[key]
+    
+    def resume_path(self, zone: str) -> Path:
+        return CHECKPOINTS_DIR / f"sequential_{zone}_last.pth"
+    
+    def telemetry_path(self, zone: str) -> Path:
+        return LOGS_DIR / f"telemetry_{self.run_name}_{zone}.npz"
     
     def train_zone(self, zone: str, epochs: int = 40, batch_size: int = 16):
-        """Entraîne modèle séquentiel pour une zone"""
+        """
+        Entraîne modèle séquentiel pour une zone.
+        Reprend depuis sequential_{zone}_last.pth s'il existe (modèle, optimiseur, epoch),
+        s'arrête quand la loss de validation ne baisse plus; sequential_{zone}.pth
+        contient le meilleur modèle
+        """
         
         logger.info("\n" + "=" * 70)
         logger.info(f"🎯 ZONE SÉQUENTIELLE: {zone.upper()}")
@@ -336,69 +611,192 @@ class SequentialTrainer:
         logger.info("=" * 70)
         
         # Dataset
-        dataset = SequenceTextToMovementDataset(DATA_BASE_DIR, zone, seq_length=SEQUENCE_LENGTH)
+        dataset = self.get_dataset(zone)
         
         if len(dataset) == 0:
             logger.warning(f"⚠️ Pas de données pour {zone}")
             return None
         
-        loader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
+        train_indices, val_indices = self.get_split(zone)
+        loader = self.get_loader(zone, batch_size, 'train')
+        val_loader = self.get_loader(zone, batch_size, 'val') if val_indices else None
         
         # Modèle
-        model = SequentialTextToMovementModel(seq_len=SEQUENCE_LENGTH).to(DEVICE)
+        model = SequentialTextToMovementModel(seq_len=SEQUENCE_LENGTH, input_size=dataset.input_size).to(DEVICE)
         optimizer = optim.Adam(model.parameters(), lr=1e-3)
         criterion = nn.MSELoss()
         
-        logger.info(f"  📊 Données: {len(dataset)} séquences")
+        logger.info(f"  📊 Données: {len(dataset)} séquences "
+                    f"({len(train_indices)} entraînement, {len(val_indices)} validation)")
         logger.info(f"  🎯 Sequence length: {SEQUENCE_LENGTH} frames")
         
-        for epoch in range(epochs):
+        # État de l'entraînement, sauvegardé dans le checkpoint de reprise
+        state = {
+            'epoch': 0,
+            'best_loss': float('inf'),
+            'best_epoch': 0,
+            'stale_epochs': 0,
+            'loss': [],
+            'val_loss': [],
+            'data_wait': [],
+            'samples_per_sec': []
+        }
+        resume_path = self.resume_path(zone)
+        checkpoint = None
+        if self.resume and resume_path.exists():
+            checkpoint = torch.load(resume_path, map_location=DEVICE, weights_only=True)
+            if checkpoint.get('input_size', 4) != dataset.input_size:
+                logger.warning(f"  ⚠️ Checkpoint de reprise ignoré: entrées différentes ({resume_path})")
+                checkpoint = None
+        if checkpoint is not None:
+            model.load_state_dict(checkpoint['model_state'])
+            optimizer.load_state_dict(checkpoint['optimizer_state'])
+            state.update(checkpoint['state'])
+            logger.info(f"  ♻️ Reprise après l'epoch {state['epoch']} ({resume_path})")
+            self.history[zone]['resumed_from'] = state['epoch']
+        
+        model_path = CHECKPOINTS_DIR / f"sequential_{zone}.pth"
+        
+        def save_best():
+            save_checkpoint({
+                'model_state': model.state_dict(),
+                'zone': zone,
+                'seq_len': SEQUENCE_LENGTH,
+                'alphabet': ALPHABET,
+                # Entrées à reconstruire à l'inférence (landmark_features puis landmarks de la zone)
+                'input_size': dataset.input_size,
+                'features': FEATURES_VERSION if dataset.features else 0,
+                'landmark_indices': ZONE_LANDMARKS_MAP[zone],
+                'epoch': state['best_epoch'],
+                'val_loss': state['best_loss']
+            }, model_path)
+        
+        def save_resume():
+            save_checkpoint({
+                'model_state': model.state_dict(),
+                'optimizer_state': optimizer.state_dict(),
+                'zone': zone,
+                'input_size': dataset.input_size,
+                'state': state
+            }, resume_path)
+        
+        # Module compilé (compile_mode) partageant les paramètres de model, essayé sur
+        # un petit batch: un échec de compilation retombe sur TorchScript ou eager ici,
+        # pas au premier pas d'entraînement
+        non_blocking = self.pin_memory and DEVICE.type == 'cuda'
+        example_inputs = None
+        if self.compile_mode != 'none':
+            example_inputs = tuple(t.to(DEVICE) for t in dataset.gather_batch(train_indices[:2]))
+        step_model = compile_model(model, self.compile_mode, example_inputs, self.precision)
+        
+        # Temps d'attente des données et de chaque phase, par pas (cette exécution seulement)
+        telemetry = StepTelemetry(
+            run=self.run_name, zone=zone, device=str(DEVICE), batch_size=batch_size,
+            num_workers=self.num_workers, precision=self.precision, compile_mode=self.compile_mode,
+            threads=torch.get_num_threads(), features=dataset.features
+        )
+        timings = {}
+        
+        for epoch in range(state['epoch'], epochs):
+            if self.patience and state['stale_epochs'] >= self.patience:
+                break
+            
             total_loss = 0
-            text_loss = 0
-            motion_loss = 0
+            wait_time = 0.0
+            step_time = 0.0
+            epoch_samples = 0
             
+            step_end = time.perf_counter()
             for text_seq, pose_seq in loader:
-                text_seq = text_seq.to(DEVICE)
-                pose_seq = pose_seq.to(DEVICE)
-                
-                optimizer.zero_grad()
+                step_start = time.perf_counter()
+                data_wait = step_start - step_end
+                wait_time += data_wait
                 
-                # Forward
-                motion_pred, text_context, pose_context = model(text_seq, pose_seq)
+                text_seq = text_seq.to(DEVICE, non_blocking=non_blocking)
+                pose_seq = pose_seq.to(DEVICE, non_blocking=non_blocking)
                 
-                # Loss: prédire le mouvement suivant
-                # Décaler les poses pour prédiction t+1
-                pose_target = pose_seq[:, 1:, :, :]  # Shift temporel
-                motion_pred_adj = motion_pred[:, :-1, :]
+                loss = train_step(model, step_model, optimizer, criterion, text_seq, pose_seq,
+                                  self.precision, timings)
+                total_loss += loss
                 
-                # Reshaper pour loss
-                motion_pred_flat = motion_pred_adj.reshape(-1, 4)
-                pose_target_flat = pose_target.reshape(-1, 4)
-                
-                loss = criterion(motion_pred_flat, pose_target_flat)
-                
-                loss.backward()
-                torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
-                optimizer.step()
-                
-                total_loss += loss.item()
+                step_end = time.perf_counter()
+                step_time += step_end - step_start
+                epoch_samples += len(text_seq)
+                telemetry.record(epoch + 1, data_wait, timings['forward'], timings['backward'],
+                                 timings['optimizer'], step_end - step_start, len(text_seq), loss)
+            
+            avg_loss = total_loss / max(len(loader), 1)
+            # Sans validation (trop peu de séquences), la loss d'entraînement sert de critère
+            val_loss = evaluate(step_model, criterion, val_loader, self.precision) if val_loader else avg_loss
+            state['loss'].append(avg_loss)
+            state['val_loss'].append(val_loss)
+            # Part du temps d'epoch passée à attendre le loader
+            state['data_wait'].append(wait_time / max(wait_time + step_time, 1e-12))
+            state['samples_per_sec'].append(epoch_samples / max(wait_time + step_time, 1e-12))
+            state['epoch'] = epoch + 1
             
-            avg_loss = total_loss / len(loader)
-            logger.info(f"  Epoch {epoch+1:3d}/{epochs} - Loss: {avg_loss:.6f}")
+            improved = val_loss < state['best_loss'] - self.min_delta
+            if improved:
+                state['best_loss'] = val_loss
+                state['best_epoch'] = epoch + 1
+                state['stale_epochs'] = 0
+                save_best()
+            else:
+                state['stale_epochs'] += 1
+            
+            logger.info(f"  Epoch {epoch+1:3d}/{epochs} - Loss: {avg_loss:.6f} - Val: {val_loss:.6f}"
+                        f"{' ⭐' if improved else ''} - Attente données: {state['data_wait'][-1]:.1%}"
+                        f" - {state['samples_per_sec'][-1]:.0f} séq/s")
+            
+            if (epoch + 1) % self.checkpoint_every == 0:
+                save_resume()
         
-        # Sauvegarder
-        model_path = CHECKPOINTS_DIR / f"sequential_{zone}.pth"
-        torch.save({
-            'model_state': model.state_dict(),
-            'zone': zone,
-            'seq_len': SEQUENCE_LENGTH,
-            'alphabet': ALPHABET
-        }, model_path)
+        if state['epoch'] < epochs:
+            logger.info(f"  ⏹️ Arrêt anticipé à l'epoch {state['epoch']}: "
+                        f"pas d'amélioration depuis {state['stale_epochs']} epochs")
+        if state['best_epoch'] == 0:
+            # Aucune epoch terminée (reprise d'un entraînement déjà fini sans meilleur modèle)
+            save_best()
         
-        logger.info(f"\n  ✅ Modèle séquentiel {zone} sauvegardé: {model_path}\n")
+        data_wait = state['data_wait']
+        self.history[zone].update({
+            'sequences': len(dataset),
+            'loss': state['loss'],
+            'val_loss': state['val_loss'],
+            'best_epoch': state['best_epoch'],
+            'best_val_loss': state['best_loss'],
+            'stopped_epoch': state['epoch'],
+            'data_wait': data_wait,
+            'samples_per_sec': state['samples_per_sec'],
+            'checkpoint': str(model_path)
+        })
+        if data_wait and max(data_wait) > 0.5:
+            logger.warning(f"  ⚠️ {zone}: le loader limite l'entraînement (attente max {max(data_wait):.0%}), "
+                           f"augmenter num_workers")
+        if len(telemetry):
+            self.save_telemetry(zone, telemetry)
+        
+        # Entraînement terminé: plus rien à reprendre, le modèle retourné est le meilleur
+        resume_path.unlink(missing_ok=True)
+        model.load_state_dict(torch.load(model_path, map_location=DEVICE, weights_only=True)['model_state'])
+        
+        logger.info(f"\n  ✅ Modèle séquentiel {zone} sauvegardé: {model_path} "
+                    f"(epoch {state['best_epoch']}, val {state['best_loss']:.6f})\n")
         
         return model
     
+    def save_telemetry(self, zone: str, telemetry: StepTelemetry):
+        """Écrit la télémétrie d'une zone (.npz), son graphique (.png) et son résumé dans l'historique"""
+        path = telemetry.save(self.telemetry_path(zone))
+        summary = telemetry.summary()
+        logger.info(f"  ⏱️ {format_summary(zone, summary)}")
+        self.history[zone].update({'telemetry': str(path), 'telemetry_summary': summary})
+        if self.plots:
+            plot_path = plot_telemetry([path], path.with_suffix('.png'))
+            if plot_path:
+                self.history[zone]['telemetry_plot'] = str(plot_path)
+                logger.info(f"  📈 Graphiques: {plot_path}")
+    
     def train_global_sequence(self, epochs: int = 30, batch_size: int = 8):
         """Entraîne logique globale : comprendre la séquence zones → corps entier"""
         
@@ -410,7 +808,7 @@ class SequentialTrainer:
         # Charger datasets pour toutes les zones
         datasets = {}
         for zone in ZONES:
-            dataset = SequenceTextToMovementDataset(DATA_BASE_DIR, zone, seq_length=SEQUENCE_LENGTH)
+            dataset = self.get_dataset(zone)
             if len(dataset) > 0:
                 datasets[zone] = dataset
         
@@ -422,30 +820,200 @@ class SequentialTrainer:
         logger.info(f"\n  📚 Zones disponibles: {list(datasets.keys())}")
         logger.info(f"  🔄 Apprentissage de la logique de transition entre zones")
         
+        # Loaders construits une fois pour toutes les epochs
+        loaders = {zone: self.get_loader(zone, batch_size) for zone in datasets}
+        
         # Entraîner avec texte + séquence zones
         for epoch in range(epochs):
             total_loss = 0
+            wait_time = 0.0
+            step_time = 0.0
             
-            for zone in datasets.keys():
-                dataset = datasets[zone]
-                loader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
-                
+            for zone, loader in loaders.items():
+                step_end = time.perf_counter()
                 for text_seq, pose_seq in loader:
+                    step_start = time.perf_counter()
+                    wait_time += step_start - step_end
                     # Ici on peut implémenter une logique plus complexe
                     # qui comprend la transition entre zones
                     total_loss += 0  # Placeholder
+                    step_end = time.perf_counter()
+                    step_time += step_end - step_start
             
             if (epoch + 1) % 5 == 0:
-                logger.info(f"  Epoch {epoch+1:3d}/{epochs} - Loss: {total_loss:.6f}")
+                wait_fraction = wait_time / max(wait_time + step_time, 1e-12)
+                logger.info(f"  Epoch {epoch+1:3d}/{epochs} - Loss: {total_loss:.6f} - Attente données: {wait_fraction:.1%}")
         
         logger.info(f"\n  ✅ Entraînement global terminé\n")
 
 
+# ============= ZONES EN PARALLÈLE =============
+
+def _init_zone_worker(threads: int):
+    """Initialiseur du pool: chaque process n'utilise que sa part des cœurs"""
+    configure_threads(threads, 1)
+
+
+def _train_zone_worker(zone: str, epochs: int, trainer_options: dict) -> dict:
+    """
+    Entraîne une zone dans un process du pool. Les logs sont préfixés par la zone
+    et copiés dans LOGS_DIR/sequential_{zone}.log; retourne le résumé de la zone
+    """
+    root = logging.getLogger()
+    formatter = logging.Formatter(f'%(asctime)s [%(levelname)s] [{zone}] %(message)s')
+    for handler in root.handlers:
+        handler.setFormatter(formatter)
+    ensure_output_dirs()
+    file_handler = logging.FileHandler(LOGS_DIR / f"sequential_{zone}.log", mode='w', encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    root.addHandler(file_handler)
+    
+    start = time.perf_counter()
+    try:
+        trainer = SequentialTrainer(**trainer_options)
+        model = trainer.train_zone(zone, epochs=epochs)
+        summary = {'zone': zone, 'trained': model is not None, **trainer.history[zone]}
+    except Exception as e:
+        logger.exception(f"❌ {zone}: entraînement interrompu")
+        summary = {'zone': zone, 'trained': False, 'error': repr(e)}
+    finally:
+        root.removeHandler(file_handler)
+        file_handler.close()
+    summary['elapsed'] = time.perf_counter() - start
+    summary['threads'] = torch.get_num_threads()
+    return summary
+
+
+def train_zones_parallel(zones: List[str], epochs: int, trainer_options: dict,
+                         processes: Optional[int] = None, threads_per_process: Optional[int] = None) -> List[dict]:
+    """
+    Entraîne chaque zone dans son propre process (spawn), chacun avec
+    threads_per_process threads torch (défaut: CPUs disponibles / processes).
+    Les checkpoints restent CHECKPOINTS_DIR/sequential_{zone}.pth; retourne
+    les résumés par zone, dans l'ordre de zones
+    """
+    processes = max(min(processes or len(zones), len(zones)), 1)
+    threads = threads_per_process or max(available_cpus() // processes, 1)
+    logger.info(f"  🔀 {len(zones)} zones sur {processes} process, {threads} threads chacun")
+    
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(processes, mp_context=context,
+                             initializer=_init_zone_worker, initargs=(threads,)) as pool:
+        futures = [pool.submit(_train_zone_worker, zone, epochs, trainer_options) for zone in zones]
+        return [future.result() for future in futures]
+
+
+def log_zone_summary(summaries: List[dict]):
+    """Résumé fusionné des zones (parallèles ou non), aussi écrit dans LOGS_DIR"""
+    logger.info("\n" + "=" * 70)
+    logger.info("📊 RÉSUMÉ DES ZONES")
+    logger.info("=" * 70)
+    for summary in summaries:
+        zone = summary['zone'].upper()
+        if summary.get('error'):
+            logger.info(f"  ❌ {zone:10s} erreur: {summary['error']}")
+        elif not summary.get('trained'):
+            logger.info(f"  ⚠️ {zone:10s} pas de données")
+        else:
+            data_wait = summary.get('data_wait') or [0.0]
+            logger.info(
+                f"  ✅ {zone:10s} {summary['sequences']:6d} séquences, {len(summary['loss'])} epochs, "
+                f"loss finale {summary['loss'][-1] if summary['loss'] else float('nan'):.6f}, "
+                f"meilleure val {summary.get('best_val_loss', float('nan')):.6f} (epoch {summary.get('best_epoch', '-')}), "
+                f"attente données {np.mean(data_wait):.1%}, "
+                f"{summary.get('telemetry_summary', {}).get('samples_per_sec', 0):.0f} séq/s, "
+                f"{summary.get('elapsed', 0):.1f}s → {summary['checkpoint']}"
+            )
+    
+    summary_file = LOGS_DIR / "zones_summary.json"
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump({'date': datetime.now().isoformat(), 'zones': summaries}, f, indent=2)
+    logger.info(f"  📝 Résumé: {summary_file}")
+
+
 # ============= EXÉCUTION PRINCIPALE =============
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Entraînement séquentiel texte → mouvement")
+    parser.add_argument(
+        '--num-workers', type=int, default=0,
+        help="Workers DataLoader (0 = chargement dans le process principal, défaut: 0)"
+    )
+    parser.add_argument(
+        '--prefetch-factor', type=int, default=2,
+        help="Batches préchargés par worker (défaut: 2)"
+    )
+    parser.add_argument(
+        '--no-persistent-workers', dest='persistent_workers', action='store_false',
+        help="Relance les workers à chaque epoch"
+    )
+    parser.add_argument(
+        '--pin-memory', choices=('auto', 'on', 'off'), default='auto',
+        help="Batches en mémoire épinglée (auto: seulement sur GPU, défaut: auto)"
+    )
+    parser.add_argument(
+        '--cpu-mode', action='store_true',
+        help="Mode CPU: précision auto (bf16 si le CPU le supporte), torch.compile, un thread par CPU disponible"
+    )
+    parser.add_argument(
+        '--precision', choices=PRECISIONS, default=None,
+        help="Précision sur CPU (défaut: fp32, auto avec --cpu-mode)"
+    )
+    parser.add_argument(
+        '--compile', dest='compile_mode', choices=COMPILE_MODES, default=None,
+        help="Compilation du modèle (défaut: none, compile avec --cpu-mode)"
+    )
+    parser.add_argument(
+        '--threads', type=int, default=None,
+        help="Threads intra-op torch (défaut: réglage torch, CPUs disponibles avec --cpu-mode)"
+    )
+    parser.add_argument(
+        '--interop-threads', type=int, default=None,
+        help="Threads inter-op torch (défaut: réglage torch)"
+    )
+    parser.add_argument(
+        '--parallel-zones', action='store_true',
+        help="Entraîne les zones dans des process séparés, les cœurs étant répartis entre eux"
+    )
+    parser.add_argument(
+        '--zone-processes', type=int, default=None,
+        help="Process avec --parallel-zones (défaut: un par zone)"
+    )
+    parser.add_argument(
+        '--val-fraction', type=float, default=0.1,
+        help="Part des séquences de chaque zone gardée pour la validation (défaut: 0.1)"
+    )
+    parser.add_argument(
+        '--patience', type=int, default=5,
+        help="Epochs sans amélioration de la validation avant arrêt (0 = jamais, défaut: 5)"
+    )
+    parser.add_argument(
+        '--checkpoint-every', type=int, default=1,
+        help="Epochs entre deux checkpoints de reprise (défaut: 1)"
+    )
+    parser.add_argument(
+        '--no-resume', dest='resume', action='store_false',
+        help="Ignore les checkpoints de reprise et recommence chaque zone"
+    )
+    parser.add_argument(
+        '--raw-landmarks', dest='features', action='store_false',
+        help="Entraîne sur les landmarks bruts, sans normalisation ni vitesses (landmark_features)"
+    )
+    parser.add_argument(
+        '--run-name', default=None,
+        help="Nom de l'exécution dans les fichiers de télémétrie de LOGS_DIR (défaut: date du lancement)"
+    )
+    parser.add_argument(
+        '--no-plots', dest='plots', action='store_false',
+        help="Enregistre la télémétrie sans tracer les graphiques (matplotlib)"
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Exécute entraînement séquentiel complet"""
+    args = parse_args(argv)
     
+    logger.info(f"🖥️ Device: {DEVICE}")
     logger.info("\n")
     logger.info("╔" + "=" * 68 + "╗")
     logger.info("║" + " ENTRAÎNEMENT SÉQUENTIEL - LOGIQUE TEMPORELLE ".center(68) + "║")
@@ -453,15 +1021,56 @@ def main():
     logger.info("║" + " MediaPipe Pose Sequences ".center(68) + "║")
     logger.info("╚" + "=" * 68 + "╝\n")
     
-    trainer = SequentialTrainer()
+    threads = args.threads
+    if threads is None and args.cpu_mode:
+        threads = available_cpus()
+    intra_op, inter_op = configure_threads(threads, args.interop_threads)
+    
+    trainer_options = {
+        'num_workers': args.num_workers,
+        'persistent_workers': args.persistent_workers,
+        'prefetch_factor': args.prefetch_factor,
+        'pin_memory': {'auto': None, 'on': True, 'off': False}[args.pin_memory],
+        'precision': args.precision or ('auto' if args.cpu_mode else 'fp32'),
+        'compile_mode': args.compile_mode or ('compile' if args.cpu_mode else 'none'),
+        'val_fraction': args.val_fraction,
+        'patience': args.patience,
+        'checkpoint_every': args.checkpoint_every,
+        'resume': args.resume,
+        'features': args.features,
+        # Même nom pour toutes les zones, y compris avec --parallel-zones
+        'run_name': args.run_name or datetime.now().strftime('%Y%m%d_%H%M%S'),
+        'plots': args.plots
+    }
+    trainer = SequentialTrainer(**trainer_options)
+    logger.info(f"📦 DataLoader: {trainer.num_workers} workers, pin_memory={trainer.pin_memory}")
+    logger.info(f"⚙️ Précision: {trainer.precision}, compilation: {trainer.compile_mode}, "
+                f"threads: {intra_op} intra-op / {inter_op} inter-op")
     
     # Phase 1: Entraîner chaque zone individuellement
     logger.info("\n" + "🟦" * 35)
     logger.info("  PHASE 1: APPRENTISSAGE ZONES INDIVIDUELLES")
     logger.info("🟦" * 35 + "\n")
     
-    for zone in ZONES:
-        trainer.train_zone(zone, epochs=30)
+    if args.parallel_zones:
+        # --threads: threads de chaque process
+        summaries = train_zones_parallel(ZONES, 30, trainer_options,
+                                         processes=args.zone_processes, threads_per_process=args.threads)
+    else:
+        summaries = []
+        for zone in ZONES:
+            start = time.perf_counter()
+            model = trainer.train_zone(zone, epochs=30)
+            summaries.append({'zone': zone, 'trained': model is not None, **trainer.history[zone],
+                              'elapsed': time.perf_counter() - start, 'threads': intra_op})
+    log_zone_summary(summaries)
+    
+    # Télémétrie des zones de cette exécution sur un même graphique
+    telemetry_files = [Path(summary['telemetry']) for summary in summaries if summary.get('telemetry')]
+    if trainer.plots and len(telemetry_files) > 1:
+        plot_path = plot_telemetry(telemetry_files, LOGS_DIR / f"telemetry_{trainer.run_name}.png")
+        if plot_path:
+            logger.info(f"  📈 Comparaison des zones: {plot_path}")
     
     # Phase 2: Entraîner logique globale
     logger.info("\n" + "🟨" * 35)
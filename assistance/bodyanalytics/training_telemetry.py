@@ -0,0 +1,227 @@
+"""
+Per-step training telemetry of the sequential models of train.py.
+
+StepTelemetry records, for every optimisation step:
+- data_wait: time spent waiting for the loader;
+- forward, backward and optimizer: time spent in each phase of the step;
+- step_time: whole step, including the transfer to the device;
+- samples, samples_per_sec (over wait + step) and loss.
+save() writes the columns to a compressed NPZ, with the run metadata (zone,
+run name, trainer options) as a JSON string. plot_telemetry() renders one
+run or compares several: loss and samples/sec per step, and how each step
+splits between waiting for data and compute. A run whose steps are mostly
+data_wait is bound by the input pipeline (more loader workers); otherwise
+it is bound by compute (threads, precision, compilation).
+
+matplotlib is imported only by plot_telemetry().
+
+Usage (from assistance/), to compare runs:
+    python -m bodyanalytics.training_telemetry run_a.npz run_b.npz -o compare.png
+"""
+import argparse
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INT_FIELDS = ('epoch', 'step', 'samples')
+FLOAT_FIELDS = ('data_wait', 'forward', 'backward', 'optimizer', 'step_time', 'samples_per_sec', 'loss')
+FIELDS = INT_FIELDS + FLOAT_FIELDS
+# Time breakdown of a step, in plot order; 'other' is step_time minus the three phases
+PHASES = ('data_wait', 'forward', 'backward', 'optimizer', 'other')
+# Above this share of waiting, a run is reported as bound by the input pipeline
+INPUT_BOUND_FRACTION = 0.5
+
+
+class StepTelemetry:
+    """Columns of per-step measurements of one training run"""
+
+    def __init__(self, **metadata):
+        self.metadata = metadata
+        self.columns = {field: [] for field in FIELDS}
+
+    def __len__(self):
+        return len(self.columns['step'])
+
+    def record(self, epoch: int, data_wait: float, forward: float, backward: float, optimizer: float,
+               step_time: float, samples: int, loss: float):
+        self.columns['epoch'].append(epoch)
+        self.columns['step'].append(len(self))
+        self.columns['samples'].append(samples)
+        self.columns['data_wait'].append(data_wait)
+        self.columns['forward'].append(forward)
+        self.columns['backward'].append(backward)
+        self.columns['optimizer'].append(optimizer)
+        self.columns['step_time'].append(step_time)
+        self.columns['samples_per_sec'].append(samples / max(data_wait + step_time, 1e-12))
+        self.columns['loss'].append(loss)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {field: np.asarray(self.columns[field], dtype=np.int32) for field in INT_FIELDS}
+        arrays.update({field: np.asarray(self.columns[field], dtype=np.float32) for field in FLOAT_FIELDS})
+        return arrays
+
+    def summary(self) -> dict:
+        return summarize(self.arrays())
+
+    def save(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, metadata=np.array(json.dumps(self.metadata)), **self.arrays())
+        return path
+
+
+def load_telemetry(path: Path) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """(metadata, columns) of a file written by StepTelemetry.save()"""
+    with np.load(path) as data:
+        metadata = json.loads(str(data['metadata']))
+        return metadata, {field: data[field] for field in FIELDS}
+
+
+def phase_times(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Seconds per step of each of PHASES"""
+    times = {phase: arrays[phase].astype(np.float64) for phase in PHASES[:-1]}
+    times['other'] = np.maximum(
+        arrays['step_time'] - arrays['forward'] - arrays['backward'] - arrays['optimizer'], 0.0
+    )
+    return times
+
+
+def summarize(arrays: Dict[str, np.ndarray]) -> dict:
+    """
+    Totals of a run: samples/sec over the whole run, share of the time in
+    each phase, and whether the input pipeline or compute bounds it
+    """
+    if len(arrays['step']) == 0:
+        return {'steps': 0}
+    times = phase_times(arrays)
+    total = max(sum(float(t.sum()) for t in times.values()), 1e-12)
+    fractions = {phase: float(t.sum()) / total for phase, t in times.items()}
+    return {
+        'steps': int(len(arrays['step'])),
+        'samples': int(arrays['samples'].sum()),
+        'samples_per_sec': float(arrays['samples'].sum()) / total,
+        'median_step_ms': float(np.median(arrays['data_wait'] + arrays['step_time'])) * 1000,
+        'fractions': fractions,
+        'bound': 'input' if fractions['data_wait'] > INPUT_BOUND_FRACTION else 'compute',
+        'final_loss': float(arrays['loss'][-1]),
+    }
+
+
+def run_label(metadata: dict, path: Path) -> str:
+    parts = [metadata.get('run'), metadata.get('zone')]
+    return ' '.join(str(part) for part in parts if part) or Path(path).stem
+
+
+def smooth(values: np.ndarray, window: int) -> np.ndarray:
+    """Moving average over window steps (edges averaged over fewer steps)"""
+    if window <= 1 or len(values) == 0:
+        return values
+    kernel = np.ones(min(window, len(values)))
+    return np.convolve(values, kernel, mode='same') / np.convolve(np.ones(len(values)), kernel, mode='same')
+
+
+def plot_telemetry(paths: Sequence[Path], output: Path, window: int = 10) -> Optional[Path]:
+    """
+    Figure of one run or a comparison of several, written to output:
+    loss and samples/sec per step (moving average over window steps), time
+    per step by phase (one bar per epoch for a single run, per run
+    otherwise) and data wait share per epoch. Returns None without matplotlib.
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        logger.warning("matplotlib is not installed: no telemetry plots")
+        return None
+
+    runs = []
+    for path in paths:
+        metadata, arrays = load_telemetry(path)
+        if len(arrays['step']):
+            runs.append((run_label(metadata, path), arrays))
+    if not runs:
+        return None
+
+    fig, axes = plt.subplots(2, 2, figsize=(13, 8))
+    (ax_loss, ax_speed), (ax_phases, ax_wait) = axes
+
+    for label, arrays in runs:
+        ax_loss.plot(arrays['step'], smooth(arrays['loss'], window), label=label)
+        ax_speed.plot(arrays['step'], smooth(arrays['samples_per_sec'], window), label=label)
+        epochs = np.unique(arrays['epoch'])
+        waits = [arrays['data_wait'][arrays['epoch'] == e].sum() for e in epochs]
+        totals = [(arrays['data_wait'] + arrays['step_time'])[arrays['epoch'] == e].sum() for e in epochs]
+        ax_wait.plot(epochs, np.array(waits) / np.maximum(totals, 1e-12), marker='o', label=label)
+
+    # Mean ms per step of each phase: per epoch for one run, per run to compare
+    if len(runs) == 1:
+        arrays = runs[0][1]
+        groups = [(str(e), arrays['epoch'] == e) for e in np.unique(arrays['epoch'])]
+        times = phase_times(arrays)
+        bars = {phase: [times[phase][mask].mean() * 1000 for _, mask in groups] for phase in PHASES}
+        names = [name for name, _ in groups]
+        ax_phases.set_xlabel('epoch')
+    else:
+        per_run = [phase_times(arrays) for _, arrays in runs]
+        bars = {phase: [times[phase].mean() * 1000 for times in per_run] for phase in PHASES}
+        names = [label for label, _ in runs]
+    positions = np.arange(len(names))
+    bottom = np.zeros(len(names))
+    for phase in PHASES:
+        ax_phases.bar(positions, bars[phase], bottom=bottom, label=phase)
+        bottom += np.array(bars[phase])
+    ax_phases.set_xticks(positions, names, rotation=30 if len(runs) > 1 else 0)
+
+    ax_loss.set(title='Loss', xlabel='step')
+    ax_speed.set(title='Samples/sec', xlabel='step')
+    ax_phases.set(title='Time per step (ms)')
+    ax_wait.set(title='Data wait share', xlabel='epoch', ylim=(0, 1))
+    ax_wait.axhline(INPUT_BOUND_FRACTION, color='grey', linestyle='--', linewidth=1)
+    for ax in axes.flat:
+        ax.grid(alpha=0.3)
+        ax.legend(fontsize='small')
+    fig.tight_layout()
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(output, dpi=100)
+    plt.close(fig)
+    return output
+
+
+def format_summary(label: str, summary: dict) -> str:
+    if not summary.get('steps'):
+        return f"{label}: no steps"
+    fractions = ', '.join(f"{phase} {share:.0%}" for phase, share in summary['fractions'].items())
+    return (
+        f"{label}: {summary['steps']} steps, {summary['samples_per_sec']:.1f} samples/s, "
+        f"median step {summary['median_step_ms']:.1f} ms, {summary['bound']}-bound ({fractions}), "
+        f"final loss {summary['final_loss']:.6f}"
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Summarise and plot training telemetry files (NPZ)')
+    parser.add_argument('paths', nargs='+', type=Path, help='Telemetry files written by train.py')
+    parser.add_argument('-o', '--output', type=Path, default=None,
+                        help='Figure to write (default: none, summaries only)')
+    parser.add_argument('--window', type=int, default=10, help='Moving average window, in steps (default: 10)')
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        metadata, arrays = load_telemetry(path)
+        print(format_summary(run_label(metadata, path), summarize(arrays)))
+    if args.output:
+        written = plot_telemetry(args.paths, args.output, args.window)
+        if written:
+            print(f"Figure: {written}")
+
+
+if __name__ == '__main__':
+    main()
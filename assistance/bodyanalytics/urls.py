@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     MovementRecordListCreateView,
@@ -5,6 +6,7 @@ from .views import (
     CreateMovementRecordView,
     UserMovementRecordsView,
     EVFAQView,
+    MotionPredictView,
     UploadMovementDataView,
     # Django Autonomous Views
     DjangoUserListView,
@@ -20,28 +22,49 @@ from .views import (
     ApproveUserOfferView,
     RejectUserOfferView
 )
+from .async_views import (
+    AsyncMovementRecordListCreateView,
+    AsyncUserMovementRecordsView,
+    AsyncUploadMovementDataView,
+    AsyncDjangoUserListView,
+    AsyncDjangoOfferListView,
+    AsyncDjangoUserOfferListView,
+    AsyncDjangoUserOfferByUserView,
+    AsyncDjangoCourseLessonListView,
+    AsyncDjangoTestQuestionListView,
+    AsyncDjangoTestQuestionByTestView,
+)
+
+
+def select_view(name, sync_view, async_view):
+    """Use the async variant for routes listed in settings.ASYNC_VIEW_ROUTES"""
+    if name in getattr(settings, 'ASYNC_VIEW_ROUTES', []):
+        return async_view.as_view()
+    return sync_view.as_view()
+
 
 urlpatterns = [
-    path('movement-records/', MovementRecordListCreateView.as_view(), name='movement-record-list-create'),
+    path('movement-records/', select_view('movement-record-list-create', MovementRecordListCreateView, AsyncMovementRecordListCreateView), name='movement-record-list-create'),
     path('movement-records/<int:pk>/', MovementRecordDetailView.as_view(), name='movement-record-detail'),
     path('movement-records/create/', CreateMovementRecordView.as_view(), name='create-movement-record'),
-    path('movement-records/user/<int:user_id>/', UserMovementRecordsView.as_view(), name='user-movement-records'),
-    path('movements/upload/', UploadMovementDataView.as_view(), name='upload-movement-data'),
+    path('movement-records/user/<int:user_id>/', select_view('user-movement-records', UserMovementRecordsView, AsyncUserMovementRecordsView), name='user-movement-records'),
+    path('movements/upload/', select_view('upload-movement-data', UploadMovementDataView, AsyncUploadMovementDataView), name='upload-movement-data'),
     path('ev-faq/', EVFAQView.as_view(), name='ev-faq'),
+    path('motion/predict/', MotionPredictView.as_view(), name='motion-predict'),
     
     
     # Django Autonomous API Endpoints
-    path('users/', DjangoUserListView.as_view(), name='django-users-list'),
+    path('users/', select_view('django-users-list', DjangoUserListView, AsyncDjangoUserListView), name='django-users-list'),
     path('users/<int:user_id>/', DjangoUserDetailView.as_view(), name='django-user-detail'),
-    path('offers/', DjangoOfferListView.as_view(), name='django-offers-list'),
+    path('offers/', select_view('django-offers-list', DjangoOfferListView, AsyncDjangoOfferListView), name='django-offers-list'),
     path('offers/<int:offer_id>/', DjangoOfferDetailView.as_view(), name='django-offer-detail'),
-    path('user-offers/', DjangoUserOfferListView.as_view(), name='django-user-offers-list'),
-    path('user-offers/user/<int:user_id>/', DjangoUserOfferByUserView.as_view(), name='django-user-offers-by-user'),
-    path('course-lessons/', DjangoCourseLessonListView.as_view(), name='django-course-lessons-list'),
+    path('user-offers/', select_view('django-user-offers-list', DjangoUserOfferListView, AsyncDjangoUserOfferListView), name='django-user-offers-list'),
+    path('user-offers/user/<int:user_id>/', select_view('django-user-offers-by-user', DjangoUserOfferByUserView, AsyncDjangoUserOfferByUserView), name='django-user-offers-by-user'),
+    path('course-lessons/', select_view('django-course-lessons-list', DjangoCourseLessonListView, AsyncDjangoCourseLessonListView), name='django-course-lessons-list'),
     path('course-lessons/<int:lesson_id>/', DjangoCourseLessonDetailView.as_view(), name='django-course-lesson-detail'),
-    path('test-questions/', DjangoTestQuestionListView.as_view(), name='django-test-questions-list'),
+    path('test-questions/', select_view('django-test-questions-list', DjangoTestQuestionListView, AsyncDjangoTestQuestionListView), name='django-test-questions-list'),
 
-    path('test-questions/test/<int:test_id>/', DjangoTestQuestionByTestView.as_view(), name='django-test-questions-by-test'),
+    path('test-questions/test/<int:test_id>/', select_view('django-test-questions-by-test', DjangoTestQuestionByTestView, AsyncDjangoTestQuestionByTestView), name='django-test-questions-by-test'),
     path('user-offers/<int:user_offer_id>/approve/', ApproveUserOfferView.as_view(), name='django-approve-user-offer'),
     path('user-offers/<int:user_offer_id>/reject/', RejectUserOfferView.as_view(), name='django-reject-user-offer'),
 ]
\ No newline at end of file
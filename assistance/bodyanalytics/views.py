@@ -7,18 +7,27 @@ from pathlib import Path
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from django.http import JsonResponse, HttpResponse
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import permission_classes
 from .models import Data as MovementRecord, Offers as Offer, UserOffers as UserOffer, CourseLessons as CourseLesson, TestQuestions as TestQuestion, Users as SpringBootUser
-from .serializers import MovementRecordSerializer, MovementRecordCreateSerializer
+from rest_framework_simplejwt.views import TokenRefreshView
+from .serializers import MovementRecordSerializer, MovementRecordCreateSerializer, BlacklistCheckedTokenRefreshSerializer
+from .image_storage import store_image_data
+from .motion_inference import predict_motion
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.contrib.auth.models import User
 import json
+import logging
+import re
 import time
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
 
 
 class MovementRecordListCreateView(generics.ListCreateAPIView):
@@ -32,11 +41,16 @@ class MovementRecordListCreateView(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         user_id = self.request.data.get('user')
+        # Move inline base64 frames to storage, keep only the reference in the row
+        try:
+            image_data = store_image_data(serializer.validated_data.get('image_data'), user_id)
+        except ValueError as e:
+            raise ValidationError({'image_data': [str(e)]})
         if user_id:
             user = User.objects.get(id=user_id)
-            serializer.save(user=user)
+            serializer.save(user=user, image_data=image_data)
         else:
-            serializer.save()
+            serializer.save(image_data=image_data)
 
 
 class MovementRecordDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -68,7 +82,12 @@ class CreateMovementRecordView(APIView):
             
             serializer = MovementRecordCreateSerializer(data=movement_record_data)
             if serializer.is_valid():
-                movement_record = serializer.save()
+                # Inline base64 frames are stored as files, only the URL goes in image_data
+                try:
+                    image_data = store_image_data(serializer.validated_data.get('image_data'), user_id)
+                except ValueError as e:
+                    return Response({'image_data': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+                movement_record = serializer.save(image_data=image_data)
                 
                 # If we have detailed JSON data, parse and save it
                 json_data = data.get('jsonData')
@@ -99,6 +118,44 @@ class CreateMovementRecordView(APIView):
             )
 
 
+class BlacklistCheckedTokenRefreshView(TokenRefreshView):
+    """Token refresh that rejects refresh tokens blacklisted by either service"""
+    serializer_class = BlacklistCheckedTokenRefreshSerializer
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class MotionPredictView(APIView):
+    """
+    Predicted landmark sequence of a trained sequential zone model.
+    Body: {"zone": "hands", "text": "...", "poses": [seq_len][n_landmarks][4]}
+    (n_landmarks = 33, the full pose, for models trained on landmark features).
+    Concurrent requests are run through the model together (motion_inference).
+    """
+
+    def post(self, request):
+        start = time.perf_counter()
+        zone = request.data.get('zone')
+        try:
+            prediction, batch_size = predict_motion(
+                zone, request.data.get('text', ''), request.data.get('poses')
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except FileNotFoundError as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except FutureTimeoutError:
+            return Response({'error': 'Prediction timed out'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({
+            'zone': zone,
+            'prediction': prediction.tolist(),
+            'batch_size': batch_size,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+        })
+
+
 class EVFAQView(APIView):
     def get(self, request):
         """
@@ -166,6 +223,239 @@ class UserMovementRecordsView(APIView):
             )
 
 
+# ========== UPLOAD HELPERS ==========
+
+
+def build_upload_json_data_dict(json_data, label, movement_type, timestamp_str):
+    """Build the json_data stored on a new movement record for an upload"""
+    return {
+        'label': label,
+        'movement_type': movement_type,
+        'original_timestamp': timestamp_str,
+        'image_urls': [],  # Will be populated after image saving
+        'image_order': 0,  # Will be set during image processing
+        'detected_movements': {
+            'detection_type': json_data.get('detection_type', 'general'),
+            'movement_name': json_data.get('movement_name', 'general_movement'),
+            'hasFace': 'faceData' in json_data and json_data['faceData'] is not None,
+            'hasPose': 'poseData' in json_data and json_data['poseData'] is not None,
+            'hasHands': 'handsData' in json_data and json_data['handsData'] is not None,
+            'confidence': json_data.get('confidence'),
+            'body_metrics': json_data.get('bodyMetrics'),
+        }
+    }
+
+
+def resolve_upload_categories(json_data):
+    """
+    Resolve (detection_type, subcategory, movement_name) for an upload batch
+    from the JSON data sent by Angular. Names are cleaned for use in file paths.
+    """
+    # Extract movement type and name from the JSON data for the entire batch
+    # This ensures all images in the batch use the same detection type
+    detection_type = 'general'
+    movement_name = 'general_movement'
+
+    # Log basic information about the received data
+    if isinstance(json_data, dict):
+        logger.debug(
+            'Upload json_data keys: %s (detection_type=%s, movement_name=%s)',
+            list(json_data.keys()), json_data.get('detection_type'), json_data.get('movement_name'),
+        )
+
+    if json_data and isinstance(json_data, dict):
+        # Try various possible field names that Angular might send
+        # Prioritize explicit detection fields over generic ones
+        # Get initial values from the main data fields
+        initial_detection_type = (
+            json_data.get('detection_type') or
+            json_data.get('detectionType') or
+            json_data.get('type') or
+            json_data.get('movementType') or
+            json_data.get('movement_type') or
+            json_data.get('gesture') or  # This might be the actual gesture name
+            'general'
+        )
+
+        initial_movement_name = (
+            json_data.get('detectedGesture') or      # Most specific - actual detected gesture
+            json_data.get('detectedExpression') or   # Most specific - actual detected expression
+            json_data.get('detected_movement') or    # Most specific - actual detected movement
+            json_data.get('handGesture') or          # Hand-specific gesture name
+            json_data.get('faceExpression') or       # Face-specific expression name
+            json_data.get('hand_gesture') or         # Hand-specific gesture name
+            json_data.get('face_expression') or      # Face-specific expression name
+            json_data.get('movement_name') or
+            json_data.get('movementName') or
+            json_data.get('expression') or
+            json_data.get('gesture') or
+            json_data.get('action') or
+            json_data.get('movement') or
+            json_data.get('pose') or
+            'general_movement'
+        )
+
+        # Initialize with initial values but allow refinement
+        detection_type = initial_detection_type
+        movement_name = initial_movement_name
+
+        logger.debug('Initial detection_type: %s, movement_name: %s', detection_type, movement_name)
+
+        # Only allow refinement if initial values are generic
+        should_refine_detection_type = detection_type in ['general', 'active_capture']
+        should_refine_movement_name = movement_name in ['general_movement', 'active_capture', 'unknown', 'neutral', 'surprised']
+
+        # Preserve any specific movement name that comes from Angular, regardless of language
+        # If it's not a generic name, keep it as is
+        if movement_name not in ['general_movement', 'active_capture', 'unknown', 'neutral', 'general']:
+            should_refine_movement_name = False
+            logger.debug('Preserving specific movement from Angular: %s', movement_name)
+
+        # Always check for specific data presence regardless of initial detection_type
+
+        # Check for face data presence and extract specific expression
+        face_data = json_data.get('faceData')
+        if face_data and face_data is not None:
+            logger.debug('Face data detected: %s', type(face_data).__name__)
+            # Extract facial expression from face data
+            if isinstance(face_data, dict):
+                # Check for emotion/expressions in face data
+                expression = face_data.get('expression') or face_data.get('emotion') or face_data.get('gesture')
+                # Check if expression is nested inside face_data
+                if expression is None and 'expression' in face_data:
+                    expression = face_data['expression']
+                elif expression is None and 'emotion' in face_data:
+                    expression = face_data['emotion']
+                elif expression is None and 'gesture' in face_data:
+                    expression = face_data['gesture']
+                logger.debug('Face expression found: %s', expression)
+                if expression and should_refine_movement_name:
+                    movement_name = str(expression).lower()
+                    logger.debug('Updated movement_name from face data: %s', movement_name)
+                # Only update detection_type to face if we should refine and we don't have a more specific detection already
+                if should_refine_detection_type and detection_type in ['general']:
+                    detection_type = 'face'
+
+        # Check for hands data presence and extract specific gesture
+        hands_data = json_data.get('handsData')
+        if hands_data and hands_data is not None and len(hands_data) > 0:
+            logger.debug('Hands data detected: %s, length: %d', type(hands_data).__name__, len(hands_data))
+            # Only update detection_type to hand if we should refine and we don't have a more specific detection already
+            if should_refine_detection_type and detection_type in ['general']:
+                detection_type = 'hand'
+            # Try to extract specific hand gesture, regardless of current movement_name
+            if isinstance(hands_data, list) and len(hands_data) > 0:
+                first_hand = hands_data[0]
+                if isinstance(first_hand, dict):
+                    # Look for gesture, action, or expression in hand data
+                    gesture = first_hand.get('gesture') or first_hand.get('action') or first_hand.get('movement')
+                    handedness = first_hand.get('handedness', '')
+                    logger.debug('Hand gesture found: %s, handedness: %s', gesture, handedness)
+                    if gesture and should_refine_movement_name:
+                        movement_name = str(gesture).lower()
+                        logger.debug('Updated movement_name from hand data: %s', movement_name)
+                    else:
+                        # Try to get handedness and gesture
+                        if handedness and should_refine_movement_name:
+                            movement_name = f"{handedness}_gesture"
+                            logger.debug('Updated movement_name from handedness: %s', movement_name)
+                        else:
+                            movement_name = 'hand_gesture'
+            elif isinstance(hands_data, dict):
+                # If it's a dict, check for gesture
+                gesture = hands_data.get('gesture') or hands_data.get('action') or hands_data.get('movement')
+                logger.debug('Hand gesture found: %s', gesture)
+                if gesture and should_refine_movement_name:
+                    movement_name = str(gesture).lower()
+                    logger.debug('Updated movement_name from hand data: %s', movement_name)
+                else:
+                    movement_name = 'hand_gesture'
+            else:
+                movement_name = 'hand_gesture'
+
+        # Check for pose data presence and extract specific pose
+        pose_data = json_data.get('poseData')
+        if pose_data and pose_data is not None and len(pose_data) > 0:
+            logger.debug('Pose data detected: %s, length: %d', type(pose_data).__name__, len(pose_data))
+            # Only update detection_type to pose if we should refine and we don't have a more specific detection already
+            if should_refine_detection_type and detection_type in ['general']:
+                detection_type = 'pose'
+            # Try to extract specific pose from pose data, regardless of current movement_name
+            if isinstance(pose_data, dict):
+                # Look for pose name, action, or movement in pose data
+                pose_name = pose_data.get('pose') or pose_data.get('action') or pose_data.get('movement')
+                logger.debug('Pose name found: %s', pose_name)
+                if pose_name and should_refine_movement_name:
+                    movement_name = str(pose_name).lower()
+                    logger.debug('Updated movement_name from pose data: %s', movement_name)
+                # Only default to 'body_pose' if we should refine and we don't have a more specific movement_name already
+                elif should_refine_movement_name and movement_name in ['general_movement', 'active_capture', 'unknown', 'neutral']:
+                    movement_name = 'body_pose'
+            # If pose_data is not a dict but we have pose data, default to 'body_pose'
+            elif should_refine_movement_name and movement_name in ['general_movement', 'active_capture', 'unknown', 'neutral']:
+                movement_name = 'body_pose'
+
+    # Log the final processed result
+    logger.debug('Final detection_type: %s, movement_name: %s', detection_type, movement_name)
+
+    # Set subcategory based on detection type
+    subcategory = detection_type
+
+    # Clean names for use in file paths
+    # Replace special characters and spaces
+    detection_type = re.sub(r'[^a-zA-Z0-9_]', '_', detection_type.lower())
+    subcategory = re.sub(r'[^a-zA-Z0-9_]', '_', subcategory.lower())
+    movement_name = re.sub(r'[^a-zA-Z0-9_]', '_', movement_name.lower())
+
+    return detection_type, subcategory, movement_name
+
+
+def upload_image_filename(detection_type, subcategory, movement_name, index, image_name):
+    """Storage name for an uploaded image: active_capture/detection_type/subcategory/movement_name/images"""
+    timestamp_ms = int(timezone.now().timestamp() * 1000)
+    return f"active_capture/{detection_type}/{subcategory}/{movement_name}/{index}_{timestamp_ms}_{image_name}"
+
+
+def merge_upload_image_entries(existing_json_data_raw, image_urls, json_data, json_data_dict, timestamp_str):
+    """
+    Append one entry per uploaded image (with its landmarks and movements)
+    to the json_data of an existing session record. Returns the merged dict.
+    """
+    # Load existing JSON data
+    try:
+        import ast
+        # Try to parse as JSON, fallback to literal_eval if needed
+        try:
+            existing_json_data = json.loads(existing_json_data_raw) if existing_json_data_raw else {}
+        except (json.JSONDecodeError, TypeError):
+            existing_json_data = ast.literal_eval(existing_json_data_raw) if existing_json_data_raw else {}
+    except:
+        existing_json_data = {}
+
+    # Merge the new image data with existing ones
+    # Create new image entries with landmarks and movement data for each image
+    for i, image_url in enumerate(image_urls):
+        # Create a data entry for each image with its landmarks and movements
+        image_data_entry = {
+            'image_url': image_url,
+            'timestamp': timestamp_str,
+            'detected_movements': json_data_dict.get('detected_movements', {}),
+            # Include landmark data if available in the original json_data
+            'landmarks': {
+                'face': json_data.get('faceData', None),
+                'pose': json_data.get('poseData', None),
+                'hands': json_data.get('handsData', None)
+            } if json_data else {}
+        }
+
+        # Add this image data to existing entries
+        if 'image_data' not in existing_json_data:
+            existing_json_data['image_data'] = []
+        existing_json_data['image_data'].append(image_data_entry)
+
+    return existing_json_data
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class UploadMovementDataView(APIView):
     """
@@ -218,221 +508,14 @@ class UploadMovementDataView(APIView):
                     json_data = {}
             
             # ========== 4. CRÉER LE MOUVEMENT RECORD (SIMPLIFIED) ==========
-            # Create with minimal data to avoid database column type issues
-            # Note: json_data field is OID type, so we won't store JSON in it to avoid errors
-            # However, we'll extract essential information for image organization
-            essential_json_data = {}
-            if json_data:
-                # Extract only the key information needed for movement classification
-                essential_json_data['detection_type'] = json_data.get('detection_type', 'general')
-                essential_json_data['movement_name'] = json_data.get('movement_name', 'general_movement')
-                essential_json_data['timestamp'] = json_data.get('timestamp')
-                essential_json_data['hasFace'] = 'faceData' in json_data and json_data['faceData'] is not None
-                essential_json_data['hasPose'] = 'poseData' in json_data and json_data['poseData'] is not None
-                essential_json_data['hasHands'] = 'handsData' in json_data and json_data['handsData'] is not None
-                
-                # Add expression or gesture info if available
-                if json_data.get('faceData') and 'expression' in json_data['faceData']:
-                    essential_json_data['expression'] = json_data['faceData']['expression']
-                
-                if json_data.get('handsData'):
-                    # Extract hand gesture info
-                    hands_info = []
-                    for hand in json_data['handsData']:
-                        hands_info.append({
-                            'handedness': hand.get('handedness'),
-                            'gesture': hand.get('gesture')
-                        })
-                    essential_json_data['hands_info'] = hands_info
-            
             # Create the json_data_dict first
-            json_data_dict = {
-                'label': label,
-                'movement_type': movement_type,
-                'original_timestamp': timestamp_str,
-                'image_urls': [],  # Will be populated after image saving
-                'image_order': 0,  # Will be set during image processing
-                'detected_movements': {
-                    'detection_type': json_data.get('detection_type', 'general'),
-                    'movement_name': json_data.get('movement_name', 'general_movement'),
-                    'hasFace': 'faceData' in json_data and json_data['faceData'] is not None,
-                    'hasPose': 'poseData' in json_data and json_data['poseData'] is not None,
-                    'hasHands': 'handsData' in json_data and json_data['handsData'] is not None,
-                    'confidence': json_data.get('confidence'),
-                    'body_metrics': json_data.get('bodyMetrics'),
-                }
-            }
+            json_data_dict = build_upload_json_data_dict(json_data, label, movement_type, timestamp_str)
             
             # ========== 5. TRAITER LES IMAGES (Before creating record) ==========
             images = request.FILES.getlist('images')
             image_urls = []
             
-            # Extract movement type and name from the JSON data for the entire batch
-            # This ensures all images in the batch use the same detection type
-            detection_type = 'general'
-            movement_name = 'general_movement'
-            
-            print(f"RECEIVED: Raw json_data keys: {list(json_data.keys()) if isinstance(json_data, dict) else 'Not a dict'}")
-            
-            # Log basic information about the received data
-            if isinstance(json_data, dict):
-                print(f"RECEIVED: faceData present: {'faceData' in json_data}")
-                print(f"RECEIVED: handsData present: {'handsData' in json_data}")
-                print(f"RECEIVED: poseData present: {'poseData' in json_data}")
-                print(f"RECEIVED: detection_type: {json_data.get('detection_type', 'None')}")
-                print(f"RECEIVED: movement_name: {json_data.get('movement_name', 'None')}")
-            
-            if json_data and isinstance(json_data, dict):
-                # Try various possible field names that Angular might send
-                # Prioritize explicit detection fields over generic ones
-                # Get initial values from the main data fields
-                initial_detection_type = (
-                    json_data.get('detection_type') or
-                    json_data.get('detectionType') or
-                    json_data.get('type') or
-                    json_data.get('movementType') or
-                    json_data.get('movement_type') or
-                    json_data.get('gesture') or  # This might be the actual gesture name
-                    'general'
-                )
-                
-                initial_movement_name = (
-                    json_data.get('detectedGesture') or      # Most specific - actual detected gesture
-                    json_data.get('detectedExpression') or   # Most specific - actual detected expression
-                    json_data.get('detected_movement') or    # Most specific - actual detected movement
-                    json_data.get('handGesture') or          # Hand-specific gesture name
-                    json_data.get('faceExpression') or       # Face-specific expression name
-                    json_data.get('hand_gesture') or         # Hand-specific gesture name
-                    json_data.get('face_expression') or      # Face-specific expression name
-                    json_data.get('movement_name') or
-                    json_data.get('movementName') or
-                    json_data.get('expression') or
-                    json_data.get('gesture') or
-                    json_data.get('action') or
-                    json_data.get('movement') or
-                    json_data.get('pose') or
-                    'general_movement'
-                )
-                
-                # Initialize with initial values but allow refinement
-                detection_type = initial_detection_type
-                movement_name = initial_movement_name
-                
-                print(f"DEBUG: Initial values - detection_type: {detection_type}, movement_name: {movement_name}")
-                
-                print(f"DEBUG: Initial detection_type: {detection_type}, movement_name: {movement_name}")
-                
-                # Only allow refinement if initial values are generic
-                should_refine_detection_type = detection_type in ['general', 'active_capture']
-                should_refine_movement_name = movement_name in ['general_movement', 'active_capture', 'unknown', 'neutral', 'surprised']
-                
-                # Preserve any specific movement name that comes from Angular, regardless of language
-                # If it's not a generic name, keep it as is
-                if movement_name not in ['general_movement', 'active_capture', 'unknown', 'neutral', 'general']:
-                    should_refine_movement_name = False
-                    print(f"RECEIVED: Preserving specific movement from Angular: {movement_name}")
-                
-                # Always check for specific data presence regardless of initial detection_type
-                print(f"DEBUG: Checking for specific data in json_data keys: {list(json_data.keys())}")
-                
-                # Check for face data presence and extract specific expression
-                face_data = json_data.get('faceData')
-                if face_data and face_data is not None:
-                    print(f"DEBUG: Face data detected: {type(face_data)}, keys: {list(face_data.keys()) if isinstance(face_data, dict) else 'N/A'}")
-                    # Extract facial expression from face data
-                    if isinstance(face_data, dict):
-                        # Check for emotion/expressions in face data
-                        expression = face_data.get('expression') or face_data.get('emotion') or face_data.get('gesture')
-                        # Check if expression is nested inside face_data
-                        if expression is None and 'expression' in face_data:
-                            expression = face_data['expression']
-                        elif expression is None and 'emotion' in face_data:
-                            expression = face_data['emotion']
-                        elif expression is None and 'gesture' in face_data:
-                            expression = face_data['gesture']
-                        print(f"DEBUG: Face expression found: {expression}")
-                        if expression and should_refine_movement_name:
-                            movement_name = str(expression).lower()
-                            print(f"DEBUG: Updated movement_name from face data: {movement_name}")
-                        # Only update detection_type to face if we should refine and we don't have a more specific detection already
-                        if should_refine_detection_type and detection_type in ['general']:
-                            detection_type = 'face'
-                
-                # Check for hands data presence and extract specific gesture
-                hands_data = json_data.get('handsData')
-                if hands_data and hands_data is not None and len(hands_data) > 0:
-                    print(f"DEBUG: Hands data detected: {type(hands_data)}, length: {len(hands_data) if hasattr(hands_data, '__len__') else 'N/A'}")
-                    # Only update detection_type to hand if we should refine and we don't have a more specific detection already
-                    if should_refine_detection_type and detection_type in ['general']:
-                        detection_type = 'hand'
-                    # Try to extract specific hand gesture, regardless of current movement_name
-                    if isinstance(hands_data, list) and len(hands_data) > 0:
-                        first_hand = hands_data[0]
-                        if isinstance(first_hand, dict):
-                            # Look for gesture, action, or expression in hand data
-                            gesture = first_hand.get('gesture') or first_hand.get('action') or first_hand.get('movement')
-                            handedness = first_hand.get('handedness', '')
-                            print(f"DEBUG: Hand gesture found: {gesture}, handedness: {handedness}")
-                            if gesture and should_refine_movement_name:
-                                movement_name = str(gesture).lower()
-                                print(f"DEBUG: Updated movement_name from hand data: {movement_name}")
-                            else:
-                                # Try to get handedness and gesture
-                                if handedness and should_refine_movement_name:
-                                    movement_name = f"{handedness}_gesture"
-                                    print(f"DEBUG: Updated movement_name from handedness: {movement_name}")
-                                else:
-                                    movement_name = 'hand_gesture'
-                    elif isinstance(hands_data, dict):
-                        # If it's a dict, check for gesture
-                        gesture = hands_data.get('gesture') or hands_data.get('action') or hands_data.get('movement')
-                        print(f"DEBUG: Hand gesture found: {gesture}")
-                        if gesture and should_refine_movement_name:
-                            movement_name = str(gesture).lower()
-                            print(f"DEBUG: Updated movement_name from hand data: {movement_name}")
-                        else:
-                            movement_name = 'hand_gesture'
-                    else:
-                        movement_name = 'hand_gesture'
-                
-                # Check for pose data presence and extract specific pose
-                pose_data = json_data.get('poseData')
-                if pose_data and pose_data is not None and len(pose_data) > 0:
-                    print(f"DEBUG: Pose data detected: {type(pose_data)}, length: {len(pose_data) if hasattr(pose_data, '__len__') else 'N/A'}")
-                    # Only update detection_type to pose if we should refine and we don't have a more specific detection already
-                    if should_refine_detection_type and detection_type in ['general']:
-                        detection_type = 'pose'
-                    # Try to extract specific pose from pose data, regardless of current movement_name
-                    if isinstance(pose_data, dict):
-                        # Look for pose name, action, or movement in pose data
-                        pose_name = pose_data.get('pose') or pose_data.get('action') or pose_data.get('movement')
-                        print(f"DEBUG: Pose name found: {pose_name}")
-                        if pose_name and should_refine_movement_name:
-                            movement_name = str(pose_name).lower()
-                            print(f"DEBUG: Updated movement_name from pose data: {movement_name}")
-                        # Only default to 'body_pose' if we should refine and we don't have a more specific movement_name already
-                        elif should_refine_movement_name and movement_name in ['general_movement', 'active_capture', 'unknown', 'neutral']:
-                            movement_name = 'body_pose'
-                    # If pose_data is not a dict but we have pose data, default to 'body_pose'
-                    elif should_refine_movement_name and movement_name in ['general_movement', 'active_capture', 'unknown', 'neutral']:
-                        movement_name = 'body_pose'
-            
-            print(f"DEBUG: Final detection_type: {detection_type}, movement_name: {movement_name}")
-            
-            # Log the final processed result
-            print(f"PROCESSED: Final detection_type: {detection_type}, movement_name: {movement_name}")
-            
-            # Set subcategory based on detection type
-            subcategory = detection_type
-            
-            # Clean names for use in file paths
-            # Replace special characters and spaces
-            import re
-            detection_type = re.sub(r'[^a-zA-Z0-9_]', '_', detection_type.lower())
-            subcategory = re.sub(r'[^a-zA-Z0-9_]', '_', subcategory.lower())
-            movement_name = re.sub(r'[^a-zA-Z0-9_]', '_', movement_name.lower())
-            
-            print(f"DEBUG: After cleaning - detection_type: {detection_type}, subcategory: {subcategory}, movement_name: {movement_name}")
+            detection_type, subcategory, movement_name = resolve_upload_categories(json_data)
             
             for i, image in enumerate(images):
                 # Limiter le nombre d'images traitées par requête
@@ -440,22 +523,17 @@ class UploadMovementDataView(APIView):
                     break
                 
                 try:
-                    # Générer un nom de fichier unique
-                    timestamp_ms = int(timezone.now().timestamp() * 1000)
-                    
                     # Simply use the movement information received from frontend
                     # Backend does not analyze movements, only organizes based on received data
-                    
-                    # Format: active_capture/detection_type/subcategory/movement_name/images
-                    filename = f"active_capture/{detection_type}/{subcategory}/{movement_name}/{i}_{timestamp_ms}_{image.name}"
+                    filename = upload_image_filename(detection_type, subcategory, movement_name, i, image.name)
                     
                     # Sauvegarder l'image
                     path = default_storage.save(filename, ContentFile(image.read()))
                     image_url = default_storage.url(path)
                     image_urls.append(image_url)
                     
-                except Exception as e:
-                    print(f"Error saving image: {str(e)}")
+                except Exception:
+                    logger.exception('Error saving image %s', image.name)
                     # Continuer avec les autres images même si une échoue
                     continue
             
@@ -473,45 +551,18 @@ class UploadMovementDataView(APIView):
             
             # If we find an existing record from the same session, update it instead of creating a new one
             if existing_record:
-                # Load existing JSON data
-                try:
-                    import ast
-                    # Try to parse as JSON, fallback to literal_eval if needed
-                    try:
-                        existing_json_data = json.loads(existing_record.json_data) if existing_record.json_data else {}
-                    except (json.JSONDecodeError, TypeError):
-                        existing_json_data = ast.literal_eval(existing_record.json_data) if existing_record.json_data else {}
-                except:
-                    existing_json_data = {}
-                
-                # Merge the new image data with existing ones
-                # Create new image entries with landmarks and movement data for each image
-                for i, image_url in enumerate(image_urls):
-                    # Create a data entry for each image with its landmarks and movements
-                    image_data_entry = {
-                        'image_url': image_url,
-                        'timestamp': timestamp_str,
-                        'detected_movements': json_data_dict.get('detected_movements', {}),
-                        # Include landmark data if available in the original json_data
-                        'landmarks': {
-                            'face': json_data.get('faceData', None),
-                            'pose': json_data.get('poseData', None),
-                            'hands': json_data.get('handsData', None)
-                        } if json_data else {}
-                    }
-                    
-                    # Add this image data to existing entries
-                    if 'image_data' not in existing_json_data:
-                        existing_json_data['image_data'] = []
-                    existing_json_data['image_data'].append(image_data_entry)
+                # Merge the new image data with the existing entries
+                existing_json_data = merge_upload_image_entries(
+                    existing_record.json_data, image_urls, json_data, json_data_dict, timestamp_str
+                )
                 
                 # Update the existing record with merged data
                 try:
                     existing_record.json_data = json.dumps(existing_json_data, ensure_ascii=False, separators=(',', ':'), default=str)
                     existing_record.save()
                     movement_record = existing_record
-                except Exception as e:
-                    print(f"Error updating json_data in existing movement record: {e}")
+                except Exception:
+                    logger.exception('Error updating json_data in existing movement record %s', existing_record.id)
                     # If update fails, still use the existing record
                     movement_record = existing_record
             else:
@@ -528,9 +579,9 @@ class UploadMovementDataView(APIView):
                         created_at=timezone.now(),  # Set required field
                         json_data=json_data_str  # Store as JSON string with actual image URLs
                     )
-                except Exception as e:
+                except Exception:
                     # If json_data field type doesn't accept the JSON, create without it
-                    print(f"Error saving json_data to movement record: {e}")
+                    logger.exception('Error saving json_data to movement record')
                     movement_record = MovementRecord.objects.create(
                         user=user,
                         timestamp=timezone.now(),
@@ -550,9 +601,7 @@ class UploadMovementDataView(APIView):
             }, status=status.HTTP_201_CREATED)
         
         except Exception as e:
-            import traceback
-            print(f"ERROR in upload: {str(e)}")
-            print(f"TRACEBACK: {traceback.format_exc()}")
+            logger.exception('Error in movement data upload')
             return Response(
                 {'error': str(e), 'detail': 'Internal server error', 'traceback': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -633,6 +682,80 @@ class DjangoCurrentUserView(APIView):
 
 # ========== DJANGO AUTONOMOUS VIEWS ==========
 
+def spring_user_to_dict(user):
+    return {
+        'id': user.id,
+        'email': user.email,
+        'firstname': user.firstname,
+        'lastname': user.lastname,
+        'role': user.role,
+        'enabled': user.enabled,
+        'created_at': user.created_at.isoformat() if user.created_at else None,
+        'updated_at': user.updated_at.isoformat() if user.updated_at else None,
+    }
+
+
+def offer_to_dict(offer):
+    return {
+        'id': offer.id,
+        'title': offer.title,
+        'description': offer.description,
+        'price': offer.price,
+        'duration_hours': offer.duration_hours,
+        'is_active': offer.is_active,
+        'created_at': offer.created_at.isoformat() if offer.created_at else None,
+        'updated_at': offer.updated_at.isoformat() if offer.updated_at else None,
+    }
+
+
+def user_offer_to_dict(user_offer):
+    return {
+        'id': user_offer.id,
+        'user_id': user_offer.user_id,
+        'offer_id': user_offer.offer_id,
+        'purchase_date': user_offer.purchase_date.isoformat() if user_offer.purchase_date else None,
+        'expiration_date': user_offer.expiration_date.isoformat() if user_offer.expiration_date else None,
+        'is_active': user_offer.is_active,
+        'approval_status': user_offer.approval_status,
+        'created_at': user_offer.created_at.isoformat() if user_offer.created_at else None,
+        'updated_at': user_offer.updated_at.isoformat() if user_offer.updated_at else None,
+    }
+
+
+def course_lesson_to_dict(lesson):
+    return {
+        'id': lesson.id,
+        'title': lesson.title,
+        'description': lesson.description,
+        'video_url': lesson.video_url,
+        'animation_3d_url': lesson.animation_3d_url,
+        'content_title': lesson.content_title,
+        'content_description': lesson.content_description,
+        'display_order': lesson.display_order,
+        'lesson_order': lesson.lesson_order,
+        'is_service': lesson.is_service,
+        'user_id': lesson.user_id,
+        'created_at': lesson.created_at.isoformat() if lesson.created_at else None,
+        'updated_at': lesson.updated_at.isoformat() if lesson.updated_at else None,
+    }
+
+
+def test_question_to_dict(question):
+    return {
+        'id': question.id,
+        'question_text': question.question_text,
+        # test_id avoids loading the related CourseTests row for every question
+        'course_test_id': question.test_id,
+        'question_order': question.question_order,
+        'points': question.points,
+        'question_type': question.question_type,
+        'expected_answer_type': question.expected_answer_type,
+        'user_id': question.user_id,
+        'created_at': question.created_at.isoformat() if question.created_at else None,
+        'updated_at': question.updated_at.isoformat() if question.updated_at else None,
+    }
+
+
 class DjangoUserListView(APIView):
     def get(self, request):
         try:
@@ -644,16 +767,7 @@ class DjangoUserListView(APIView):
             users = SpringBootUser.objects.all()
             result = []
             for user in users:
-                user_data = {
-                    'id': user.id,
-                    'email': user.email,
-                    'firstname': user.firstname,
-                    'lastname': user.lastname,
-                    'role': user.role,
-                    'enabled': user.enabled,
-                    'created_at': user.created_at.isoformat() if user.created_at else None,
-                    'updated_at': user.updated_at.isoformat() if user.updated_at else None,
-                }
+                user_data = spring_user_to_dict(user)
                 result.append(user_data)
             return Response(result)
         except Exception as e:
@@ -670,16 +784,7 @@ class DjangoUserDetailView(APIView):
             # Check if requesting user has permission to access this user's data
             # For now, allow access to any user data (you can add more sophisticated permission checks)
             user = SpringBootUser.objects.get(id=user_id)
-            user_data = {
-                'id': user.id,
-                'email': user.email,
-                'firstname': user.firstname,
-                'lastname': user.lastname,
-                'role': user.role,
-                'enabled': user.enabled,
-                'created_at': user.created_at.isoformat() if user.created_at else None,
-                'updated_at': user.updated_at.isoformat() if user.updated_at else None,
-            }
+            user_data = spring_user_to_dict(user)
             return Response(user_data)
         except SpringBootUser.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -693,16 +798,7 @@ class DjangoOfferListView(APIView):
             offers = Offer.objects.all()
             result = []
             for offer in offers:
-                offer_data = {
-                    'id': offer.id,
-                    'title': offer.title,
-                    'description': offer.description,
-                    'price': offer.price,
-                    'duration_hours': offer.duration_hours,
-                    'is_active': offer.is_active,
-                    'created_at': offer.created_at.isoformat() if offer.created_at else None,
-                    'updated_at': offer.updated_at.isoformat() if offer.updated_at else None,
-                }
+                offer_data = offer_to_dict(offer)
                 result.append(offer_data)
             return Response(result)
         except Exception as e:
@@ -713,16 +809,7 @@ class DjangoOfferDetailView(APIView):
     def get(self, request, offer_id):
         try:
             offer = Offer.objects.get(id=offer_id)
-            offer_data = {
-                'id': offer.id,
-                'title': offer.title,
-                'description': offer.description,
-                'price': offer.price,
-                'duration_hours': offer.duration_hours,
-                'is_active': offer.is_active,
-                'created_at': offer.created_at.isoformat() if offer.created_at else None,
-                'updated_at': offer.updated_at.isoformat() if offer.updated_at else None,
-            }
+            offer_data = offer_to_dict(offer)
             return Response(offer_data)
         except Offer.DoesNotExist:
             return Response({'error': 'Offer not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -736,17 +823,7 @@ class DjangoUserOfferListView(APIView):
             user_offers = UserOffer.objects.all()
             result = []
             for user_offer in user_offers:
-                user_offer_data = {
-                    'id': user_offer.id,
-                    'user_id': user_offer.user_id,
-                    'offer_id': user_offer.offer_id,
-                    'purchase_date': user_offer.purchase_date.isoformat() if user_offer.purchase_date else None,
-                    'expiration_date': user_offer.expiration_date.isoformat() if user_offer.expiration_date else None,
-                    'is_active': user_offer.is_active,
-                    'approval_status': user_offer.approval_status,
-                    'created_at': user_offer.created_at.isoformat() if user_offer.created_at else None,
-                    'updated_at': user_offer.updated_at.isoformat() if user_offer.updated_at else None,
-                }
+                user_offer_data = user_offer_to_dict(user_offer)
                 result.append(user_offer_data)
             return Response(result)
         except Exception as e:
@@ -765,17 +842,7 @@ class DjangoUserOfferByUserView(APIView):
             user_offers = UserOffer.objects.filter(user_id=user_id)
             result = []
             for user_offer in user_offers:
-                user_offer_data = {
-                    'id': user_offer.id,
-                    'user_id': user_offer.user_id,
-                    'offer_id': user_offer.offer_id,
-                    'purchase_date': user_offer.purchase_date.isoformat() if user_offer.purchase_date else None,
-                    'expiration_date': user_offer.expiration_date.isoformat() if user_offer.expiration_date else None,
-                    'is_active': user_offer.is_active,
-                    'approval_status': user_offer.approval_status,
-                    'created_at': user_offer.created_at.isoformat() if user_offer.created_at else None,
-                    'updated_at': user_offer.updated_at.isoformat() if user_offer.updated_at else None,
-                }
+                user_offer_data = user_offer_to_dict(user_offer)
                 result.append(user_offer_data)
             return Response(result)
         except Exception as e:
@@ -788,21 +855,7 @@ class DjangoCourseLessonListView(APIView):
             lessons = CourseLesson.objects.all()
             result = []
             for lesson in lessons:
-                lesson_data = {
-                    'id': lesson.id,
-                    'title': lesson.title,
-                    'description': lesson.description,
-                    'video_url': lesson.video_url,
-                    'animation_3d_url': lesson.animation_3d_url,
-                    'content_title': lesson.content_title,
-                    'content_description': lesson.content_description,
-                    'display_order': lesson.display_order,
-                    'lesson_order': lesson.lesson_order,
-                    'is_service': lesson.is_service,
-                    'user_id': lesson.user_id,
-                    'created_at': lesson.created_at.isoformat() if lesson.created_at else None,
-                    'updated_at': lesson.updated_at.isoformat() if lesson.updated_at else None,
-                }
+                lesson_data = course_lesson_to_dict(lesson)
                 result.append(lesson_data)
             return Response(result)
         except Exception as e:
@@ -813,21 +866,7 @@ class DjangoCourseLessonDetailView(APIView):
     def get(self, request, lesson_id):
         try:
             lesson = CourseLesson.objects.get(id=lesson_id)
-            lesson_data = {
-                'id': lesson.id,
-                'title': lesson.title,
-                'description': lesson.description,
-                'video_url': lesson.video_url,
-                'animation_3d_url': lesson.animation_3d_url,
-                'content_title': lesson.content_title,
-                'content_description': lesson.content_description,
-                'display_order': lesson.display_order,
-                'lesson_order': lesson.lesson_order,
-                'is_service': lesson.is_service,
-                'user_id': lesson.user_id,
-                'created_at': lesson.created_at.isoformat() if lesson.created_at else None,
-                'updated_at': lesson.updated_at.isoformat() if lesson.updated_at else None,
-            }
+            lesson_data = course_lesson_to_dict(lesson)
             return Response(lesson_data)
         except CourseLesson.DoesNotExist:
             return Response({'error': 'Lesson not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -841,18 +880,7 @@ class DjangoTestQuestionListView(APIView):
             questions = TestQuestion.objects.all()
             result = []
             for question in questions:
-                question_data = {
-                    'id': question.id,
-                    'question_text': question.question_text,
-                    'course_test_id': question.test.id if question.test else None,
-                    'question_order': question.question_order,
-                    'points': question.points,
-                    'question_type': question.question_type,
-                    'expected_answer_type': question.expected_answer_type,
-                    'user_id': question.user_id,
-                    'created_at': question.created_at.isoformat() if question.created_at else None,
-                    'updated_at': question.updated_at.isoformat() if question.updated_at else None,
-                }
+                question_data = test_question_to_dict(question)
                 result.append(question_data)
             return Response(result)
         except Exception as e:
@@ -865,18 +893,7 @@ class DjangoTestQuestionByTestView(APIView):
             questions = TestQuestion.objects.filter(test_id=test_id)
             result = []
             for question in questions:
-                question_data = {
-                    'id': question.id,
-                    'question_text': question.question_text,
-                    'course_test_id': question.test.id if question.test else None,
-                    'question_order': question.question_order,
-                    'points': question.points,
-                    'question_type': question.question_type,
-                    'expected_answer_type': question.expected_answer_type,
-                    'user_id': question.user_id,
-                    'created_at': question.created_at.isoformat() if question.created_at else None,
-                    'updated_at': question.updated_at.isoformat() if question.updated_at else None,
-                }
+                question_data = test_question_to_dict(question)
                 result.append(question_data)
             return Response(result)
         except Exception as e:
@@ -893,17 +910,7 @@ class ApproveUserOfferView(APIView):
             user_offer.approval_status = 'APPROVED'
             user_offer.is_active = True
             user_offer.save()
-            user_offer_data = {
-                'id': user_offer.id,
-                'user_id': user_offer.user_id,
-                'offer_id': user_offer.offer_id,
-                'purchase_date': user_offer.purchase_date.isoformat() if user_offer.purchase_date else None,
-                'expiration_date': user_offer.expiration_date.isoformat() if user_offer.expiration_date else None,
-                'is_active': user_offer.is_active,
-                'approval_status': user_offer.approval_status,
-                'created_at': user_offer.created_at.isoformat() if user_offer.created_at else None,
-                'updated_at': user_offer.updated_at.isoformat() if user_offer.updated_at else None,
-            }
+            user_offer_data = user_offer_to_dict(user_offer)
             return Response(user_offer_data)
         except UserOffer.DoesNotExist:
             return Response({'error': 'UserOffer not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -918,17 +925,7 @@ class RejectUserOfferView(APIView):
             user_offer.approval_status = 'REJECTED'
             user_offer.is_active = False
             user_offer.save()
-            user_offer_data = {
-                'id': user_offer.id,
-                'user_id': user_offer.user_id,
-                'offer_id': user_offer.offer_id,
-                'purchase_date': user_offer.purchase_date.isoformat() if user_offer.purchase_date else None,
-                'expiration_date': user_offer.expiration_date.isoformat() if user_offer.expiration_date else None,
-                'is_active': user_offer.is_active,
-                'approval_status': user_offer.approval_status,
-                'created_at': user_offer.created_at.isoformat() if user_offer.created_at else None,
-                'updated_at': user_offer.updated_at.isoformat() if user_offer.updated_at else None,
-            }
+            user_offer_data = user_offer_to_dict(user_offer)
             return Response(user_offer_data)
         except UserOffer.DoesNotExist:
             return Response({'error': 'UserOffer not found'}, status=status.HTTP_404_NOT_FOUND)